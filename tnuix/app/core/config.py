@@ -1,10 +1,20 @@
-from typing import Dict
+from typing import Dict, List
 
 # 系统配置
 SAMPLING_RATE = 1000  # 采样频率
 NOTCH_FREQ = 50      # 工频
 QUALITY_FACTOR = 30  # 品质因数
 
+# 默认滤波链（每个设备可在连接时或运行中修改），各级依次为:
+#   {"type": "notch", "freq": 50, "q": 30, "harmonics": 1}   工频陷波，harmonics 为同时滤除的谐波个数（含基波）
+#   {"type": "bandpass", "low": 0.5, "high": 40, "order": 2}
+#   {"type": "highpass", "cutoff": 0.5, "order": 2}          "baseline" 同 highpass，用于去除基线漂移
+#   {"type": "lowpass", "cutoff": 40, "order": 4}
+#   {"type": "decimate", "factor": 4}                       抽取（含抗混叠低通），只能是最后一级
+FILTER_CHAIN: List[Dict] = [
+    {"type": "notch", "freq": NOTCH_FREQ, "q": QUALITY_FACTOR}
+]
+
 # 用户配置
 USERS: Dict[str, Dict] = {
     "admin": {
@@ -16,10 +26,87 @@ USERS: Dict[str, Dict] = {
 
 # 会话配置
 SESSION_EXPIRY = 3600  # 会话过期时间（秒）
+SESSION_REFRESH_INTERVAL = 60  # 滑动过期的刷新间隔（秒），期间的请求不再逐个延长过期时间
+SESSION_SWEEP_INTERVAL = 30  # 后台清理过期会话的间隔（秒）
+SESSION_MAX_COUNT = 10000  # 会话数上限，超过时淘汰最早过期的会话
 
 # 串口配置
-SERIAL_BUFFER_MAX_SIZE = 1000  # 串口数据缓冲区大小
+DEFAULT_DEVICE_ID = 'default'  # 未指定设备ID时使用的设备
+SERIAL_BUFFER_MAX_SIZE = SAMPLING_RATE * 600  # 串口数据环形缓冲区容量（样本数），默认保留 10 分钟，可按需调到数小时
 DEFAULT_BAUDRATE = 115200
+SERIAL_PROTOCOL = 'auto'        # 串口数据协议: 'ascii'、'binary' 或 'auto'（自动识别）
+SERIAL_READ_TIMEOUT = 0.5       # 读线程阻塞读取超时（秒），仅用于及时响应停止请求
+ACQUISITION_QUEUE_SIZE = 256    # 读线程与事件循环之间的样本批次队列长度
+SERIAL_MAX_PARTIAL_FRAME = 4096 # 未完成帧的最大缓存字节数，超过则认为数据流错位并丢弃
+
+# 实时推送配置
+BROADCAST_FRAME_RATE = 30      # 每秒向客户端推送的数据帧数，每帧合并该时间段内的全部样本
+BROADCAST_SEND_TIMEOUT = 1.0   # 单个客户端单次发送的超时时间（秒）
+CLIENT_QUEUE_SIZE = 64         # 每个客户端发送队列的最大消息数
+CLIENT_CONTROL_QUEUE_SIZE = 256  # 每个客户端事件和控制消息队列的最大消息数，这些消息不丢弃，积压超过时断开该客户端
+CLIENT_QUEUE_POLICY = 'drop_oldest'  # 队列满时的策略: 'drop_oldest'、'latest' 或 'disconnect'
+CLIENT_MAX_LAG = 5.0           # disconnect 策略下允许持续积压的最长时间（秒）
+DISPLAY_WINDOW_SECONDS = 10.0  # 客户端图表默认显示的时间窗口（秒），用于按像素宽度抽取
+EVENT_LOOP_LAG_INTERVAL = 0.1  # 事件循环延迟的采样间隔（秒）
+EVENT_LOOP_LAG_WINDOW = 600    # /api/metrics 统计最近多少个事件循环延迟样本
+
+# 录制配置
+RECORDING_ENABLED = True       # 设备连接后自动录制原始和滤波后的数据
+RECORDING_DIR = 'recordings'   # 录制文件根目录，按 设备/会话 分目录保存
+RECORDING_CHUNK_SAMPLES = SAMPLING_RATE * 60  # 每个分块文件的样本数（1 kHz 下 1 分钟约 1.9 MB）
+RECORDING_COMMIT_INTERVAL = 1.0  # 组提交间隔（秒），每个间隔写入并 fsync 一次
+RECORDING_QUEUE_SIZE = 4096    # 事件循环与写线程之间的数据块队列长度
+RECORDING_PYRAMID_FACTORS = (10, 100, 1000, 10000)  # 历史数据金字塔各层每个桶汇总的样本数，须逐层整除
+HISTORY_MAX_POINTS = 10000     # /api/history 单次返回的最大桶数
+REPLAY_BLOCK_SECONDS = 0.02    # 回放录制数据时每个批次的时长（秒）
+
+# 分析进程池配置
+ANALYTICS_WORKERS = 2          # 心搏检测、特征提取、频谱图的工作进程数，0 表示在事件循环中直接计算
+ANALYTICS_SHM_SAMPLES = SAMPLING_RATE * 10  # 每个工作进程共享内存环形区的样本数，更大的数据块随消息发送
+ANALYTICS_TIMEOUT = 5.0        # 等待分析结果的超时（秒）
+ANALYTICS_MAX_PENDING = 256    # 每个数据流最多积压的未完成分析块数（约数秒的数据），超过时新数据块不再分析
+ANALYTICS_HEALTH_INTERVAL = 0.5  # 检查工作进程是否退出的间隔（秒），退出的进程会被重新启动
+
+# 模拟器配置
+SIMULATOR_SEED = 0             # 模拟数据随机种子，None 表示每次运行不同
+SIMULATOR_BLOCK_SECONDS = 0.02 # 模拟器每次生成的数据时长（秒）
+SIMULATOR_NOISE = 0.02         # 白噪声标准差
+SIMULATOR_ABNORMAL_PERIOD = 30 # 每隔多少秒切换一次正常/异常状态，None 表示一直正常
+SIMULATOR_ABNORMAL_PATTERN = 'tachycardia'  # 异常状态使用的模式，见 SIMULATOR_PATTERNS
+# 心率（次/分）、逐搏心率抖动比例、早搏概率、幅度倍数、噪声倍数
+SIMULATOR_NORMAL = {'rate': 72, 'jitter': 0.03, 'premature': 0.0, 'amplitude': 1.0, 'noise': 1.0}
+SIMULATOR_PATTERNS = {
+    'tachycardia': {'rate': 120, 'jitter': 0.03, 'amplitude': 1.8, 'noise': 3.0},  # 心动过速
+    'bradycardia': {'rate': 45, 'jitter': 0.03, 'amplitude': 0.8, 'noise': 1.0},   # 心动过缓
+    'arrhythmia': {'rate': 80, 'jitter': 0.2, 'premature': 0.15, 'amplitude': 1.0, 'noise': 1.5},  # 心律不齐
+    'weak': {'rate': 72, 'jitter': 0.03, 'amplitude': 0.3, 'noise': 1.0},          # 脉弱
+}
+
+# 脉搏检测配置
+BEAT_SLOPE_WINDOW = 0.12       # 斜率和窗口（秒），约为收缩期上升支的时长
+BEAT_THRESHOLD_RATIO = 0.6     # 检测阈值占最近斜率和峰值的比例
+BEAT_THRESHOLD_SECONDS = 3.0   # 用于计算阈值的最近数据时长（秒）
+BEAT_REFRACTORY = 0.25         # 两次心搏的最小间隔（秒）
+BEAT_INTERVAL_RANGE = (0.25, 2.0)  # 有效心搏间期范围（秒），即 30~240 次/分
+BEAT_RATE_BEATS = 8            # 脉率取最近多少个心搏间期的中位数
+BEAT_TIMEOUT = 3.0             # 超过该时长（秒）没有检测到心搏时脉率无效
+
+# 告警配置（范围见 PULSE_RANGES、PULSE_RATE_RANGES）
+ALERT_HYSTERESIS = 0.05        # 退出告警需回到缩小了该比例（占安全范围宽度）的范围内
+ALERT_CLEAR_SECONDS = 1.0      # 退出告警需距上次越界至少该时长（秒）
+ALERT_HISTORY_SIZE = 1000      # 每个数据流保存的最近告警事件数
+
+# 脉搏特征配置
+FEATURE_FOOT_SEARCH = 0.15     # 在心搏检测起点之前多长时间内（秒）找波谷
+FEATURE_FFT_SIZE = 128         # 每个心搏重采样的点数（rfft 长度）
+FEATURE_HARMONICS = 6          # 计算到第几次谐波
+FEATURE_WINDOW_BEATS = 10      # 窗口统计使用最近多少个心搏
+
+# 频谱图（短时傅里叶变换）配置
+STFT_WINDOW = 512              # 每帧样本数（频率分辨率 = 采样率 / 窗长）
+STFT_HOP = 128                 # 帧移样本数，小于窗长时相邻帧重叠
+STFT_MAX_FREQ = 120            # 只发送该频率（Hz）以下的频点，需覆盖工频及其二次谐波
+STFT_DB_RANGE = (-80.0, 20.0)  # 幅度（dB，正弦幅度 1 为 0 dB）量化为 0~255 的范围
 
 # 安全范围配置
 PULSE_RANGES = {
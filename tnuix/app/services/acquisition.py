@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+import serial
+
+from app.core.config import (
+    DEFAULT_BAUDRATE, SERIAL_PROTOCOL, SERIAL_READ_TIMEOUT, ACQUISITION_QUEUE_SIZE
+)
+from app.services.frame_decoder import create_frame_decoder
+
+
+class SerialAcquisitionEngine:
+    """串口采集引擎
+
+    在独立的读线程中阻塞读取串口（有数据即唤醒，不轮询），每次唤醒用一次批量读取
+    取走 in_waiting 中的全部字节交给增量解码器，把解码后的样本批次
+    （shape 为 (N, 5) 的数组）通过有界队列交给事件循环。
+    队列满时丢弃最旧的批次，读线程永远不会等待事件循环。
+    """
+
+    def __init__(self, port: str, baudrate: int = DEFAULT_BAUDRATE,
+                 protocol: str = SERIAL_PROTOCOL, queue_size: int = ACQUISITION_QUEUE_SIZE):
+        self.port = port
+        self.baudrate = baudrate
+        self.protocol = protocol
+        self.connection: Optional[serial.Serial] = None
+        self.error: Optional[str] = None
+        self.dropped_batches = 0
+        self.cpu_seconds = 0.0  # 读线程累计占用的 CPU 时间
+        self.decoder = create_frame_decoder(protocol)
+        self._queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """打开串口并启动读线程，必须在事件循环所在线程中调用"""
+        self._loop = loop or asyncio.get_event_loop()
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self.connection = serial.Serial(
+            port=self.port,
+            baudrate=self.baudrate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=SERIAL_READ_TIMEOUT
+        )
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"serial-reader-{self.port}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """停止读线程并关闭串口"""
+        self._stop_event.set()
+        if self.connection is not None and hasattr(self.connection, 'cancel_read'):
+            # 唤醒阻塞在 read 上的读线程，不必等到读取超时
+            self.connection.cancel_read()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        if self.connection is not None and self.connection.is_open:
+            try:
+                self.connection.close()
+            except Exception as e:
+                logging.error(f"关闭串口失败: {e}")
+
+    async def get_batch(self) -> Optional[np.ndarray]:
+        """等待下一个样本批次，读线程结束时返回 None"""
+        if self._queue is None:
+            return None
+        return await self._queue.get()
+
+    def _run(self):
+        """读线程主循环"""
+        connection = self.connection
+        cpu_start = time.thread_time()
+        try:
+            while not self._stop_event.is_set():
+                # 无数据时阻塞等待第一个字节（或超时），有数据时一次读完缓冲区
+                data = connection.read(max(1, connection.in_waiting))
+                if not data:
+                    continue
+                batch = self.decoder.feed(data)
+                if batch is not None:
+                    self._loop.call_soon_threadsafe(self._put, batch)
+                self.cpu_seconds = time.thread_time() - cpu_start
+        except Exception as e:
+            if not self._stop_event.is_set():
+                self.error = str(e)
+                logging.error(f"串口读线程异常退出: {e}")
+        finally:
+            # 通知消费者读线程已结束
+            try:
+                self._loop.call_soon_threadsafe(self._put, None)
+            except RuntimeError:
+                pass
+
+    def _put(self, batch: Optional[np.ndarray]):
+        """在事件循环线程中入队，队列满时丢弃最旧的批次"""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped_batches += 1
+        self._queue.put_nowait(batch)
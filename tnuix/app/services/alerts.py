@@ -0,0 +1,156 @@
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import (
+    PULSE_RANGES, PULSE_RATE_RANGES, ALERT_HYSTERESIS, ALERT_CLEAR_SECONDS, ALERT_HISTORY_SIZE
+)
+
+# 告警级别：安全范围内为 normal，超出安全范围为 warning，超出警告范围为 danger
+LEVELS = ('normal', 'warning', 'danger')
+
+
+class RangeMonitor:
+    """按安全/警告范围对整块数据分级，带回差，输出告警事件
+
+    每个边界（安全范围、警告范围）是一个施密特触发器：越出范围立即进入该级别；
+    回到缩小了 hysteresis（占安全范围宽度的比例）的范围内、且距上次越界已超过 clear_seconds 秒，
+    才退出该级别，信号在阈值附近抖动时不会反复告警。
+    分级、回差和状态前向填充对整块数据向量化完成，只有级别变化的少数位置逐个生成事件。
+    """
+
+    def __init__(self, ranges: Dict[str, Dict[str, List[float]]], hysteresis: float = ALERT_HYSTERESIS,
+                 clear_seconds: float = ALERT_CLEAR_SECONDS):
+        self.channels = tuple(ranges)
+        safe = np.array([ranges[name]['safe'] for name in self.channels], dtype=np.float64)
+        warning = np.array([ranges[name]['warning'] for name in self.channels], dtype=np.float64)
+        margin = hysteresis * (safe[:, 1] - safe[:, 0])
+        self._bounds = [(bounds[:, 0:1], bounds[:, 1:2], margin[:, None]) for bounds in (safe, warning)]
+        self._safe_center = safe.mean(axis=1)
+        self._safe_half = (safe[:, 1] - safe[:, 0]) / 2
+        self.clear_seconds = clear_seconds
+        self.reset()
+
+    def reset(self):
+        """清空告警状态（重新连接时调用）"""
+        count = len(self.channels)
+        self.levels = np.zeros(count, dtype=np.int8)
+        self._states = [np.zeros(count, dtype=bool) for _ in self._bounds]
+        self._last_outside = [np.full(count, -np.inf) for _ in self._bounds]
+        self._active: List[Optional[Dict]] = [None] * count
+        self._peak_excess = np.zeros(count)
+
+    def process(self, timestamps: np.ndarray, values: np.ndarray) -> List[Dict]:
+        """对 (通道数, 样本数) 的一块数据分级，返回本块内的告警事件"""
+        count = values.shape[1]
+        if not count:
+            return []
+        low, high, _ = self._bounds[0]
+        if not self.levels.any() and not self._states[0].any() and \
+                not ((values < low) | (values > high)).any():
+            # 常见情况：没有告警且整块都在安全范围内
+            return []
+        positions = np.arange(count)
+        rows = np.arange(len(self.channels))[:, None]
+        states = []
+        for b, (low, high, margin) in enumerate(self._bounds):
+            # NaN 既不越界也不回到范围内，保持原状态
+            outside = (values < low) | (values > high)
+            last_index = np.maximum.accumulate(np.where(outside, positions, -1), axis=1)
+            last_outside = np.where(last_index >= 0, timestamps[np.maximum(last_index, 0)],
+                                    self._last_outside[b][:, None])
+            inside = (values >= low + margin) & (values <= high - margin) & \
+                (timestamps - last_outside >= self.clear_seconds)
+            # 状态取最近一次越界或回到范围内的结果
+            decisive = np.maximum.accumulate(np.where(outside | inside, positions, -1), axis=1)
+            state = np.where(decisive >= 0, outside[rows, np.maximum(decisive, 0)], self._states[b][:, None])
+            self._states[b] = state[:, -1].copy()
+            self._last_outside[b] = last_outside[:, -1].copy()
+            states.append(state)
+        levels = np.where(states[1], 2, states[0].astype(np.int8)).astype(np.int8)
+        excess = np.abs(values - self._safe_center[:, None]) - self._safe_half[:, None]
+        excess[np.isnan(excess)] = -np.inf
+
+        events = []
+        previous = np.concatenate((self.levels[:, None], levels[:, :-1]), axis=1)
+        for channel in range(len(self.channels)):
+            changes = np.flatnonzero(levels[channel] != previous[channel])
+            if not len(changes) and not self.levels[channel]:
+                continue
+            cursor = 0
+            for index in changes:
+                self._update_peak(channel, values[channel], excess[channel], cursor, index)
+                events.extend(self._transition(channel, int(levels[channel, index]),
+                                               float(timestamps[index]), float(values[channel, index])))
+                cursor = index
+            self._update_peak(channel, values[channel], excess[channel], cursor, count)
+        return events
+
+    def active(self) -> List[Dict]:
+        """尚未结束的告警（峰值为目前为止的峰值）"""
+        return [dict(event) for event in self._active if event is not None]
+
+    def _update_peak(self, channel: int, values: np.ndarray, excess: np.ndarray, start: int, stop: int):
+        event = self._active[channel]
+        if event is None or start >= stop:
+            return
+        index = start + int(np.argmax(excess[start:stop]))
+        if excess[index] > self._peak_excess[channel]:
+            self._peak_excess[channel] = excess[index]
+            event['peak'] = round(float(values[index]), 4)
+
+    def _transition(self, channel: int, level: int, timestamp: float, value: float) -> List[Dict]:
+        events = []
+        current = self._active[channel]
+        if current is not None:
+            events.append(dict(current, event='end', end=timestamp))
+            self._active[channel] = None
+        if level:
+            self._active[channel] = {
+                'event': 'start',
+                'channel': self.channels[channel],
+                'level': LEVELS[level],
+                'start': timestamp,
+                'end': None,
+                'peak': round(value, 4)
+            }
+            self._peak_excess[channel] = -np.inf
+            events.append(dict(self._active[channel]))
+        self.levels[channel] = level
+        return events
+
+
+class AlertMonitor:
+    """单个数据流的告警：三个部位的波形和脉率，并保存最近的告警事件"""
+
+    def __init__(self, history_size: int = ALERT_HISTORY_SIZE):
+        self.waveform = RangeMonitor(PULSE_RANGES)
+        self.pulse_rate = RangeMonitor({'pulse_rate': PULSE_RATE_RANGES})
+        self.history: deque = deque(maxlen=history_size)
+
+    def reset(self):
+        self.waveform.reset()
+        self.pulse_rate.reset()
+
+    def process(self, timestamps: np.ndarray, block: np.ndarray, pulse_rate) -> List[Dict]:
+        """block 为 (3, N) 的寸、关、尺数据，返回按时间排序的告警事件
+
+        pulse_rate 为逐样本的数组，或整块一个值（按块末尾的时刻判断）；空块（如抽取后没有保留样本）不产生事件。
+        """
+        if not len(timestamps):
+            return []
+        events = self.waveform.process(timestamps, block)
+        if np.ndim(pulse_rate) == 0:
+            events += self.pulse_rate.process(timestamps[-1:], np.full((1, 1), pulse_rate, dtype=np.float64))
+        else:
+            events += self.pulse_rate.process(timestamps, np.asarray(pulse_rate, dtype=np.float64)[None, :])
+        events.sort(key=lambda event: event['end'] if event['event'] == 'end' else event['start'])
+        self.history.extend(events)
+        return events
+
+    def active(self) -> List[Dict]:
+        return self.waveform.active() + self.pulse_rate.active()
+
+    def recent(self, limit: int = 100) -> List[Dict]:
+        return list(self.history)[-limit:] if limit > 0 else []
@@ -0,0 +1,501 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import (
+    SAMPLING_RATE, ANALYTICS_WORKERS, ANALYTICS_SHM_SAMPLES, ANALYTICS_TIMEOUT, ANALYTICS_MAX_PENDING,
+    ANALYTICS_HEALTH_INTERVAL
+)
+from app.services.beat_detector import BeatDetector
+from app.services.features import FEATURE_DTYPE, PulseFeatureExtractor
+from app.services.spectrogram import StreamingSpectrogram
+
+# 共享内存环形区每列一个样本: 时间戳和寸、关、尺
+ROWS = 4
+
+
+class DeviceAnalytics:
+    """单个数据流的分析：心搏检测、脉搏波特征和频谱图，状态在各块数据之间延续"""
+
+    def __init__(self, sampling_rate: float = SAMPLING_RATE, input_rate: float = SAMPLING_RATE):
+        self.beat_detector = BeatDetector(sampling_rate)
+        self.features = PulseFeatureExtractor(sampling_rate)
+        self.spectrogram = StreamingSpectrogram(input_rate)
+
+    def reset(self):
+        self.beat_detector.reset()
+        self.features.reset()
+        self.spectrogram.reset()
+
+    def process(self, raw_timestamps: np.ndarray, raw: np.ndarray, timestamps: np.ndarray,
+                filtered: np.ndarray) -> Dict:
+        """raw 为滤波前 (3, N) 的数据（用于频谱图），filtered 为滤波（抽取）后 (3, M) 的数据"""
+        beats, pulse_rate = self.beat_detector.process(timestamps, filtered)
+        features = self.features.process(timestamps, filtered, beats)
+        return {
+            'beats': beats,
+            'pulse_rate': pulse_rate,
+            'beat_counts': self.beat_detector.beat_counts.copy(),
+            'features': features,
+            'feature_windows': self.features.window_summaries(np.unique(features['channel']).tolist()),
+            'spectrogram': self.spectrogram.process(raw_timestamps, raw)
+        }
+
+
+def empty_result(channels: int = 3) -> Dict:
+    """没有分析结果的数据块（分析失败、超时或积压过多时）"""
+    return {
+        'beats': [np.zeros(0) for _ in range(channels)],
+        'pulse_rate': float('nan'),
+        'beat_counts': None,
+        'features': np.zeros(0, dtype=FEATURE_DTYPE),
+        'feature_windows': {},
+        'spectrogram': None
+    }
+
+
+class InlineAnalytics:
+    """在事件循环中直接计算（未启用进程池时使用）"""
+
+    def __init__(self, sampling_rate: float, input_rate: float):
+        self.analytics = DeviceAnalytics(sampling_rate, input_rate)
+
+    async def process(self, raw_timestamps: np.ndarray, raw: np.ndarray, timestamps: np.ndarray,
+                      filtered: np.ndarray) -> Dict:
+        return self.analytics.process(raw_timestamps, raw, timestamps, filtered)
+
+    def reset(self):
+        self.analytics.reset()
+
+    def close(self):
+        pass
+
+
+class RemoteAnalytics:
+    """工作进程中某个数据流的 DeviceAnalytics 的代理，接口与 InlineAnalytics 相同"""
+
+    def __init__(self, pool: 'AnalyticsPool', key: str, sampling_rate: float, input_rate: float):
+        self.pool = pool
+        self.key = key
+        self._args = (sampling_rate, input_rate)
+        pool.open(key, self._args)
+
+    async def process(self, raw_timestamps: np.ndarray, raw: np.ndarray, timestamps: np.ndarray,
+                      filtered: np.ndarray) -> Dict:
+        return await self.pool.submit(self.key, raw_timestamps, raw, timestamps, filtered)
+
+    def reset(self):
+        # 重新创建工作进程中的分析状态
+        self.pool.open(self.key, self._args)
+
+    def close(self):
+        self.pool.close(self.key)
+
+
+class BackgroundAnalytics:
+    """不等待结果的数据流分析：数据块先录制和推送，分析结果到达后再交给回调
+
+    每个数据块一个任务，同一数据流的任务按提交顺序完成；分析失败或超时时该块没有分析结果，
+    未完成的块超过 max_pending 个时新数据块不再分析。检测到的心搏先保存起来，随下一个数据块推送。
+    """
+
+    def __init__(self, analytics, max_pending: int = ANALYTICS_MAX_PENDING, channels: int = 3):
+        self.analytics = analytics  # InlineAnalytics 或 RemoteAnalytics
+        self.max_pending = max_pending
+        self.channels = channels
+        self.failed = 0
+        self.skipped = 0
+        self.wait_seconds = 0.0  # 从提交到得到结果的累计时间
+        self._tasks: Set[asyncio.Task] = set()
+        self._clear()
+
+    def _clear(self):
+        self.pulse_rate = float('nan')  # 最近一次分析得到的脉率
+        self.beat_counts = np.zeros(self.channels, dtype=np.int64)
+        self._beats: List[List[np.ndarray]] = [[] for _ in range(self.channels)]
+
+    def submit(self, raw_timestamps: np.ndarray, raw: np.ndarray, timestamps: np.ndarray, filtered: np.ndarray,
+               on_result: Optional[Callable[[Dict], Awaitable]] = None) -> bool:
+        """提交一块数据，不等待结果；积压过多没有提交时返回 False"""
+        if len(self._tasks) >= self.max_pending:
+            self.skipped += 1
+            return False
+        task = asyncio.create_task(self._run((raw_timestamps, raw, timestamps, filtered), on_result))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def take_beats(self) -> List[np.ndarray]:
+        """取出上次调用以来检测到的各通道心搏时间戳"""
+        beats = [np.concatenate(times) if times else np.zeros(0) for times in self._beats]
+        self._beats = [[] for _ in range(self.channels)]
+        return beats
+
+    async def drain(self):
+        """等待已提交的数据块全部分析完成"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def reset(self):
+        self._cancel()
+        self.analytics.reset()
+        self._clear()
+
+    def close(self):
+        self._cancel()
+        self.analytics.close()
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._tasks),
+            "failed": self.failed,
+            "skipped": self.skipped
+        }
+
+    def _cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    async def _run(self, args: Tuple, on_result: Optional[Callable[[Dict], Awaitable]]):
+        started = time.perf_counter()
+        try:
+            result = await self.analytics.process(*args)
+        except Exception as e:
+            self.failed += 1
+            logging.warning(f"数据块分析失败，该块没有分析结果: {e}")
+            result = empty_result(self.channels)
+        self.wait_seconds += time.perf_counter() - started
+        self.pulse_rate = result['pulse_rate']
+        if result['beat_counts'] is not None:
+            self.beat_counts = result['beat_counts']
+        for channel, beats in enumerate(result['beats']):
+            if len(beats):
+                self._beats[channel].append(beats)
+        if on_result is not None:
+            try:
+                await on_result(result)
+            except Exception as e:
+                logging.error(f"分发分析结果失败: {e}")
+
+
+class SharedRing:
+    """共享内存环形区的空间分配（只在事件循环中使用）
+
+    工作进程按提交顺序处理数据块，空间也按提交顺序释放；放不下末尾时从头开始。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._spans: deque = deque()  # 尚未释放的 (起点, 终点)
+        self._head = 0
+
+    def reserve(self, count: int) -> Optional[int]:
+        """分配 count 列，空间不足时返回 None"""
+        if count > self.capacity:
+            return None
+        if not self._spans:
+            start = 0
+        else:
+            tail = self._spans[0][0]
+            if self._spans[-1][0] >= tail:
+                # 未回绕，已用空间为 [tail, head)，先用末尾，不够再用开头
+                if self.capacity - self._head >= count:
+                    start = self._head
+                elif tail >= count:
+                    start = 0
+                else:
+                    return None
+            else:
+                # 已回绕，已用空间为 [tail, capacity) 和 [0, head)
+                if tail - self._head < count:
+                    return None
+                start = self._head
+        self._spans.append((start, start + count))
+        self._head = start + count
+        return start
+
+    def release(self):
+        """释放最早分配的空间"""
+        self._spans.popleft()
+
+
+def _worker_main(shm_name: str, capacity: int, tasks, results):
+    """工作进程：按数据流保存分析状态，从共享内存读取数据块"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray((ROWS, capacity), dtype=np.float64, buffer=shm.buf)
+    states: Dict[str, DeviceAnalytics] = {}
+    try:
+        while True:
+            message = tasks.get()
+            if message is None:
+                break
+            command, key, job, payload = message
+            if command == 'open':
+                states[key] = DeviceAnalytics(*payload)
+                continue
+            if command == 'close':
+                states.pop(key, None)
+                continue
+            started = time.perf_counter()
+            try:
+                start, raw_count, count, columns = payload
+                if columns is None:
+                    columns = ring[:, start:start + raw_count + count].copy()
+                result = states[key].process(columns[0, :raw_count], columns[1:, :raw_count],
+                                             columns[0, raw_count:], columns[1:, raw_count:])
+                results.put((job, result, None, time.perf_counter() - started))
+            except Exception:
+                results.put((job, None, traceback.format_exc(), time.perf_counter() - started))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del ring
+        shm.close()
+
+
+class AnalyticsPool:
+    """分析任务的工作进程池
+
+    心搏检测、特征提取和频谱图在工作进程中计算，事件循环只做 I/O。
+    每个数据流的分析状态固定在一个工作进程中（按数据流个数均衡分配），不同数据流在多个核上并行。
+    提交时把数据块复制到该进程的共享内存环形区，消息中只有位置和样本数，不序列化数组；
+    环形区放不下时该块随消息发送并计数。结果由后台线程从结果队列取回，通过 future 交回事件循环。
+    后台线程同时检查工作进程是否退出：退出的进程未完成的任务以异常结束并释放其共享内存，
+    然后重新启动该进程，并重新创建分配给它的数据流的分析状态。
+    workers 为 0 时不启动进程，在事件循环中直接计算。
+    """
+
+    def __init__(self, workers: int = ANALYTICS_WORKERS, ring_samples: int = ANALYTICS_SHM_SAMPLES,
+                 timeout: float = ANALYTICS_TIMEOUT):
+        self.workers = workers
+        self.ring_samples = ring_samples
+        self.timeout = timeout
+        self.shared_blocks = 0
+        self.pickled_blocks = 0
+        self.errors = 0
+        self.restarts = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._workers: List[Dict] = []
+        self._assignments: Dict[str, int] = {}  # 数据流 -> 工作进程
+        self._stream_args: Dict[str, Tuple] = {}  # 数据流 -> DeviceAnalytics 参数，重启进程时使用
+        self._futures: Dict[int, Tuple[asyncio.Future, Dict, bool]] = {}
+        self._jobs = itertools.count(1)
+        self._results = None
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+    def client(self, key: str, sampling_rate: float = SAMPLING_RATE, input_rate: float = SAMPLING_RATE):
+        """数据流的分析器：启用进程池时为工作进程中的代理，否则在事件循环中直接计算"""
+        if self.workers <= 0:
+            return InlineAnalytics(sampling_rate, input_rate)
+        return RemoteAnalytics(self, key, sampling_rate, input_rate)
+
+    def start(self):
+        if self._workers or self.workers <= 0:
+            return
+        self._stopping = False
+        self._results = self._context.Queue()
+        for index in range(self.workers):
+            shm = shared_memory.SharedMemory(create=True, size=ROWS * self.ring_samples * 8)
+            worker = {
+                'index': index,
+                'shm': shm,
+                'ring': np.ndarray((ROWS, self.ring_samples), dtype=np.float64, buffer=shm.buf),
+                'streams': 0,
+                'jobs': 0,
+                'busy_seconds': 0.0
+            }
+            self._spawn(worker)
+            self._workers.append(worker)
+        self._reader = threading.Thread(target=self._read_results, name="analytics-results", daemon=True)
+        self._reader.start()
+
+    def stop(self):
+        """停止工作进程并释放共享内存，未完成的任务以异常结束"""
+        if not self._workers:
+            return
+        self._stopping = True
+        for worker in self._workers:
+            worker['tasks'].put(None)
+        for worker in self._workers:
+            worker['process'].join(timeout=2)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+        self._results.put(None)
+        self._reader.join(timeout=2)
+        for future, _, _ in self._futures.values():
+            if not future.done():
+                future.get_loop().call_soon_threadsafe(self._fail, future, "分析进程池已停止")
+        self._futures.clear()
+        for worker in self._workers:
+            del worker['ring']
+            worker['shm'].close()
+            worker['shm'].unlink()
+        self._workers = []
+        self._assignments.clear()
+        self._stream_args.clear()
+
+    def open(self, key: str, args: Tuple):
+        """在分配给数据流的工作进程中（重新）创建分析状态"""
+        self.start()
+        self._capture_loop()
+        if key not in self._assignments:
+            index = min(range(len(self._workers)), key=lambda i: self._workers[i]['streams'])
+            self._assignments[key] = index
+            self._workers[index]['streams'] += 1
+        self._stream_args[key] = args
+        self._workers[self._assignments[key]]['tasks'].put(('open', key, 0, args))
+
+    def close(self, key: str):
+        index = self._assignments.pop(key, None)
+        self._stream_args.pop(key, None)
+        if index is not None and self._workers:
+            self._workers[index]['streams'] -= 1
+            self._workers[index]['tasks'].put(('close', key, 0, None))
+
+    async def submit(self, key: str, raw_timestamps: np.ndarray, raw: np.ndarray, timestamps: np.ndarray,
+                     filtered: np.ndarray) -> Dict:
+        """把数据块交给数据流所在的工作进程，等待分析结果"""
+        if key not in self._assignments:
+            raise RuntimeError(f"数据流 {key} 没有分析状态")
+        self._loop = asyncio.get_running_loop()
+        worker = self._workers[self._assignments[key]]
+        if not worker['process'].is_alive():
+            # 后台线程发现后会重新启动该进程
+            raise RuntimeError(f"分析工作进程 {worker['index']} 已退出")
+        raw_count, count = len(raw_timestamps), len(timestamps)
+        start = worker['allocator'].reserve(raw_count + count)
+        if start is None:
+            columns = np.empty((ROWS, raw_count + count))
+            self.pickled_blocks += 1
+        else:
+            columns = worker['ring'][:, start:start + raw_count + count]
+            self.shared_blocks += 1
+        columns[0, :raw_count] = raw_timestamps
+        columns[1:, :raw_count] = raw
+        columns[0, raw_count:] = timestamps
+        columns[1:, raw_count:] = filtered
+        # 使用共享内存时消息中只有位置和样本数
+        payload = (start, raw_count, count, columns if start is None else None)
+
+        job = next(self._jobs)
+        future = self._loop.create_future()
+        self._futures[job] = (future, worker, start is not None)
+        worker['pending'] += 1
+        worker['tasks'].put(('process', key, job, payload))
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            alive = worker['process'].is_alive()
+            raise RuntimeError(f"等待分析结果超时（工作进程 {worker['index']} {'运行中' if alive else '已退出'}）")
+
+    def stats(self) -> Dict:
+        return {
+            "workers": [{
+                "pid": worker['process'].pid,
+                "alive": worker['process'].is_alive(),
+                "streams": worker['streams'],
+                "pending": worker['pending'],
+                "jobs": worker['jobs'],
+                "busy_seconds": round(worker['busy_seconds'], 6)
+            } for worker in self._workers],
+            "shared_blocks": self.shared_blocks,
+            "pickled_blocks": self.pickled_blocks,
+            "errors": self.errors,
+            "restarts": self.restarts
+        }
+
+    def _spawn(self, worker: Dict):
+        """为工作进程创建新的任务队列和空的环形区分配，并启动进程"""
+        worker['tasks'] = self._context.Queue()
+        worker['allocator'] = SharedRing(self.ring_samples)
+        worker['pending'] = 0
+        worker['restarting'] = False
+        worker['process'] = self._context.Process(
+            target=_worker_main, name=f"analytics-{worker['index']}", daemon=True,
+            args=(worker['shm'].name, self.ring_samples, worker['tasks'], self._results))
+        worker['process'].start()
+
+    def _capture_loop(self):
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+
+    def _read_results(self):
+        checked = time.monotonic()
+        while True:
+            try:
+                message = self._results.get(timeout=ANALYTICS_HEALTH_INTERVAL)
+            except queue.Empty:
+                message = ()
+            if message is None:
+                break
+            loop = self._loop
+            if loop is None or loop.is_closed():
+                continue
+            if message:
+                loop.call_soon_threadsafe(self._complete, *message)
+            if time.monotonic() - checked >= ANALYTICS_HEALTH_INTERVAL:
+                checked = time.monotonic()
+                for worker in list(self._workers):
+                    if not self._stopping and not worker['restarting'] and not worker['process'].is_alive():
+                        worker['restarting'] = True
+                        loop.call_soon_threadsafe(self._restart, worker)
+
+    def _restart(self, worker: Dict):
+        """结束已退出的工作进程未完成的任务，重新启动进程并重新创建其数据流的分析状态"""
+        if self._stopping or worker not in self._workers:
+            return
+        logging.error(f"分析工作进程 {worker['index']} 已退出（退出码 {worker['process'].exitcode}），重新启动")
+        self.restarts += 1
+        for job, (future, owner, _) in list(self._futures.items()):
+            if owner is worker:
+                del self._futures[job]
+                self._fail(future, f"分析工作进程 {worker['index']} 已退出")
+        worker['tasks'].cancel_join_thread()
+        worker['tasks'].close()
+        # 新的分配器从空的环形区开始，等于释放了未完成任务占用的共享内存
+        self._spawn(worker)
+        for key, index in self._assignments.items():
+            if index == worker['index']:
+                worker['tasks'].put(('open', key, 0, self._stream_args[key]))
+
+    def _complete(self, job: int, result: Optional[Dict], error: Optional[str], seconds: float):
+        entry = self._futures.pop(job, None)
+        if entry is None:
+            return
+        future, worker, shared = entry
+        # 工作进程按提交顺序处理，共享内存也按顺序释放
+        if shared:
+            worker['allocator'].release()
+        worker['pending'] -= 1
+        worker['jobs'] += 1
+        worker['busy_seconds'] += seconds
+        if error is not None:
+            self.errors += 1
+            logging.error(f"分析任务失败: {error}")
+            self._fail(future, error.strip().splitlines()[-1])
+        elif not future.done():
+            future.set_result(result)
+
+    @staticmethod
+    def _fail(future: asyncio.Future, message: str):
+        if not future.done():
+            future.set_exception(RuntimeError(message))
+
+
+# 创建全局分析进程池实例（第一个数据流使用时启动）
+analytics_pool = AnalyticsPool()
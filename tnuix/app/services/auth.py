@@ -1,38 +1,145 @@
 import hashlib
+import heapq
 import secrets
+import threading
 import time
-from typing import Optional, Dict
-from fastapi import HTTPException, status, Cookie, Depends
-from app.core.config import USERS, SESSION_EXPIRY
+from typing import Optional, Dict, List, Tuple
+from fastapi import HTTPException, status, Cookie
+from app.core.config import USERS, SESSION_EXPIRY, SESSION_REFRESH_INTERVAL, SESSION_MAX_COUNT
 from app.models.user import User, UserSession
 
+
+class SessionStore:
+    """带过期时间的会话存储
+
+    过期时间保存在按时间排序的最小堆中，后台定时 sweep 从堆顶弹出已过期的会话，
+    不再依赖同一个 cookie 再次出现才删除。滑动过期不在每个请求中改写过期时间：
+    请求只记录最近访问时间（同一会话 refresh_interval 秒内只记录一次），sweep 时批量写入并入堆，
+    堆中旧的条目在弹出时按过期时间不一致跳过，条目过多时重建。
+    会话数达到 max_count 时先清理过期会话，仍然已满则淘汰最早过期的会话。
+    FastAPI 在线程池中调用同步依赖，所有操作都在锁内完成。
+    """
+
+    def __init__(self, expiry: float = SESSION_EXPIRY, refresh_interval: float = SESSION_REFRESH_INTERVAL,
+                 max_count: int = SESSION_MAX_COUNT):
+        self.expiry = expiry
+        self.refresh_interval = refresh_interval
+        self.max_count = max_count
+        self.expired = 0
+        self.evicted = 0
+        self._sessions: Dict[str, UserSession] = {}
+        self._heap: List[Tuple[float, str]] = []  # (过期时间, 会话ID)
+        self._touched: Dict[str, float] = {}  # 尚未写入过期时间的最近访问时间
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def create(self, username: str) -> str:
+        """创建新的会话，返回会话ID"""
+        session_id = secrets.token_hex(16)
+        now = time.time()
+        with self._lock:
+            if len(self._sessions) >= self.max_count:
+                self._sweep(now)
+                while len(self._sessions) >= self.max_count and self._evict_earliest():
+                    self.evicted += 1
+            session = UserSession(username=username, created_at=now, expires_at=now + self.expiry)
+            self._sessions[session_id] = session
+            heapq.heappush(self._heap, (session.expires_at, session_id))
+        return session_id
+
+    def get(self, session_id: str) -> Optional[str]:
+        """会话有效时返回用户名并记录访问时间（滑动过期），已过期时删除会话"""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            last = self._touched.get(session_id, session.expires_at - self.expiry)
+            if now > last + self.expiry:
+                self._remove(session_id)
+                self.expired += 1
+                return None
+            if now - last >= self.refresh_interval:
+                self._touched[session_id] = now
+            return session.username
+
+    def remove(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+
+    def sweep(self) -> int:
+        """写入积累的访问时间并删除已过期的会话，返回删除的个数"""
+        with self._lock:
+            return self._sweep(time.time())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "heap_entries": len(self._heap),
+                "pending_refreshes": len(self._touched),
+                "expired": self.expired,
+                "evicted": self.evicted
+            }
+
+    def _remove(self, session_id: str):
+        # 堆中的条目在弹出时跳过
+        self._sessions.pop(session_id, None)
+        self._touched.pop(session_id, None)
+
+    def _apply_refreshes(self):
+        for session_id, last in self._touched.items():
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.expires_at = last + self.expiry
+                heapq.heappush(self._heap, (session.expires_at, session_id))
+        self._touched.clear()
+
+    def _sweep(self, now: float) -> int:
+        self._apply_refreshes()
+        removed = 0
+        while self._heap and self._heap[0][0] < now:
+            expires_at, session_id = heapq.heappop(self._heap)
+            session = self._sessions.get(session_id)
+            if session is not None and session.expires_at == expires_at:
+                del self._sessions[session_id]
+                removed += 1
+        if len(self._heap) > 2 * len(self._sessions) + 64:
+            # 刷新和删除留下的旧条目过多时重建堆
+            self._heap = [(session.expires_at, session_id) for session_id, session in self._sessions.items()]
+            heapq.heapify(self._heap)
+        self.expired += removed
+        return removed
+
+    def _evict_earliest(self) -> bool:
+        """淘汰过期时间最早的会话，没有会话时返回 False"""
+        self._apply_refreshes()
+        while self._heap:
+            expires_at, session_id = heapq.heappop(self._heap)
+            session = self._sessions.get(session_id)
+            if session is not None and session.expires_at == expires_at:
+                del self._sessions[session_id]
+                return True
+        return False
+
+
 # 会话存储
-sessions: Dict[str, UserSession] = {}
+sessions = SessionStore()
 
 def create_session(username: str) -> str:
     """创建新的会话"""
-    session_id = secrets.token_hex(16)
-    sessions[session_id] = UserSession(
-        username=username,
-        created_at=time.time(),
-        expires_at=time.time() + SESSION_EXPIRY
-    )
-    return session_id
+    return sessions.create(username)
 
 def verify_session(session_id: Optional[str] = Cookie(None)) -> Optional[str]:
-    """验证会话是否有效"""
-    if not session_id or session_id not in sessions:
-        return None
-    
-    session = sessions[session_id]
-    if time.time() > session.expires_at:
-        # 会话已过期
-        del sessions[session_id]
+    """验证会话是否有效（有效时延长过期时间）"""
+    if not session_id:
         return None
-        
-    # 更新会话过期时间
-    session.expires_at = time.time() + SESSION_EXPIRY
-    return session.username
+    return sessions.get(session_id)
 
 def get_current_user(session_id: Optional[str] = Cookie(None)) -> str:
     """获取当前用户，用作依赖项"""
@@ -0,0 +1,156 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from app.core.config import (
+    SAMPLING_RATE, NOTCH_FREQ, BEAT_SLOPE_WINDOW, BEAT_THRESHOLD_RATIO, BEAT_THRESHOLD_SECONDS,
+    BEAT_REFRACTORY, BEAT_INTERVAL_RANGE, BEAT_RATE_BEATS, BEAT_TIMEOUT
+)
+
+# 阈值按 0.5 秒一段的斜率和峰值计算
+SEGMENT_SECONDS = 0.5
+
+
+def moving_sum(tail: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """沿 axis=1 的滑动和，tail 为上一块最后 length 个值
+
+    返回 values 每个位置及之前共 length 个值之和，以及新的 tail。
+    """
+    length = tail.shape[1]
+    history = np.concatenate((tail, values), axis=1)
+    cumulative = np.cumsum(history, axis=1)
+    return cumulative[:, length:] - cumulative[:, :values.shape[1]], history[:, -length:]
+
+
+class BeatDetector:
+    """流式脉搏心搏检测，各通道独立检测
+
+    先用两级长度为一个工频周期的滑动平均做低通（正好滤掉工频及其谐波并压低噪声），
+    再计算斜率和（最近 window 秒内正斜率之和），
+    斜率和向上越过自适应阈值的时刻即为心搏起点（收缩期上升支），按相邻样本线性插值到亚样本精度。
+    阈值为最近 BEAT_THRESHOLD_SECONDS 秒内斜率和峰值的 BEAT_THRESHOLD_RATIO 倍，
+    峰值按 0.5 秒一段保存，信号幅度变化后几秒内阈值即可跟上。
+    不应期为 BEAT_REFRACTORY 和当前心搏间期一半中的较大者，避免把重搏波当成心搏。
+    脉率为最近 BEAT_RATE_BEATS 个有效心搏间期中位数对应的每分钟次数，对早搏等个别异常间期不敏感。
+    整块数据向量化处理，只有越过阈值的少数时刻逐个判断，内存占用与数据时长无关。
+    """
+
+    def __init__(self, sampling_rate: float = SAMPLING_RATE, channels: int = 3,
+                 mains_freq: float = NOTCH_FREQ, window: float = BEAT_SLOPE_WINDOW,
+                 threshold_ratio: float = BEAT_THRESHOLD_RATIO):
+        self.sampling_rate = sampling_rate
+        self.channels = channels
+        self.threshold_ratio = threshold_ratio
+        self.smoothing = max(int(round(sampling_rate / mains_freq)), 1)
+        self.window = max(int(round(window * sampling_rate)), 1)
+        self.segment = max(int(round(SEGMENT_SECONDS * sampling_rate)), 1)
+        self.beat_counts = np.zeros(channels, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """清空检测状态（重新连接时调用）"""
+        self._smooth_tails = None  # 两级滑动平均各自的最近 smoothing 个输入
+        self._last_time = None
+        self._slopes = np.zeros((self.channels, self.window))  # 最近 window 个正斜率
+        self._last_sum = np.zeros(self.channels)  # 上一个样本的斜率和
+        segments = max(int(round(BEAT_THRESHOLD_SECONDS / SEGMENT_SECONDS)), 1)
+        self._segment_peaks = np.zeros((self.channels, segments))
+        self._segment_index = 0
+        self._segment_fill = 0
+        self._current_peak = np.zeros(self.channels)
+        self._last_beat = np.full(self.channels, -np.inf)
+        self._intervals = np.full((self.channels, BEAT_RATE_BEATS), np.nan)
+        self._interval_counts = np.zeros(self.channels, dtype=np.int64)
+        self._medians = np.full(self.channels, np.nan)  # 各通道心搏间期中位数，只在新增间期时更新
+
+    def process(self, timestamps: np.ndarray, block: np.ndarray) -> Tuple[List[np.ndarray], float]:
+        """处理 (通道数, 样本数) 的一块数据，返回各通道新检测到的心搏时间戳和当前脉率（无效时为 NaN）"""
+        count = block.shape[1]
+        beats: List[List[float]] = [[] for _ in range(self.channels)]
+        if not count:
+            return [np.zeros(0) for _ in beats], self.pulse_rate()
+        if self._smooth_tails is None:
+            # 首块数据以首样本为稳态预热，避免起始的假斜率
+            first = np.repeat(block[:, :1].astype(np.float64), self.smoothing + 1, axis=1)
+            self._smooth_tails = [first[:, 1:], first[:, 1:]]
+            self._last_smooth = first[:, 0]
+        smooth, self._smooth_tails[0] = moving_sum(self._smooth_tails[0], block)
+        smooth, self._smooth_tails[1] = moving_sum(self._smooth_tails[1], smooth / self.smoothing)
+        smooth /= self.smoothing
+        slopes = np.maximum(np.diff(smooth, axis=1, prepend=self._last_smooth[:, None]), 0.0)
+        self._last_smooth = smooth[:, -1]
+
+        # 斜率和: sums[:, k] 为 slopes[:, k] 及之前共 window 个正斜率之和
+        sums, self._slopes = moving_sum(self._slopes, slopes)
+
+        start = 0
+        while start < count:
+            # 按阈值段切分，每段使用开始时的阈值
+            stop = min(count, start + self.segment - self._segment_fill)
+            piece = sums[:, start:stop]
+            threshold = self.threshold_ratio * self._segment_peaks.max(axis=1)
+            before = np.concatenate((self._last_sum[:, None], piece[:, :-1]), axis=1)
+            crossing = (before < threshold[:, None]) & (piece >= threshold[:, None]) & (threshold[:, None] > 0)
+            for channel, index in zip(*np.nonzero(crossing)):
+                position = start + index
+                if position == 0 and self._last_time is None:
+                    continue
+                t0 = timestamps[position - 1] if position else self._last_time
+                t1 = timestamps[position]
+                fraction = (threshold[channel] - before[channel, index]) / (piece[channel, index] - before[channel, index])
+                self._on_beat(channel, float(t0 + fraction * (t1 - t0)), beats)
+
+            self._current_peak = np.maximum(self._current_peak, piece.max(axis=1))
+            self._last_sum = piece[:, -1].copy()
+            self._segment_fill += stop - start
+            if self._segment_fill >= self.segment:
+                self._segment_peaks[:, self._segment_index] = self._current_peak
+                self._segment_index = (self._segment_index + 1) % self._segment_peaks.shape[1]
+                self._current_peak = np.zeros(self.channels)
+                self._segment_fill = 0
+            start = stop
+
+        self._last_time = float(timestamps[-1])
+        return [np.array(channel_beats) for channel_beats in beats], self.pulse_rate()
+
+    def _on_beat(self, channel: int, t: float, beats: List[List[float]]):
+        interval = t - self._last_beat[channel]
+        median = self._medians[channel]
+        refractory = BEAT_REFRACTORY if np.isnan(median) else max(BEAT_REFRACTORY, 0.5 * median)
+        if interval < refractory:
+            return
+        self._last_beat[channel] = t
+        self.beat_counts[channel] += 1
+        beats[channel].append(t)
+        if BEAT_INTERVAL_RANGE[0] <= interval <= BEAT_INTERVAL_RANGE[1]:
+            slot = self._interval_counts[channel] % BEAT_RATE_BEATS
+            self._intervals[channel, slot] = interval
+            self._interval_counts[channel] += 1
+            self._medians = self._median_intervals()
+
+    def _median_intervals(self) -> np.ndarray:
+        """各通道最近心搏间期的中位数，没有间期的通道为 NaN"""
+        counts = np.minimum(self._interval_counts, BEAT_RATE_BEATS)
+        ordered = np.sort(self._intervals, axis=1)  # NaN 排在最后
+        rows = np.arange(self.channels)
+        low = np.maximum((counts - 1) // 2, 0)
+        high = counts // 2
+        median = (ordered[rows, low] + ordered[rows, high]) / 2
+        median[counts == 0] = np.nan
+        return median
+
+    def channel_rates(self) -> np.ndarray:
+        """各通道的脉率（次/分），无效时为 NaN"""
+        rates = 60.0 / self._medians
+        if self._last_time is not None:
+            rates[self._last_time - self._last_beat > BEAT_TIMEOUT] = np.nan
+        rates[self._interval_counts < 2] = np.nan
+        return rates
+
+    def pulse_rate(self) -> float:
+        """设备脉率: 各有效通道脉率的中位数，保留一位小数"""
+        rates = sorted(rate for rate in self.channel_rates().tolist() if not np.isnan(rate))
+        if not rates:
+            return float('nan')
+        middle = len(rates) // 2
+        return round((rates[middle] + rates[(len(rates) - 1) // 2]) / 2, 1)
@@ -0,0 +1,467 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from fastapi import WebSocket
+
+from app.core.config import (
+    BROADCAST_FRAME_RATE, BROADCAST_SEND_TIMEOUT, CLIENT_QUEUE_SIZE, CLIENT_QUEUE_POLICY, CLIENT_MAX_LAG,
+    CLIENT_CONTROL_QUEUE_SIZE, DISPLAY_WINDOW_SECONDS
+)
+from app.services.decimation import MinMaxDecimator
+from app.services.wire_format import CHANNELS, WIRE_FORMATS, pack_frame, pack_spectrogram
+
+# 慢客户端策略
+QUEUE_POLICIES = ('drop_oldest', 'latest', 'disconnect')
+# 默认订阅的通道：三个部位的波形和派生的脉率
+DEFAULT_CHANNELS = CHANNELS + ('pulse_rate',)
+# 可订阅的通道：另有频谱图，需要显式订阅，频谱图只包含同时订阅的部位
+SUBSCRIBABLE_CHANNELS = DEFAULT_CHANNELS + ('spectrogram',)
+_client_ids = itertools.count(1)
+
+
+def display_bucket_seconds(points: int, window: float) -> Optional[float]:
+    """显示窗口内每个 min/max 桶的时长，每个桶输出两个点；points 不大于 0 时不抽取"""
+    if points <= 0 or window <= 0:
+        return None
+    return 2.0 * window / points
+
+
+class Subscription:
+    """客户端订阅：数据流（None 表示全部）、通道和最高帧率"""
+
+    def __init__(self):
+        self.stream: Optional[str] = None
+        self.channels: Tuple[str, ...] = DEFAULT_CHANNELS
+        self.max_fps: float = BROADCAST_FRAME_RATE
+
+    def matches(self, stream: Optional[str]) -> bool:
+        return self.stream is None or self.stream == stream
+
+    def to_dict(self, bucket_seconds: Optional[float]) -> Dict:
+        return {
+            "device_id": self.stream,
+            "channels": list(self.channels),
+            "max_fps": self.max_fps,
+            "bucket_seconds": bucket_seconds
+        }
+
+
+class ClientConnection:
+    """单个 WebSocket 客户端的有界发送队列和发送任务
+
+    入队永远不等待网络；数据队列满时按策略处理:
+    - drop_oldest：丢弃最旧的消息
+    - latest：清空队列只保留最新消息
+    - disconnect：同 drop_oldest，但持续积压超过 max_lag 秒后断开该客户端
+    事件（告警、心搏特征）和控制消息（订阅回复、心跳）放入单独的队列，优先发送且从不丢弃，
+    客户端只根据告警事件更新状态，丢失一个告警结束事件会一直显示过期的告警；
+    该队列积压超过 control_queue_size 条时断开客户端。
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int = CLIENT_QUEUE_SIZE,
+                 policy: str = CLIENT_QUEUE_POLICY, max_lag: float = CLIENT_MAX_LAG,
+                 send_timeout: float = BROADCAST_SEND_TIMEOUT, wire_format: str = 'json',
+                 bucket_seconds: Optional[float] = None, control_queue_size: int = CLIENT_CONTROL_QUEUE_SIZE):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"不支持的队列策略: {policy}")
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"不支持的数据格式: {wire_format}")
+        self.id = next(_client_ids)
+        self.websocket = websocket
+        self.wire_format = wire_format
+        self.bucket_seconds = bucket_seconds  # min/max 抽取的桶时长，None 表示发送全部样本
+        self.subscription = Subscription()
+        self.queue_size = queue_size
+        self.control_queue_size = control_queue_size
+        self.policy = policy
+        self.max_lag = max_lag
+        self.send_timeout = send_timeout
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self._queue: deque = deque()
+        self._control: deque = deque()  # 事件和控制消息，不丢弃
+        self._wakeup = asyncio.Event()
+        self._lagging_since: Optional[float] = None  # 队列开始积压满的时间
+        self._task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._writer())
+
+    def enqueue(self, message: Union[str, bytes], control: bool = False):
+        """把消息放入发送队列，不等待；control 为 True 时为事件或控制消息，不会被丢弃"""
+        if self.closed:
+            return
+        if control:
+            if len(self._control) >= self.control_queue_size:
+                logging.info(f"客户端 {self.id} 事件消息积压超过 {self.control_queue_size} 条，断开连接")
+                self._close_later()
+                return
+            self._control.append(message)
+            self._wakeup.set()
+            return
+        if len(self._queue) >= self.queue_size:
+            now = time.monotonic()
+            if self._lagging_since is None:
+                self._lagging_since = now
+            if self.policy == 'latest':
+                self.dropped += len(self._queue)
+                self._queue.clear()
+            else:
+                self._queue.popleft()
+                self.dropped += 1
+                if self.policy == 'disconnect' and now - self._lagging_since > self.max_lag:
+                    logging.info(f"客户端 {self.id} 积压超过 {self.max_lag} 秒，断开连接")
+                    self._close_later()
+                    return
+        self._queue.append(message)
+        self._wakeup.set()
+
+    async def _writer(self):
+        try:
+            while not self.closed:
+                if not self._queue and not self._control:
+                    self._lagging_since = None
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                message = self._control.popleft() if self._control else self._queue.popleft()
+                if isinstance(message, bytes):
+                    await asyncio.wait_for(self.websocket.send_bytes(message), self.send_timeout)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.debug(f"发送数据到客户端 {self.id} 失败: {e}")
+            await self.close()
+
+    async def close(self):
+        """停止发送并关闭连接"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._control.clear()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+    def _close_later(self):
+        # 保存任务引用，避免任务被回收
+        if self._close_task is None:
+            self._close_task = asyncio.create_task(self.close())
+
+    def stats(self) -> Dict:
+        lag = 0.0 if self._lagging_since is None else time.monotonic() - self._lagging_since
+        return {
+            "id": self.id,
+            "policy": self.policy,
+            "format": self.wire_format,
+            "subscription": self.subscription.to_dict(self.bucket_seconds),
+            "queue_depth": len(self._queue),
+            "queue_size": self.queue_size,
+            "control_queue_depth": len(self._control),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "lag_seconds": round(lag, 3),
+            "closed": self.closed
+        }
+
+
+class Broadcaster:
+    """批量 WebSocket 广播器
+
+    数据块先按数据流累积，按客户端订阅的帧率合并成一帧（每个通道一个数组），
+    放入每个客户端自己的发送队列，由客户端的发送任务并发发出，广播本身从不等待网络。
+    只为有人订阅的数据流累积数据；抽取按 (数据流, 帧率, 分辨率, 通道) 每帧只算一次，
+    编码再按 (分辨率, 通道, 格式) 每帧只做一次。
+    """
+
+    def __init__(self, frame_rate: float = BROADCAST_FRAME_RATE):
+        self.frame_rate = frame_rate
+        self.clients: List[ClientConnection] = []
+        self._routes: Dict[str, List[float]] = {}  # 数据流 -> 订阅该数据流的客户端帧率
+        self._meta: Dict[str, Dict] = {}  # 每个数据流最新的附加字段
+        self._pending: Dict[Tuple[str, float], List[Dict]] = {}  # (数据流, 帧率) -> 待发送的数据块
+        self._next_due: Dict[Tuple[str, float], float] = {}
+        self._sequence: Dict[Tuple[str, float], int] = {}  # 帧序号
+        self._decimators: Dict[Tuple, MinMaxDecimator] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(self, stream: str, block: Dict, **meta):
+        """登记一个数据块，随订阅该数据流的客户端的下一帧发出
+
+        block 中 timestamp、cun、guan、chi 为等长数组，pulse_rate 为数组或标量，
+        可选的 beats 为各通道本块内检测到的心搏时间戳；
+        meta 为帧的附加字段（如 stream_id、device_id、source），同一数据流取最新值。
+        """
+        self._meta.setdefault(stream, {}).update(meta)
+        for rate in self._routes_for(stream):
+            self._pending.setdefault((stream, rate), []).append(block)
+
+    def publish_event(self, stream: str, event: Dict):
+        """立即把事件（如告警）发给订阅了该数据流及事件通道的客户端，事件只编码一次"""
+        message = None
+        for client in self.clients:
+            subscription = client.subscription
+            if not subscription.matches(stream) or event.get('channel', 'pulse_rate') not in subscription.channels:
+                continue
+            if message is None:
+                message = self.encode_event(event)
+            client.enqueue(message, control=True)
+
+    def publish_spectrogram(self, stream: str, spectrogram: Dict, **meta):
+        """立即把新的频谱列发给订阅了频谱图的客户端
+
+        频谱只在数据处理时计算一次，这里每种消息格式和部位组合也只编码一次，与客户端数量无关。
+        """
+        messages: Dict[Tuple, Union[str, bytes]] = {}
+        for client in self.clients:
+            subscription = client.subscription
+            if not subscription.matches(stream) or 'spectrogram' not in subscription.channels:
+                continue
+            channels = tuple(position for position in CHANNELS if position in subscription.channels)
+            if not channels:
+                continue
+            key = (WIRE_FORMATS[client.wire_format] is None, channels)
+            if key not in messages:
+                messages[key] = self.encode_spectrogram(dict(meta, **spectrogram), channels, key[0])
+            client.enqueue(messages[key])
+
+    def has_subscribers(self, stream: str) -> bool:
+        return bool(self._routes_for(stream))
+
+    def add_client(self, websocket: WebSocket, policy: str = CLIENT_QUEUE_POLICY,
+                   wire_format: str = 'json', points: int = 0,
+                   window: float = DISPLAY_WINDOW_SECONDS) -> ClientConnection:
+        """注册客户端并启动其发送任务
+
+        wire_format 为 json、binary 或 binary16；points 为客户端在 window 秒的显示窗口内
+        能显示的点数（通常是图表像素宽度），大于 0 时按该分辨率做 min/max 抽取。
+        新客户端默认订阅全部数据流的全部通道，可再通过 subscribe 修改。
+        """
+        bucket_seconds = display_bucket_seconds(points, window)
+        client = ClientConnection(websocket, policy=policy, wire_format=wire_format,
+                                  bucket_seconds=bucket_seconds)
+        client.subscription.max_fps = self.frame_rate
+        client.start()
+        self.clients.append(client)
+        self._update_routes()
+        return client
+
+    def subscribe(self, client: ClientConnection, stream: Optional[str] = None,
+                  channels: Optional[List[str]] = None, max_fps: Optional[float] = None,
+                  points: Optional[int] = None, window: float = DISPLAY_WINDOW_SECONDS) -> Dict:
+        """修改客户端订阅，返回生效的订阅；参数不合法时抛出 ValueError"""
+        subscription = client.subscription
+        if channels is not None:
+            unknown = set(channels) - set(SUBSCRIBABLE_CHANNELS)
+            if unknown:
+                raise ValueError(f"不支持的通道: {sorted(unknown)}")
+        if max_fps is not None and max_fps <= 0:
+            raise ValueError("帧率必须大于 0")
+        if channels is not None:
+            subscription.channels = tuple(c for c in SUBSCRIBABLE_CHANNELS if c in channels)
+        if max_fps is not None:
+            subscription.max_fps = min(float(max_fps), self.frame_rate)
+        if points is not None:
+            client.bucket_seconds = display_bucket_seconds(points, window)
+        subscription.stream = stream
+        self._update_routes()
+        return subscription.to_dict(client.bucket_seconds)
+
+    async def remove_client(self, client: ClientConnection):
+        if client in self.clients:
+            self.clients.remove(client)
+            self._update_routes()
+        await client.close()
+
+    def client_stats(self) -> List[Dict]:
+        return [client.stats() for client in self.clients]
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        """按最高帧率检查各订阅组是否到了发送时间"""
+        interval = 1.0 / self.frame_rate
+        loop = asyncio.get_running_loop()
+        next_frame = loop.time()
+        while True:
+            next_frame += interval
+            try:
+                await self.flush(loop.time())
+            except Exception as e:
+                logging.error(f"广播数据帧失败: {e}")
+            delay = next_frame - loop.time()
+            if delay < 0:
+                # 发送落后时不追帧，直接从当前时间重新计时
+                next_frame = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def flush(self, now: Optional[float] = None):
+        """把到了发送时间的订阅组的数据块合并成帧并发出，now 为 None 时全部发出"""
+        if any(client.closed for client in self.clients):
+            # 清理已关闭的客户端
+            self.clients = [client for client in self.clients if not client.closed]
+            self._update_routes()
+        for key in list(self._pending):
+            if now is not None and now < self._next_due.get(key, 0.0):
+                continue
+            blocks = self._pending.pop(key)
+            stream, rate = key
+            self._next_due[key] = (now or 0.0) + 1.0 / rate
+            clients = [c for c in self.clients if c.subscription.matches(stream) and c.subscription.max_fps == rate]
+            if not blocks or not clients:
+                continue
+            seq = self._sequence.get(key, 0)
+            self._sequence[key] = seq + 1
+            frame = self.build_frame(blocks, self._meta.get(stream, {}), seq)
+            self._send_frame(frame, clients, decimator_key=key)
+
+    def send_backfill(self, client: ClientConnection, frame: Dict):
+        """把历史数据（如订阅时请求的回填窗口）按客户端的订阅抽取、编码后发给该客户端"""
+        frame = dict(frame, backfill=True)
+        self._send_frame(frame, [client], decimator_key=None)
+
+    def _send_frame(self, frame: Dict, clients: List[ClientConnection], decimator_key: Optional[Tuple]):
+        # 每种 (分辨率, 通道) 每帧只抽取一次，再加上格式每种组合只编码一次
+        views = {}
+        encoded = {}
+        for client in clients:
+            channels = client.subscription.channels
+            view_key = (client.bucket_seconds, channels)
+            key = view_key + (client.wire_format,)
+            if key not in encoded:
+                if view_key not in views:
+                    views[view_key] = self._view(frame, channels, client.bucket_seconds, decimator_key)
+                view = views[view_key]
+                encoded[key] = None if view is None else self.encode_frame(view, client.wire_format)
+            if encoded[key] is not None:
+                client.enqueue(encoded[key])
+
+    def _routes_for(self, stream: str) -> List[float]:
+        routes = self._routes.get(stream)
+        if routes is None:
+            routes = self._routes.get(None, [])
+        return routes
+
+    def _update_routes(self):
+        """按客户端订阅重新计算每个数据流需要的帧率组，并释放不再使用的状态"""
+        streams = {c.subscription.stream for c in self.clients} | set(self._meta)
+        routes = {}
+        for stream in streams | {None}:
+            rates = sorted({c.subscription.max_fps for c in self.clients
+                            if c.subscription.matches(stream) or c.subscription.stream is None})
+            routes[stream] = rates
+        self._routes = routes
+        active = {(c.bucket_seconds, c.subscription.channels) for c in self.clients}
+        for key in list(self._pending):
+            if key[1] not in self._routes_for(key[0]):
+                del self._pending[key]
+        for key in list(self._decimators):
+            if key[1] not in self._routes_for(key[0]) or (key[2], key[3]) not in active:
+                del self._decimators[key]
+
+    def _view(self, frame: Dict, channels: Tuple[str, ...], bucket_seconds: Optional[float],
+              decimator_key: Optional[Tuple]) -> Optional[Dict]:
+        """按订阅的通道和分辨率生成一帧的视图，本帧没有完整的桶时返回 None"""
+        view = {key: value for key, value in frame.items()
+                if key not in CHANNELS and key not in ('timestamp', 'pulse_rate', 'beats')}
+        if 'pulse_rate' in channels:
+            view['pulse_rate'] = frame.get('pulse_rate')
+        data_channels = [position for position in CHANNELS if position in channels]
+        if not data_channels:
+            return view if 'pulse_rate' in channels else None
+        if frame.get('beats') is not None:
+            view['beats'] = {position: frame['beats'][position] for position in data_channels}
+        timestamps = frame['timestamp']
+        data = np.vstack([frame[position] for position in data_channels])
+        if bucket_seconds is not None:
+            if decimator_key is None:
+                decimator = MinMaxDecimator(bucket_seconds)
+            else:
+                key = decimator_key + (bucket_seconds, channels)
+                decimator = self._decimators.get(key)
+                if decimator is None:
+                    decimator = self._decimators[key] = MinMaxDecimator(bucket_seconds)
+            timestamps, data, decimated = decimator.process(timestamps, data)
+            if not len(timestamps):
+                return None
+            if decimated:
+                # 抽取后每个桶两个点，时间上均匀分布
+                view['sampling_rate'] = 2.0 / bucket_seconds
+        view['timestamp'] = timestamps
+        for position, values in zip(data_channels, data):
+            view[position] = values
+        return view
+
+    @staticmethod
+    def build_frame(blocks: List[Dict], meta: Dict, seq: int = 0) -> Dict:
+        """合并数据块为一帧，各通道为 NumPy 数组"""
+        frame = dict(meta)
+        frame['seq'] = seq
+        frame['timestamp'] = np.concatenate([np.atleast_1d(b['timestamp']) for b in blocks])
+        for position in CHANNELS:
+            frame[position] = np.concatenate([np.atleast_1d(b[position]) for b in blocks])
+        # 脉率取本帧最后一个有效值
+        pulse_rates = np.concatenate([np.atleast_1d(b.get('pulse_rate', np.nan)) for b in blocks]).astype(np.float64)
+        valid = pulse_rates[~np.isnan(pulse_rates)]
+        frame['pulse_rate'] = float(valid[-1]) if len(valid) else None
+        # 各通道本帧内检测到的心搏时间戳
+        if any('beats' in b for b in blocks):
+            frame['beats'] = {position: np.concatenate([np.atleast_1d(b['beats'][position]) for b in blocks
+                                                        if 'beats' in b]).astype(np.float64)
+                              for position in CHANNELS}
+        return frame
+
+    @staticmethod
+    def encode_event(event: Dict) -> str:
+        """事件总是以 JSON 文本发送，与客户端协商的数据格式无关"""
+        return json.dumps(dict(event, type=event.get('type', 'alert')))
+
+    @staticmethod
+    def encode_spectrogram(spectrogram: Dict, channels: Tuple[str, ...], as_json: bool) -> Union[str, bytes]:
+        """编码频谱列：JSON 客户端为文本（columns 为各部位的二维整数列表），其余为二进制"""
+        message = dict(spectrogram, columns={position: spectrogram['columns'][CHANNELS.index(position)]
+                                             for position in channels})
+        if not as_json:
+            return pack_spectrogram(message)
+        message['type'] = 'spectrogram'
+        message['timestamp'] = np.asarray(message['timestamp']).tolist()
+        message['columns'] = {position: columns.tolist() for position, columns in message['columns'].items()}
+        return json.dumps(message)
+
+    @staticmethod
+    def encode_frame(frame: Dict, wire_format: str):
+        """按客户端协商的格式编码一帧：json 为文本，其余为二进制"""
+        encoding = WIRE_FORMATS[wire_format]
+        if encoding is not None:
+            return pack_frame(frame, encoding)
+        message = dict(frame)
+        if 'timestamp' in frame:
+            message['timestamp'] = np.asarray(frame['timestamp']).tolist()
+        for position in CHANNELS:
+            if position in frame:
+                message[position] = np.round(frame[position], 4).tolist()
+        if frame.get('beats') is not None:
+            message['beats'] = {position: np.round(times, 4).tolist() for position, times in frame['beats'].items()}
+        return json.dumps(message)
+
+
+# 创建全局广播器实例
+broadcaster = Broadcaster()
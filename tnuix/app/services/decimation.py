@@ -0,0 +1,67 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class MinMaxDecimator:
+    """流式 min/max 抽取
+
+    按固定时长把样本分桶，每个桶每个通道输出两个点（最小值和最大值，按出现先后排列），
+    两个点的时间戳为桶起点和桶中点，输出在时间上是均匀的，峰值不会丢失。
+    最后一个可能未收满的桶留到下一块数据再输出。
+    数据比桶还稀疏（平均每桶不足 2 个样本）时原样输出。
+    """
+
+    def __init__(self, bucket_seconds: float):
+        self.bucket_seconds = bucket_seconds
+        self._timestamps = np.empty(0, dtype=np.float64)
+        self._data: Optional[np.ndarray] = None
+
+    def process(self, timestamps: np.ndarray, data: np.ndarray) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """处理一块数据，data 的 shape 为 (通道数, 样本数)
+
+        返回 (时间戳, 数据, 是否已抽取)。
+        """
+        if self._data is not None and len(self._timestamps):
+            timestamps = np.concatenate((self._timestamps, timestamps))
+            data = np.concatenate((self._data, data), axis=1)
+        if not len(timestamps):
+            return timestamps, data, False
+
+        index = np.floor(timestamps / self.bucket_seconds).astype(np.int64)
+        if len(timestamps) < 2 * (index[-1] - index[0] + 1):
+            # 数据稀疏，不需要抽取
+            self._timestamps = timestamps[:0]
+            self._data = None
+            return timestamps, data, False
+
+        complete = int(np.searchsorted(index, index[-1]))
+        self._timestamps = timestamps[complete:]
+        self._data = data[:, complete:]
+        if complete == 0:
+            return timestamps[:0], data[:, :0], True
+
+        index = index[:complete]
+        data = data[:, :complete]
+        starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+        lengths = np.diff(np.r_[starts, complete])
+        minimum = np.minimum.reduceat(data, starts, axis=1)
+        maximum = np.maximum.reduceat(data, starts, axis=1)
+
+        # 找出每个桶内最小值和最大值第一次出现的位置，决定输出顺序
+        position = np.broadcast_to(np.arange(complete), data.shape)
+        never = complete + 1
+        min_at = np.minimum.reduceat(np.where(data == np.repeat(minimum, lengths, axis=1), position, never),
+                                     starts, axis=1)
+        max_at = np.minimum.reduceat(np.where(data == np.repeat(maximum, lengths, axis=1), position, never),
+                                     starts, axis=1)
+        min_first = min_at <= max_at
+
+        out = np.empty((data.shape[0], 2 * len(starts)), dtype=data.dtype)
+        out[:, 0::2] = np.where(min_first, minimum, maximum)
+        out[:, 1::2] = np.where(min_first, maximum, minimum)
+        bucket_start = index[starts] * self.bucket_seconds
+        out_timestamps = np.empty(2 * len(starts), dtype=np.float64)
+        out_timestamps[0::2] = bucket_start
+        out_timestamps[1::2] = bucket_start + self.bucket_seconds / 2
+        return out_timestamps, out, True
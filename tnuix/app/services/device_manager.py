@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import SAMPLING_RATE, DEFAULT_BAUDRATE, SERIAL_PROTOCOL, RECORDING_ENABLED
+from app.services.analytics import AnalyticsPool, analytics_pool as default_analytics_pool
+from app.services.recorder import Recorder, recorder as default_recorder
+from app.services.replay import REPLAY_PREFIX, replay_filter_chain, replay_sampling_rate
+from app.services.serial_service import SerialService
+
+# 数据块监听器: (设备, 滤波后的数据块) -> 协程；分析结果监听器: (设备, 分析结果) -> 协程
+BlockListener = Callable[[SerialService, Dict], Awaitable]
+
+
+class DeviceManager:
+    """多设备采集管理器
+
+    每个设备（SerialService）拥有独立的串口读线程、滤波状态、环形缓冲区和数据流编号，
+    由各自的事件循环任务消费数据，处理完的数据块先交给录制器，再分发给所有监听器。
+    各设备的心搏检测、特征提取和频谱图在分析进程池中计算，结果到达后录制心搏特征并分发给分析结果监听器。
+    """
+
+    def __init__(self, recorder: Optional[Recorder] = None, analytics_pool: Optional[AnalyticsPool] = None):
+        self.recorder = recorder  # 为 None 时不录制
+        self.analytics_pool = analytics_pool  # 为 None 时在事件循环中直接计算
+        self.devices: Dict[str, SerialService] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._listeners: List[BlockListener] = []
+        self._analytics_listeners: List[BlockListener] = []
+        self._next_stream_id = 1
+
+    def add_listener(self, listener: BlockListener):
+        """注册数据块监听器（如 WebSocket 广播）"""
+        self._listeners.append(listener)
+
+    def add_analytics_listener(self, listener: BlockListener):
+        """注册分析结果监听器（如心搏特征和频谱图推送）"""
+        self._analytics_listeners.append(listener)
+
+    def get(self, device_id: str) -> Optional[SerialService]:
+        return self.devices.get(device_id)
+
+    def connect(self, device_id: str, port: str, baudrate: int = DEFAULT_BAUDRATE,
+                protocol: str = SERIAL_PROTOCOL, speed: float = 1.0,
+                filter_chain: Optional[Sequence[Dict]] = None) -> Dict:
+        """为设备连接串口，已连接的设备会先断开；回放端口可被多个设备同时使用
+
+        filter_chain 为该设备的滤波链，不指定时使用 config.FILTER_CHAIN；
+        回放抽取过的录制时按录制的采样率滤波，且不再抽取（见 replay_filter_chain）。
+        """
+        if not port:
+            return {"status": "error", "message": "未指定串口"}
+        if not port.startswith(("DEBUG_", REPLAY_PREFIX)):
+            for other_id, other in self.devices.items():
+                if other_id != device_id and other.is_connected and other.port == port:
+                    return {"status": "error", "message": f"串口 {port} 已被设备 {other_id} 占用"}
+
+        try:
+            input_rate = replay_sampling_rate(port) if port.startswith(REPLAY_PREFIX) else SAMPLING_RATE
+            if input_rate != SAMPLING_RATE:
+                filter_chain = replay_filter_chain(filter_chain, input_rate)
+            device = SerialService(is_Simulated=False, device_id=device_id, stream_id=self._next_stream_id,
+                                   filter_chain=filter_chain, analytics_pool=self.analytics_pool,
+                                   input_rate=input_rate)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        self.disconnect(device_id)
+        result = device.connect(port, baudrate, protocol, speed)
+        if result.get("status") != "success":
+            # 释放新设备在分析进程池中的数据流
+            device.analytics.close()
+            return result
+
+        self._next_stream_id += 1
+        self.devices[device_id] = device
+        if device.engine is not None:
+            if self.recorder is not None:
+                result["session_id"] = self.recorder.open_session(device_id, device.sampling_rate)
+            self._tasks[device_id] = asyncio.create_task(self._run_device(device))
+        result.update({"device_id": device_id, "stream_id": device.stream_id})
+        return result
+
+    def disconnect(self, device_id: str) -> Dict:
+        """断开设备并释放其资源"""
+        device = self.devices.pop(device_id, None)
+        task = self._tasks.pop(device_id, None)
+        if task is not None:
+            task.cancel()
+        if self.recorder is not None:
+            self.recorder.close_session(device_id)
+        if device is None:
+            return {"status": "error", "message": f"设备 {device_id} 不存在"}
+        return device.disconnect()
+
+    def disconnect_all(self):
+        for device_id in list(self.devices):
+            self.disconnect(device_id)
+        if self.recorder is not None:
+            self.recorder.stop()
+
+    def get_status(self, device_id: Optional[str] = None) -> Dict:
+        """获取单个设备或全部设备的状态"""
+        if device_id is not None:
+            device = self.devices.get(device_id)
+            if device is None:
+                return {"device_id": device_id, "is_connected": False, "using_simulated_data": True,
+                        "port_info": None}
+            return device.get_status()
+        status = {"devices": [device.get_status() for device in self.devices.values()]}
+        if self.recorder is not None:
+            status["recorder"] = self.recorder.stats()
+        if self.analytics_pool is not None:
+            status["analytics"] = self.analytics_pool.stats()
+        return status
+
+    def using_simulated_data(self) -> bool:
+        """没有任何硬件设备在采集时使用模拟数据"""
+        return not any(d.is_connected and not d.use_simulated_data for d in self.devices.values())
+
+    async def _run_device(self, device: SerialService):
+        try:
+            await device.getDataFromSerialPort(self._dispatch, self._dispatch_analytics)
+            # 读线程自行结束（串口断开、回放结束）时也结束录制会话
+            if self.recorder is not None and self.devices.get(device.device_id) is device:
+                self.recorder.close_session(device.device_id)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.error(f"设备 {device.device_id} 数据处理任务异常退出: {e}")
+
+    async def _dispatch(self, device: SerialService, block: Dict):
+        if self.recorder is not None:
+            self.recorder.write(device.device_id, block['timestamp'], block['raw'],
+                                np.vstack((block['cun'], block['guan'], block['chi'])))
+        for listener in self._listeners:
+            try:
+                await listener(device, block)
+            except Exception as e:
+                logging.error(f"分发设备 {device.device_id} 数据失败: {e}")
+
+    async def _dispatch_analytics(self, device: SerialService, result: Dict):
+        if self.recorder is not None:
+            self.recorder.write_features(device.device_id, result['features'])
+        for listener in self._analytics_listeners:
+            try:
+                await listener(device, result)
+            except Exception as e:
+                logging.error(f"分发设备 {device.device_id} 分析结果失败: {e}")
+
+
+# 创建全局设备管理器实例
+device_manager = DeviceManager(default_recorder if RECORDING_ENABLED else None, default_analytics_pool)
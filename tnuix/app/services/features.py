@@ -0,0 +1,211 @@
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+from scipy import fft
+
+from app.core.config import (
+    SAMPLING_RATE, NOTCH_FREQ, BEAT_INTERVAL_RANGE, FEATURE_FOOT_SEARCH, FEATURE_FFT_SIZE, FEATURE_HARMONICS,
+    FEATURE_WINDOW_BEATS
+)
+
+CHANNELS = ('cun', 'guan', 'chi')
+
+# 每个心搏的特征记录（小端、定长，与录制数据一起保存为 features.bin）
+FEATURE_DTYPE = np.dtype([
+    ('channel', 'u1'),            # 0 寸、1 关、2 尺
+    ('onset', '<f8'),             # 心搏起点（波谷）时间戳
+    ('duration', '<f4'),          # 心搏周期（秒）
+    ('amplitude', '<f4'),         # 主波幅度（相对起点和下一起点的连线）
+    ('rise_time', '<f4'),         # 起点到主波峰的时间（秒）
+    ('width', '<f4'),             # 半幅宽度（秒）
+    ('notch_depth', '<f4'),       # 重搏切迹深度: (重搏波峰 - 切迹) / 幅度，没有切迹时为 NaN
+    ('notch_time', '<f4'),        # 起点到切迹的时间（秒）
+    ('harmonics', '<f4', (FEATURE_HARMONICS - 1,)),  # 第 2..N 次谐波与基波的幅度比
+])
+FEATURE_FIELDS = ('duration', 'amplitude', 'rise_time', 'width', 'notch_depth', 'notch_time')
+
+
+class PulseFeatureExtractor:
+    """增量的脉搏波特征提取
+
+    使用心搏检测得到的心搏起点，在起点前 FEATURE_FOOT_SEARCH 秒内找到波谷作为该心搏的起点，
+    相邻两个波谷之间即为一个完整心搏，只在新心搏出现时对上一个心搏计算一次特征:
+    幅度、上升时间、半幅宽度、重搏切迹深度，以及把心搏重采样到 FEATURE_FFT_SIZE 点后
+    用 rfft 得到的各次谐波与基波的幅度比（所有心搏同一长度，FFT 计划只建立一次并被缓存）。
+    最近几秒的样本保存在预分配的线性缓冲区中，心搏总是连续的视图，重采样结果写入预分配的矩阵，
+    不会重新计算整个缓冲区。每个通道再保留最近 FEATURE_WINDOW_BEATS 个心搏的特征用于窗口统计。
+    """
+
+    def __init__(self, sampling_rate: float = SAMPLING_RATE, channels: int = 3, mains_freq: float = NOTCH_FREQ):
+        self.sampling_rate = sampling_rate
+        self.channels = channels
+        self.capacity = int((BEAT_INTERVAL_RANGE[1] + 2 * FEATURE_FOOT_SEARCH) * sampling_rate) + 1
+        # 线性缓冲区，写满后把后一半移到开头，心搏数据总是连续的
+        self._timestamps = np.zeros(2 * self.capacity)
+        self._data = np.zeros((channels, 2 * self.capacity))
+        # 计算特征前的平滑：长度为一个工频周期的居中滑动平均（奇数点）
+        half = max(int(round(sampling_rate / mains_freq)) // 2, 1)
+        self._half = half
+        self._kernel = np.full(2 * half + 1, 1.0 / (2 * half + 1))
+        # 一个周期均匀取 FEATURE_FFT_SIZE 点（不含终点），第 k 个 FFT 频点即第 k 次谐波
+        self._grid = np.arange(FEATURE_FFT_SIZE) / FEATURE_FFT_SIZE
+        self._resampled = np.zeros((4 * channels, FEATURE_FFT_SIZE))  # 本批心搏的重采样结果，不够时扩大
+        self._window = np.zeros((channels, FEATURE_WINDOW_BEATS), dtype=FEATURE_DTYPE)
+        self.beat_counts = np.zeros(channels, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """清空缓冲区和心搏状态（重新连接时调用）"""
+        self._size = 0
+        self._last_foot = np.full(self.channels, np.nan)
+        self._window_counts = np.zeros(self.channels, dtype=np.int64)
+
+    def process(self, timestamps: np.ndarray, block: np.ndarray, beats: Sequence[np.ndarray]) -> np.ndarray:
+        """追加 (通道数, 样本数) 的一块数据，beats 为各通道本块内新检测到的心搏，返回新完成的心搏特征"""
+        records: List[tuple] = []
+        step = self.capacity // 2
+        for start in range(0, len(timestamps), step):
+            # 很大的数据块分段追加，保证每个心搏都还在缓冲区内
+            stop = min(start + step, len(timestamps))
+            self._append(timestamps[start:stop], block[:, start:stop])
+            if not any(len(onsets) for onsets in beats):
+                continue
+            last = timestamps[stop - 1]
+            for channel in range(self.channels):
+                onsets = beats[channel]
+                onsets = onsets[(onsets <= last) & (onsets > (timestamps[start - 1] if start else -np.inf))]
+                for onset in onsets:
+                    if len(records) == len(self._resampled):
+                        self._resampled = np.concatenate((self._resampled, np.zeros_like(self._resampled)))
+                    record = self._on_beat(channel, float(onset), self._resampled[len(records)])
+                    if record is not None:
+                        records.append(record)
+        features = np.zeros(len(records), dtype=FEATURE_DTYPE)
+        if not records:
+            return features
+        for field, values in zip(FEATURE_DTYPE.names, zip(*records)):
+            features[field] = values
+        # 所有心搏一次 rfft，谐波幅度比相对基波
+        spectrum = np.abs(fft.rfft(self._resampled[:len(records)], axis=1))
+        fundamental = spectrum[:, 1:2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features['harmonics'] = np.where(fundamental > 0, spectrum[:, 2:FEATURE_HARMONICS + 1] / fundamental, np.nan)
+        for record in features:
+            channel = record['channel']
+            self._window[channel, self._window_counts[channel] % FEATURE_WINDOW_BEATS] = record
+            self._window_counts[channel] += 1
+            self.beat_counts[channel] += 1
+        return features
+
+    def window_summary(self, channel: int) -> Dict:
+        """通道最近 FEATURE_WINDOW_BEATS 个心搏的特征均值，以及周期的标准差（心率变异）"""
+        count = int(min(self._window_counts[channel], FEATURE_WINDOW_BEATS))
+        if not count:
+            return {"beats": 0}
+        window = self._window[channel, :count]
+        summary = {"beats": count}
+        for field in FEATURE_FIELDS:
+            values = window[field][~np.isnan(window[field])]
+            summary[field] = round(float(values.mean()), 4) if len(values) else None
+        summary["duration_sd"] = round(float(window['duration'].std()), 4)
+        # 基波幅度为 0 的心搏谐波比为 NaN，不参与平均
+        harmonics = window['harmonics'].astype(np.float64)
+        valid = ~np.isnan(harmonics)
+        counts = valid.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            means = np.where(valid, harmonics, 0.0).sum(axis=0) / counts
+        summary["harmonics"] = json_values(means)
+        return summary
+
+    def window_summaries(self, channels: Iterable[int]) -> Dict[int, Dict]:
+        return {channel: self.window_summary(channel) for channel in channels}
+
+    def _append(self, timestamps: np.ndarray, block: np.ndarray):
+        count = len(timestamps)
+        if self._size + count > len(self._timestamps):
+            keep = min(self._size, self.capacity)
+            self._timestamps[:keep] = self._timestamps[self._size - keep:self._size]
+            self._data[:, :keep] = self._data[:, self._size - keep:self._size]
+            self._size = keep
+        self._timestamps[self._size:self._size + count] = timestamps
+        self._data[:, self._size:self._size + count] = block
+        self._size += count
+
+    def _on_beat(self, channel: int, onset: float, resampled: np.ndarray):
+        """新心搏出现时，以波谷为界计算上一个心搏的特征，重采样结果写入 resampled（谐波比在整批计算）"""
+        timestamps = self._timestamps[:self._size]
+        first = int(np.searchsorted(timestamps, onset - FEATURE_FOOT_SEARCH))
+        last = int(np.searchsorted(timestamps, onset, 'right'))
+        if last <= first:
+            return None
+        foot = first + int(np.argmin(self._data[channel, first:last]))
+        previous, self._last_foot[channel] = self._last_foot[channel], timestamps[foot]
+        if np.isnan(previous):
+            return None
+        start = int(np.searchsorted(timestamps, previous))
+        duration = timestamps[foot] - timestamps[start]
+        if start >= foot or not BEAT_INTERVAL_RANGE[0] <= duration <= BEAT_INTERVAL_RANGE[1]:
+            return None
+
+        # 居中平滑（两端各多取 half 个样本），再减去两个波谷的连线去掉基线漂移
+        low = max(start - self._half, 0)
+        high = min(foot + self._half + 1, self._size)
+        smooth = np.convolve(self._data[channel, low:high], self._kernel, 'same')[start - low:foot + 1 - low]
+        t = timestamps[start:foot + 1] - timestamps[start]
+        smooth -= smooth[0] + (smooth[-1] - smooth[0]) * t / duration
+        peak = int(np.argmax(smooth))
+        amplitude = smooth[peak]
+        if amplitude <= 0:
+            return None
+
+        # 半幅宽度：主波峰两侧第一次低于一半幅度的位置
+        below = smooth < amplitude / 2
+        left = np.flatnonzero(below[:peak])
+        right = np.flatnonzero(below[peak:])
+        width = t[peak + right[0] if len(right) else -1] - t[left[-1] if len(left) else 0]
+
+        # 重搏切迹：主波峰之后的局部极小值中，到其后局部极大值回升最多的一个
+        slope = np.diff(smooth[peak:])
+        minima = peak + 1 + np.flatnonzero((slope[:-1] < 0) & (slope[1:] >= 0))
+        maxima = peak + 1 + np.flatnonzero((slope[:-1] > 0) & (slope[1:] <= 0))
+        notch_depth = notch_time = np.nan
+        if len(minima) and len(maxima):
+            following = np.searchsorted(maxima, minima)
+            valid = following < len(maxima)
+            if valid.any():
+                minima, rebound = minima[valid], smooth[maxima[following[valid]]] - smooth[minima[valid]]
+                best = int(np.argmax(rebound))
+                notch_depth = rebound[best] / amplitude
+                notch_time = t[minima[best]]
+
+        # 重采样到固定点数
+        resampled[:] = np.interp(self._grid * duration, t, smooth)
+        return channel, timestamps[start], duration, amplitude, t[peak], width, notch_depth, notch_time
+
+
+def json_values(values: np.ndarray) -> List:
+    """保留 4 位小数的列表，NaN 和无穷大为 None（JSON 中不能出现 NaN）"""
+    values = np.round(np.asarray(values, dtype=np.float64), 4)
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def feature_events(features: np.ndarray, windows: Dict[int, Dict]) -> List[Dict]:
+    """把一批心搏特征按通道整理为推送给客户端的紧凑消息，windows 为各通道的窗口统计（window_summaries）"""
+    events = []
+    for channel in np.unique(features['channel']):
+        records = features[features['channel'] == channel]
+        beats = []
+        for record in records:
+            beat = {"onset": round(float(record['onset']), 4)}
+            for field in FEATURE_FIELDS:
+                value = float(record[field])
+                beat[field] = round(value, 4) if np.isfinite(value) else None
+            beat["harmonics"] = json_values(record['harmonics'])
+            beats.append(beat)
+        events.append({
+            "type": "features",
+            "channel": CHANNELS[channel],
+            "beats": beats,
+            "window": windows.get(int(channel), {"beats": 0})
+        })
+    return events
@@ -0,0 +1,176 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import signal
+
+from app.core.config import SAMPLING_RATE, NOTCH_FREQ, QUALITY_FACTOR, FILTER_CHAIN
+
+# 直通的二阶节，空滤波链使用
+IDENTITY_SOS = np.array([[1.0, 0.0, 0.0, 1.0, 0.0, 0.0]])
+
+
+def notch_sos(notch_freq: float = NOTCH_FREQ, quality: float = QUALITY_FACTOR,
+              fs: float = SAMPLING_RATE) -> np.ndarray:
+    """陷波滤波器的二阶节（SOS）系数"""
+    b, a = signal.iirnotch(notch_freq, quality, fs)
+    return signal.tf2sos(b, a)
+
+
+def stage_sos(stage: Dict, fs: float = SAMPLING_RATE) -> np.ndarray:
+    """一级滤波器的二阶节系数（格式见 config.FILTER_CHAIN）"""
+    kind = stage.get('type')
+    if kind == 'notch':
+        freq = float(stage.get('freq', NOTCH_FREQ))
+        quality = float(stage.get('q', QUALITY_FACTOR))
+        harmonics = int(stage.get('harmonics', 1))
+        # 超过奈奎斯特频率的谐波不需要滤除
+        freqs = [k * freq for k in range(1, harmonics + 1) if k * freq < fs / 2]
+        if not freqs:
+            raise ValueError(f"陷波频率 {freq} Hz 不低于奈奎斯特频率")
+        return np.vstack([notch_sos(f, quality, fs) for f in freqs])
+    if kind == 'bandpass':
+        return signal.butter(int(stage.get('order', 2)), [float(stage['low']), float(stage['high'])],
+                             'bandpass', fs=fs, output='sos')
+    if kind in ('highpass', 'baseline'):
+        return signal.butter(int(stage.get('order', 2)), float(stage.get('cutoff', 0.5)),
+                             'highpass', fs=fs, output='sos')
+    if kind == 'lowpass':
+        return signal.butter(int(stage.get('order', 4)), float(stage['cutoff']), 'lowpass', fs=fs, output='sos')
+    if kind == 'decimate':
+        factor = int(stage['factor'])
+        if factor < 2:
+            raise ValueError("抽取因子至少为 2")
+        # 与 scipy.signal.decimate 相同的抗混叠低通
+        return signal.cheby1(8, 0.05, 0.8 / factor, output='sos')
+    raise ValueError(f"不支持的滤波器类型: {kind}")
+
+
+def compile_chain(stages: Sequence[Dict], fs: float = SAMPLING_RATE) -> Tuple[np.ndarray, int]:
+    """把滤波链编译为一个 SOS 级联，返回 (系数, 抽取因子)；参数不合法时抛出 ValueError"""
+    sections = []
+    factor = 1
+    for index, stage in enumerate(stages):
+        if not isinstance(stage, dict):
+            raise ValueError(f"第 {index + 1} 级滤波器必须为对象")
+        if factor > 1:
+            raise ValueError("抽取只能是滤波链的最后一级")
+        try:
+            sections.append(stage_sos(stage, fs))
+            if stage.get('type') == 'decimate':
+                factor = int(stage['factor'])
+        except KeyError as e:
+            raise ValueError(f"第 {index + 1} 级滤波器 {stage.get('type')} 缺少参数 {e}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"第 {index + 1} 级滤波器 {stage.get('type')} 参数错误: {e}")
+    return (np.vstack(sections) if sections else IDENTITY_SOS.copy()), factor
+
+
+class StreamingFilter:
+    """因果流式滤波器
+
+    系数只在创建时计算一次，每个通道保存各自的滤波状态 zi，
+    每次用一次 sosfilt 沿 axis=1 处理 (通道数, 样本数) 的整块数据，输出是连续的滤波信号。
+    首个数据块到来时按 sosfilt_zi 以首样本为稳态预热，避免起始瞬态。
+    各通道可以使用不同的系数：使用相同系数的通道为一组，每组一次 sosfilt；
+    修改部分通道的系数时，其余通道的滤波状态保持不变。
+    """
+
+    def __init__(self, sos: np.ndarray, channels: int = 3):
+        self.channels = channels
+        self._groups: List[Dict] = []
+        self.set_sos(sos)
+
+    @classmethod
+    def notch(cls, notch_freq: float = NOTCH_FREQ, quality: float = QUALITY_FACTOR,
+              fs: float = SAMPLING_RATE, channels: int = 3) -> 'StreamingFilter':
+        return cls(notch_sos(notch_freq, quality, fs), channels)
+
+    def set_sos(self, sos: np.ndarray, channels: Optional[Sequence[int]] = None):
+        """修改通道（默认全部）的系数，这些通道在下一块数据重新预热"""
+        selected = np.arange(self.channels) if channels is None else np.unique(np.asarray(channels, dtype=np.intp))
+        groups = []
+        for group in self._groups:
+            keep = ~np.isin(group['channels'], selected)
+            if keep.any():
+                group['channels'] = group['channels'][keep]
+                if group['zi'] is not None:
+                    group['zi'] = group['zi'][:, keep]
+                groups.append(group)
+        sos = np.asarray(sos, dtype=np.float64)
+        # zi_step 为 (节数, 2)，单位阶跃输入下的稳态
+        groups.append({'sos': sos, 'zi_step': signal.sosfilt_zi(sos), 'channels': selected, 'zi': None})
+        self._groups = groups
+
+    def reset(self):
+        """清空滤波状态（重新连接时调用），下一块数据重新预热"""
+        for group in self._groups:
+            group['zi'] = None
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """滤波一块数据，block 的 shape 为 (通道数, 样本数)"""
+        if block.shape[1] == 0:
+            return block.astype(np.float64)
+        if len(self._groups) == 1:
+            return self._filter(self._groups[0], block)
+        filtered = np.empty(block.shape)
+        for group in self._groups:
+            filtered[group['channels']] = self._filter(group, block[group['channels']])
+        return filtered
+
+    @staticmethod
+    def _filter(group: Dict, block: np.ndarray) -> np.ndarray:
+        if group['zi'] is None:
+            group['zi'] = group['zi_step'][:, None, :] * block[:, 0][None, :, None]
+        filtered, group['zi'] = signal.sosfilt(group['sos'], block, axis=1, zi=group['zi'])
+        return filtered
+
+
+class FilterChain:
+    """设备的可配置滤波链
+
+    每个通道的滤波链（带通、工频及谐波陷波、去基线漂移等）编译为一个 SOS 级联，
+    由 StreamingFilter 对整块数据流式滤波；最后一级为抽取时，滤波后按连续的相位每 factor 个样本取一个。
+    运行中可以修改部分通道的滤波链，其余通道的滤波状态不受影响；
+    抽取因子决定了后续处理的采样率，只能在创建（连接设备）时设置，修改滤波链时沿用。
+    """
+
+    def __init__(self, stages: Sequence[Dict] = FILTER_CHAIN, fs: float = SAMPLING_RATE, channels: int = 3):
+        sos, factor = compile_chain(stages, fs)
+        self.fs = fs
+        self.decimation = factor
+        self.output_rate = fs / factor
+        self.stages: List[List[Dict]] = [[dict(stage) for stage in stages] for _ in range(channels)]
+        self.filter = StreamingFilter(sos, channels)
+        self._phase = 0  # 下一块数据中第一个保留样本的位置
+
+    def configure(self, stages: Sequence[Dict], channels: Optional[Sequence[int]] = None):
+        """修改通道（默认全部）的滤波链；参数不合法或改变了抽取因子时抛出 ValueError
+
+        stages 中没有抽取级时沿用当前的抽取。
+        """
+        if self.decimation > 1 and not any(isinstance(stage, dict) and stage.get('type') == 'decimate'
+                                           for stage in stages):
+            stages = list(stages) + [{"type": "decimate", "factor": self.decimation}]
+        sos, factor = compile_chain(stages, self.fs)
+        if factor != self.decimation:
+            raise ValueError("抽取因子只能在连接设备时设置")
+        selected = range(len(self.stages)) if channels is None else channels
+        for channel in selected:
+            if not 0 <= channel < len(self.stages):
+                raise ValueError(f"通道 {channel} 不存在")
+        self.filter.set_sos(sos, channels)
+        for channel in selected:
+            self.stages[channel] = [dict(stage) for stage in stages]
+
+    def reset(self):
+        self.filter.reset()
+        self._phase = 0
+
+    def process(self, block: np.ndarray) -> Tuple[np.ndarray, slice]:
+        """滤波（并抽取）一块 (通道数, 样本数) 的数据，返回滤波结果和保留的样本在输入中的切片"""
+        filtered = self.filter.process(block)
+        if self.decimation == 1:
+            return filtered, slice(None)
+        keep = slice(self._phase, None, self.decimation)
+        self._phase = (self._phase - block.shape[1]) % self.decimation
+        return filtered[:, keep], keep
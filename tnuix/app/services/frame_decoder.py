@@ -0,0 +1,300 @@
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import SAMPLING_RATE, SERIAL_MAX_PARTIAL_FRAME
+
+# 样本批次的列定义: timestamp, cun, guan, chi, pulse_rate（无脉率时为 NaN）
+SAMPLE_COLUMNS = ('timestamp', 'cun', 'guan', 'chi', 'pulse_rate')
+
+# 二进制帧格式（小端，22 字节）:
+# 同步字 | 序号 | 寸 | 关 | 尺 | 脉率（无则为 NaN）| CRC-16/CCITT（覆盖前 20 字节）
+BINARY_SYNC_WORD = 0xA55A
+BINARY_SYNC_BYTES = BINARY_SYNC_WORD.to_bytes(2, 'little')
+BINARY_FRAME_DTYPE = np.dtype([
+    ('sync', '<u2'),
+    ('seq', '<u2'),
+    ('cun', '<f4'),
+    ('guan', '<f4'),
+    ('chi', '<f4'),
+    ('pulse_rate', '<f4'),
+    ('crc', '<u2'),
+])
+BINARY_FRAME_SIZE = BINARY_FRAME_DTYPE.itemsize
+_CRC_COVERED_BYTES = BINARY_FRAME_SIZE - 2
+
+
+def _make_crc16_table() -> np.ndarray:
+    table = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[i] = crc & 0xFFFF
+    return table
+
+
+_CRC16_TABLE = _make_crc16_table()
+
+
+def crc16_frames(frames: np.ndarray) -> np.ndarray:
+    """按列批量计算每帧的 CRC-16/CCITT-FALSE，frames 为 (N, 帧长) 的 uint8 数组"""
+    crc = np.full(len(frames), 0xFFFF, dtype=np.uint16)
+    for column in range(_CRC_COVERED_BYTES):
+        index = (crc >> 8) ^ frames[:, column]
+        crc = (crc << 8) ^ _CRC16_TABLE[index]
+    return crc
+
+
+def encode_binary_frames(seq: np.ndarray, channels: np.ndarray,
+                         pulse_rate: Optional[np.ndarray] = None) -> bytes:
+    """把样本编码为二进制帧（用于虚拟设备和固件对照），channels 的 shape 为 (N, 3)"""
+    frames = np.zeros(len(channels), dtype=BINARY_FRAME_DTYPE)
+    frames['sync'] = BINARY_SYNC_WORD
+    frames['seq'] = np.asarray(seq) & 0xFFFF
+    frames['cun'] = channels[:, 0]
+    frames['guan'] = channels[:, 1]
+    frames['chi'] = channels[:, 2]
+    frames['pulse_rate'] = np.nan if pulse_rate is None else pulse_rate
+    frames['crc'] = crc16_frames(frames.view(np.uint8).reshape(-1, BINARY_FRAME_SIZE))
+    return frames.tobytes()
+
+
+def _lines_to_float(lines: List[bytes], index: np.ndarray) -> np.ndarray:
+    """把选中行的所有字段拼接后一次性转换为浮点数组"""
+    fields = b','.join([lines[i] for i in index]).split(b',')
+    return np.array(fields).astype(np.float64)
+
+
+def _is_numeric_line(line: bytes) -> bool:
+    try:
+        np.array(line.split(b',')).astype(np.float64)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_sample_lines(lines: List[bytes], first_index: int = 0) -> Tuple[np.ndarray, List[int]]:
+    """批量解析多行串口数据
+
+    支持两种格式:
+    - "cun,guan,chi"：无时间戳，按样本序号（从 first_index 起）和采样率生成时间戳
+    - "timestamp,cun,guan,chi[,pulse_rate]"
+
+    所有字段通过一次 NumPy 转换解析为 (N, 5) 的样本数组（无脉率时为 NaN），
+    同时返回无法解析的行在 lines 中的下标；坏行只会被跳过，不影响同批的其它行。
+    """
+    field_counts = np.fromiter((line.count(b',') for line in lines), dtype=np.int64, count=len(lines)) + 1
+    index = np.flatnonzero(field_counts >= 3)
+    values = np.empty(0, dtype=np.float64)
+    if len(index):
+        try:
+            values = _lines_to_float(lines, index)
+        except ValueError:
+            # 批中有非数字字段，逐行找出坏行后再整体转换一次
+            index = np.array([i for i in index if _is_numeric_line(lines[i])], dtype=np.int64)
+            if len(index):
+                values = _lines_to_float(lines, index)
+    bad_lines = np.setdiff1d(np.arange(len(lines)), index).tolist()
+
+    counts = field_counts[index]
+    offsets = np.zeros(len(index), dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    samples = np.full((len(index), 5), np.nan)
+
+    has_timestamp = counts >= 4
+    start = offsets[has_timestamp]
+    samples[has_timestamp, 0] = values[start]
+    samples[has_timestamp, 1:4] = values[start[:, None] + np.arange(1, 4)]
+    has_pulse_rate = counts >= 5
+    samples[has_pulse_rate, 4] = values[offsets[has_pulse_rate] + 4]
+
+    no_timestamp = ~has_timestamp
+    start = offsets[no_timestamp]
+    samples[no_timestamp, 0] = (first_index + np.flatnonzero(no_timestamp)) / SAMPLING_RATE
+    samples[no_timestamp, 1:4] = values[start[:, None] + np.arange(3)]
+    return samples, bad_lines
+
+
+class LineFrameDecoder:
+    """ASCII 行协议的增量解码器
+
+    每次喂入一次批量读取得到的任意长度字节流，返回其中所有完整行组成的样本批次；
+    不完整的尾部保留在复用的 bytearray 中，等待下一次数据。
+    """
+
+    protocol = 'ascii'
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.sample_count = 0
+        self.invalid_lines = 0
+
+    def reset(self):
+        del self._buffer[:]
+        self.sample_count = 0
+        self.invalid_lines = 0
+
+    def feed(self, data: bytes) -> Optional[np.ndarray]:
+        """喂入新数据，返回 (N, 5) 的样本批次，没有完整行时返回 None"""
+        buffer = self._buffer
+        buffer += data
+        end = buffer.rfind(b'\n')
+        if end < 0:
+            if len(buffer) > SERIAL_MAX_PARTIAL_FRAME:
+                # 长时间没有换行符，说明数据流错位或不是文本协议
+                logging.debug(f"丢弃 {len(buffer)} 字节无换行的串口数据")
+                del buffer[:]
+            return None
+        lines = [line for line in bytes(buffer[:end]).replace(b'\r', b'').split(b'\n') if line]
+        del buffer[:end + 1]
+        if not lines:
+            return None
+        samples, bad_lines = parse_sample_lines(lines, self.sample_count)
+        if bad_lines:
+            self.invalid_lines += len(bad_lines)
+            logging.debug(f"丢弃无法解析的串口数据: {[lines[i] for i in bad_lines[:5]]}")
+        if not len(samples):
+            return None
+        self.sample_count += len(samples)
+        return samples
+
+
+class BinaryFrameDecoder:
+    """二进制帧协议的增量解码器
+
+    整块缓冲区用结构化 dtype 一次 frombuffer 解码，同步字和 CRC 按列批量校验；
+    遇到损坏的帧时跳过一个字节重新寻找同步字。
+    时间戳由 16 位序号展开后按采样率换算，丢帧会体现为时间戳上的间隔。
+    """
+
+    protocol = 'binary'
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._last_counter: Optional[int] = None
+        self.sample_count = 0
+        self.invalid_frames = 0
+
+    def reset(self):
+        del self._buffer[:]
+        self._last_counter = None
+        self.sample_count = 0
+        self.invalid_frames = 0
+
+    def feed(self, data: bytes) -> Optional[np.ndarray]:
+        """喂入新数据，返回 (N, 5) 的样本批次，没有完整帧时返回 None"""
+        buffer = self._buffer
+        buffer += data
+        blocks = []
+        while True:
+            start = buffer.find(BINARY_SYNC_BYTES)
+            if start < 0:
+                # 保留最后一个字节，它可能是被拆开的同步字的前半部分
+                del buffer[:-1]
+                break
+            if start > 0:
+                del buffer[:start]
+            count = len(buffer) // BINARY_FRAME_SIZE
+            if count == 0:
+                break
+            raw = np.frombuffer(bytes(buffer[:count * BINARY_FRAME_SIZE]), dtype=np.uint8)
+            raw = raw.reshape(count, BINARY_FRAME_SIZE)
+            frames = raw.view(BINARY_FRAME_DTYPE).reshape(count)
+            valid = (frames['sync'] == BINARY_SYNC_WORD) & (crc16_frames(raw) == frames['crc'])
+            good = count if valid.all() else int(np.argmin(valid))
+            if good:
+                blocks.append(self._to_samples(frames[:good]))
+            if good == count:
+                del buffer[:count * BINARY_FRAME_SIZE]
+            else:
+                # 跳过损坏帧的第一个字节，重新同步
+                self.invalid_frames += 1
+                del buffer[:good * BINARY_FRAME_SIZE + 1]
+        if not blocks:
+            return None
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+
+    def _to_samples(self, frames: np.ndarray) -> np.ndarray:
+        seq = frames['seq'].astype(np.int64)
+        if self._last_counter is None:
+            first = int(seq[0])
+        else:
+            first = self._last_counter + ((int(seq[0]) - self._last_counter) & 0xFFFF)
+        # 展开 16 位序号回绕
+        steps = np.diff(seq) & 0xFFFF
+        counter = np.empty(len(seq), dtype=np.int64)
+        counter[0] = first
+        np.cumsum(steps, out=counter[1:])
+        counter[1:] += first
+        self._last_counter = int(counter[-1])
+        self.sample_count += len(frames)
+
+        samples = np.empty((len(frames), 5), dtype=np.float64)
+        samples[:, 0] = counter / SAMPLING_RATE
+        samples[:, 1] = frames['cun']
+        samples[:, 2] = frames['guan']
+        samples[:, 3] = frames['chi']
+        samples[:, 4] = frames['pulse_rate']
+        return samples
+
+
+def detect_protocol(data: bytes) -> Optional[str]:
+    """根据串口最先收到的数据判断协议，数据不足时返回 None"""
+    start = data.find(BINARY_SYNC_BYTES)
+    if start >= 0 and len(data) - start >= 3 * BINARY_FRAME_SIZE:
+        raw = np.frombuffer(data[start:start + 3 * BINARY_FRAME_SIZE], dtype=np.uint8)
+        raw = raw.reshape(3, BINARY_FRAME_SIZE)
+        frames = raw.view(BINARY_FRAME_DTYPE).reshape(3)
+        if ((frames['sync'] == BINARY_SYNC_WORD) & (crc16_frames(raw) == frames['crc'])).all():
+            return 'binary'
+    if data.count(b'\n') >= 2 and BINARY_SYNC_BYTES not in data:
+        return 'ascii'
+    if len(data) > SERIAL_MAX_PARTIAL_FRAME:
+        # 数据足够多仍无法识别时按文本协议处理，由行解码器丢弃错位数据
+        return 'ascii'
+    return None
+
+
+class AutoFrameDecoder:
+    """自动识别协议的解码器：缓存最先收到的数据直到能判断协议，之后交给对应的解码器"""
+
+    def __init__(self):
+        self._pending = bytearray()
+        self.protocol: Optional[str] = None
+        self.decoder = None
+
+    def reset(self):
+        del self._pending[:]
+        self.protocol = None
+        self.decoder = None
+
+    @property
+    def sample_count(self) -> int:
+        return self.decoder.sample_count if self.decoder is not None else 0
+
+    def feed(self, data: bytes) -> Optional[np.ndarray]:
+        if self.decoder is not None:
+            return self.decoder.feed(data)
+        self._pending += data
+        protocol = detect_protocol(bytes(self._pending))
+        if protocol is None:
+            return None
+        logging.info(f"识别到串口数据协议: {protocol}")
+        self.protocol = protocol
+        self.decoder = create_frame_decoder(protocol)
+        pending = bytes(self._pending)
+        del self._pending[:]
+        return self.decoder.feed(pending)
+
+
+def create_frame_decoder(protocol: str = 'auto'):
+    """按协议名创建解码器: 'ascii'、'binary' 或 'auto'"""
+    if protocol == 'ascii':
+        return LineFrameDecoder()
+    if protocol == 'binary':
+        return BinaryFrameDecoder()
+    if protocol == 'auto':
+        return AutoFrameDecoder()
+    raise ValueError(f"不支持的串口协议: {protocol}")
@@ -0,0 +1,158 @@
+import json
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import RECORDING_DIR, HISTORY_MAX_POINTS
+from app.services.features import FEATURE_DTYPE, FEATURE_FIELDS
+from app.services.pyramid import PYRAMID_DTYPE, level_path, merge_summaries, summarize_samples
+from app.services.recorder import (
+    FEATURES_FILE, RECORD_DTYPE, SESSION_FILE, TIME_INDEX_FILE, chunk_path, open_chunk, open_records
+)
+
+CHANNELS = ('cun', 'guan', 'chi')
+
+
+def _check_name(name: str) -> str:
+    # 设备和会话 ID 都是目录名，不允许跳出录制目录
+    if not name or name in ('.', '..') or os.path.basename(name) != name:
+        raise ValueError(f"非法的名称: {name}")
+    return name
+
+
+def list_sessions(device_id: str, root: str = RECORDING_DIR) -> List[Dict]:
+    """设备的全部录制会话信息，按开始时间排序"""
+    device_dir = os.path.join(root, _check_name(device_id))
+    if not os.path.isdir(device_dir):
+        return []
+    sessions = []
+    for session_id in sorted(os.listdir(device_dir)):
+        path = os.path.join(device_dir, session_id, SESSION_FILE)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                sessions.append(json.load(f))
+    return sessions
+
+
+def query_history(device_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                  channels: Sequence[str] = CHANNELS, points: int = 1000,
+                  session_id: Optional[str] = None, root: str = RECORDING_DIR) -> Dict:
+    """查询录制会话中 [start, end] 时间段的滤波后数据，最多返回 points 个桶
+
+    时间为会话内样本的时间戳，不指定会话时查询最近的会话。按时间跨度选择金字塔中
+    不少于 points 个桶的最粗一层（跨度很短时直接读原始分块），通过内存映射只读取需要的部分，
+    再合并到不超过 points 个桶，每个桶返回各通道的最小值、最大值和均值。
+    读取量只与 points 有关，与录制时长无关。
+    """
+    unknown = set(channels) - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"不支持的通道: {sorted(unknown)}")
+    if points <= 0:
+        raise ValueError("points 必须大于 0")
+    points = min(points, HISTORY_MAX_POINTS)
+    if session_id is None:
+        sessions = list_sessions(device_id, root)
+        if not sessions:
+            raise FileNotFoundError(f"设备 {device_id} 没有录制数据")
+        session_id = sessions[-1]['session_id']
+    session_dir = os.path.join(root, _check_name(device_id), _check_name(session_id))
+    if not os.path.exists(os.path.join(session_dir, SESSION_FILE)):
+        raise FileNotFoundError(f"录制会话 {session_id} 不存在")
+    with open(os.path.join(session_dir, SESSION_FILE), encoding='utf-8') as f:
+        info = json.load(f)
+
+    result = {
+        "status": "success",
+        "device_id": device_id,
+        "session_id": session_id,
+        "level": 1,
+        "bucket_seconds": None,
+        "timestamp": []
+    }
+    index = open_records(os.path.join(session_dir, TIME_INDEX_FILE), np.dtype('<f8'))
+    last_chunk = open_chunk(chunk_path(session_dir, len(index) - 1)) if len(index) else None
+    if last_chunk is None or not len(last_chunk):
+        result.update({position: {"min": [], "max": [], "mean": []} for position in channels})
+        return result
+    start = float(index[0]) if start is None else max(start, float(index[0]))
+    end = float(last_chunk['timestamp'][-1]) if end is None else min(end, float(last_chunk['timestamp'][-1]))
+
+    # 选择桶数不少于 points 的最粗一层
+    fs = info['sampling_rate']
+    span = max(end - start, 0.0) * fs
+    factor = 1
+    for level_factor in info.get('pyramid_factors', []):
+        if span / level_factor >= points:
+            factor = level_factor
+    if factor == 1:
+        records = _read_samples(session_dir, index, start, end)
+        entries = summarize_samples(records['timestamp'], records['filtered'], 1)
+    else:
+        level = open_records(level_path(session_dir, factor), PYRAMID_DTYPE)
+        timestamps = level['timestamp']
+        # 包含 start 的桶到包含 end 的桶
+        first = max(int(np.searchsorted(timestamps, start, 'right')) - 1, 0)
+        last = int(np.searchsorted(timestamps, end, 'right'))
+        entries = np.array(level[first:last])
+    ratio = max(1, math.ceil(len(entries) / points))
+    entries = merge_summaries(entries, ratio)
+
+    result.update({
+        "start": start,
+        "end": end,
+        "level": factor,
+        "bucket_seconds": factor * ratio / fs,
+        "timestamp": entries['timestamp'].tolist()
+    })
+    for position in channels:
+        c = CHANNELS.index(position)
+        result[position] = {field: np.round(entries[field][:, c].astype(np.float64), 4).tolist()
+                            for field in ('min', 'max', 'mean')}
+    return result
+
+
+def query_features(device_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                   channels: Sequence[str] = CHANNELS, session_id: Optional[str] = None,
+                   root: str = RECORDING_DIR) -> Dict:
+    """查询录制会话中起点在 [start, end] 内的心搏特征，按通道返回各特征的数组"""
+    unknown = set(channels) - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"不支持的通道: {sorted(unknown)}")
+    if session_id is None:
+        sessions = list_sessions(device_id, root)
+        if not sessions:
+            raise FileNotFoundError(f"设备 {device_id} 没有录制数据")
+        session_id = sessions[-1]['session_id']
+    session_dir = os.path.join(root, _check_name(device_id), _check_name(session_id))
+    if not os.path.exists(os.path.join(session_dir, SESSION_FILE)):
+        raise FileNotFoundError(f"录制会话 {session_id} 不存在")
+    features = open_records(os.path.join(session_dir, FEATURES_FILE), FEATURE_DTYPE)
+    # 各通道的心搏交错写入，起点只是大致有序，这里按条件筛选
+    selected = np.ones(len(features), dtype=bool)
+    if start is not None:
+        selected &= features['onset'] >= start
+    if end is not None:
+        selected &= features['onset'] <= end
+    result = {"status": "success", "device_id": device_id, "session_id": session_id}
+    for position in channels:
+        records = features[selected & (features['channel'] == CHANNELS.index(position))]
+        entry = {"onset": records['onset'].tolist()}
+        for field in FEATURE_FIELDS + ('harmonics',):
+            values = np.round(records[field].astype(np.float64), 4)
+            entry[field] = np.where(np.isnan(values), None, values).tolist()
+        result[position] = entry
+    return result
+
+
+def _read_samples(session_dir: str, index: np.ndarray, start: float, end: float) -> np.ndarray:
+    """按时间索引只打开覆盖 [start, end] 的分块，返回其中的记录"""
+    first = max(int(np.searchsorted(index, start, 'right')) - 1, 0)
+    last = int(np.searchsorted(index, end, 'right')) - 1
+    parts = []
+    for chunk in range(first, last + 1):
+        records = open_chunk(chunk_path(session_dir, chunk))
+        timestamps = records['timestamp']
+        parts.append(records[np.searchsorted(timestamps, start, 'left'):np.searchsorted(timestamps, end, 'right')])
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD_DTYPE)
@@ -0,0 +1,111 @@
+import os
+from typing import List, Sequence
+
+import numpy as np
+
+from app.core.config import RECORDING_PYRAMID_FACTORS
+
+# 多分辨率摘要中每个桶的记录：桶内第一个样本的时间戳，以及寸、关、尺滤波后数据的最小值、最大值和均值
+PYRAMID_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('min', '<f4', (3,)),
+    ('max', '<f4', (3,)),
+    ('mean', '<f4', (3,)),
+])
+
+
+def level_path(session_dir: str, factor: int) -> str:
+    return os.path.join(session_dir, f"level_{factor:06d}.bin")
+
+
+def summarize_samples(timestamps: np.ndarray, data: np.ndarray, factor: int) -> np.ndarray:
+    """把 (N, 3) 的样本按每 factor 个一组汇总，N 须为 factor 的整数倍"""
+    groups = data.reshape(len(data) // factor, factor, data.shape[1])
+    summary = np.empty(len(groups), dtype=PYRAMID_DTYPE)
+    summary['timestamp'] = timestamps[::factor]
+    summary['min'] = groups.min(axis=1)
+    summary['max'] = groups.max(axis=1)
+    summary['mean'] = groups.mean(axis=1)
+    return summary
+
+
+def combine_summaries(entries: np.ndarray, ratio: int) -> np.ndarray:
+    """把等长的桶每 ratio 个合并为一个，entries 长度须为 ratio 的整数倍"""
+    count = len(entries) // ratio
+    summary = np.empty(count, dtype=PYRAMID_DTYPE)
+    summary['timestamp'] = entries['timestamp'][::ratio]
+    for field, reduce in (('min', np.min), ('max', np.max), ('mean', np.mean)):
+        summary[field] = reduce(entries[field].reshape(count, ratio, 3), axis=1)
+    return summary
+
+
+def merge_summaries(entries: np.ndarray, ratio: int) -> np.ndarray:
+    """把任意长度的桶每 ratio 个合并为一个，最后不足 ratio 个的也合并为一个"""
+    if ratio <= 1 or not len(entries):
+        return entries
+    starts = np.arange(0, len(entries), ratio)
+    summary = np.empty(len(starts), dtype=PYRAMID_DTYPE)
+    summary['timestamp'] = entries['timestamp'][starts]
+    summary['min'] = np.minimum.reduceat(entries['min'], starts, axis=0)
+    summary['max'] = np.maximum.reduceat(entries['max'], starts, axis=0)
+    counts = np.diff(np.r_[starts, len(entries)])[:, None]
+    summary['mean'] = np.add.reduceat(entries['mean'].astype(np.float64), starts, axis=0) / counts
+    return summary
+
+
+class PyramidBuilder:
+    """录制时增量构建的 min/max/mean 金字塔
+
+    第 i 层每个桶汇总 factors[i] 个样本，第 0 层由样本直接汇总，之后每层由上一层的桶合并，
+    每层一个只追加的定长记录文件。未凑满一个桶的样本（或下层桶）留到下一块数据，
+    所以会话末尾不足一个桶的数据只存在于更细的层和原始分块中。
+    """
+
+    def __init__(self, directory: str, factors: Sequence[int] = RECORDING_PYRAMID_FACTORS):
+        for lower, upper in zip(factors, factors[1:]):
+            if upper % lower:
+                raise ValueError(f"金字塔各层的倍数必须逐层整除: {factors}")
+        self.directory = directory
+        self.factors = list(factors)
+        self._files = [None] * len(self.factors)
+        self._dirty = set()
+        self._timestamps = np.empty(0, dtype=np.float64)
+        self._data = np.empty((0, 3), dtype=np.float32)
+        self._pending: List[np.ndarray] = [np.empty(0, dtype=PYRAMID_DTYPE) for _ in self.factors]
+
+    def append(self, timestamps: np.ndarray, data: np.ndarray):
+        """追加 (N, 3) 的滤波后样本"""
+        timestamps = np.concatenate((self._timestamps, timestamps))
+        data = np.concatenate((self._data, data))
+        complete = len(timestamps) // self.factors[0] * self.factors[0]
+        self._timestamps, self._data = timestamps[complete:], data[complete:]
+        entries = summarize_samples(timestamps[:complete], data[:complete], self.factors[0])
+        for level, factor in enumerate(self.factors):
+            if level:
+                ratio = factor // self.factors[level - 1]
+                entries = np.concatenate((self._pending[level], entries))
+                complete = len(entries) // ratio * ratio
+                self._pending[level] = entries[complete:]
+                entries = combine_summaries(entries[:complete], ratio)
+            if not len(entries):
+                break
+            self._write(level, entries)
+
+    def sync(self):
+        for level in self._dirty:
+            self._files[level].flush()
+            os.fsync(self._files[level].fileno())
+        self._dirty.clear()
+
+    def close(self):
+        self.sync()
+        for f in self._files:
+            if f is not None:
+                f.close()
+        self._files = [None] * len(self.factors)
+
+    def _write(self, level: int, entries: np.ndarray):
+        if self._files[level] is None:
+            self._files[level] = open(level_path(self.directory, self.factors[level]), 'ab')
+        self._files[level].write(entries.tobytes())
+        self._dirty.add(level)
@@ -0,0 +1,323 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import (
+    SAMPLING_RATE, RECORDING_DIR, RECORDING_CHUNK_SAMPLES, RECORDING_COMMIT_INTERVAL, RECORDING_QUEUE_SIZE
+)
+from app.services.features import FEATURE_DTYPE
+from app.services.pyramid import PyramidBuilder
+
+# 录制文件中每个样本的记录（小端、定长，可直接 np.memmap）
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('raw', '<f4', (3,)),       # 寸、关、尺原始数据
+    ('filtered', '<f4', (3,)),  # 寸、关、尺滤波后数据
+])
+SESSION_FILE = 'session.json'
+TIME_INDEX_FILE = 'time_index.bin'  # 每个分块第一个样本的时间戳（<f8），用于按时间定位分块
+FEATURES_FILE = 'features.bin'  # 每个心搏的特征记录（FEATURE_DTYPE）
+
+
+def chunk_path(session_dir: str, index: int) -> str:
+    return os.path.join(session_dir, f"chunk_{index:06d}.bin")
+
+
+def open_records(path: str, dtype: np.dtype) -> np.ndarray:
+    """以只读内存映射打开一个定长记录文件，忽略末尾未写完整的记录"""
+    count = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+    if not count:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def open_chunk(path: str) -> np.ndarray:
+    return open_records(path, RECORD_DTYPE)
+
+
+def make_records(timestamps: np.ndarray, raw: np.ndarray, filtered: np.ndarray) -> np.ndarray:
+    """把时间戳和 (3, N) 的原始/滤波数据打包为记录数组"""
+    records = np.empty(len(timestamps), dtype=RECORD_DTYPE)
+    records['timestamp'] = timestamps
+    records['raw'] = raw.T
+    records['filtered'] = filtered.T
+    return records
+
+
+class RecordingSession:
+    """一次采集会话的录制文件
+
+    每个会话一个目录，样本按固定条数切分为分块文件 chunk_000000.bin、chunk_000001.bin ...，
+    只追加不修改，第 k 个分块保存第 k * chunk_samples 个样本起的数据，写满后轮换到下一个分块。
+    session.json 保存会话信息，在轮换和结束时更新；time_index.bin 记录每个分块的起始时间戳，
+    滤波后数据同时汇总为多分辨率的 min/max/mean 金字塔（见 PyramidBuilder），
+    心搏特征追加到 features.bin。
+    """
+
+    def __init__(self, root: str, device_id: str, session_id: str, chunk_samples: int,
+                 sampling_rate: float = SAMPLING_RATE):
+        self.device_id = device_id
+        self.session_id = session_id
+        self.directory = os.path.join(root, device_id, session_id)
+        self.chunk_samples = chunk_samples
+        self.sampling_rate = sampling_rate
+        self.started_at = datetime.now().isoformat()
+        self.ended_at: Optional[str] = None
+        self.samples = 0
+        self.features = 0
+        self.pyramid = PyramidBuilder(self.directory)
+        self._index = None
+        self._features = None
+        self._file = None
+        self._chunk = -1
+        self._dirty = False
+        self._features_dirty = False
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = open(os.path.join(self.directory, TIME_INDEX_FILE), 'ab')
+        self._features = open(os.path.join(self.directory, FEATURES_FILE), 'ab')
+        self._write_info()
+
+    def append(self, records: np.ndarray):
+        """追加记录，跨越分块边界时轮换文件"""
+        offset = 0
+        while offset < len(records):
+            chunk, position = divmod(self.samples, self.chunk_samples)
+            if chunk != self._chunk:
+                self._rotate(chunk, records['timestamp'][offset])
+            count = min(len(records) - offset, self.chunk_samples - position)
+            self._file.write(records[offset:offset + count].tobytes())
+            offset += count
+            self.samples += count
+            self._dirty = True
+        self.pyramid.append(records['timestamp'], records['filtered'])
+
+    def append_features(self, features: np.ndarray):
+        self._features.write(features.tobytes())
+        self.features += len(features)
+        self._features_dirty = True
+
+    def sync(self):
+        """把已写入的数据落盘"""
+        if self._file is not None and self._dirty:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._index.flush()
+            os.fsync(self._index.fileno())
+            self._dirty = False
+        if self._features is not None and self._features_dirty:
+            self._features.flush()
+            os.fsync(self._features.fileno())
+            self._features_dirty = False
+        self.pyramid.sync()
+
+    def close(self):
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        if self._features is not None:
+            self._features.close()
+            self._features = None
+        self.pyramid.close()
+        self.ended_at = datetime.now().isoformat()
+        self._write_info()
+
+    def info(self) -> Dict:
+        return {
+            "device_id": self.device_id,
+            "session_id": self.session_id,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "sampling_rate": self.sampling_rate,
+            "chunk_samples": self.chunk_samples,
+            "pyramid_factors": self.pyramid.factors,
+            "record_dtype": RECORD_DTYPE.descr,
+            "feature_dtype": FEATURE_DTYPE.descr,
+            "samples": self.samples,
+            "features": self.features
+        }
+
+    def _rotate(self, chunk: int, first_timestamp: float):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._write_info()
+        self._file = open(chunk_path(self.directory, chunk), 'ab')
+        self._chunk = chunk
+        self._index.write(np.array([first_timestamp], dtype='<f8').tobytes())
+
+    def _write_info(self):
+        # 先写临时文件再替换，读取方不会看到写了一半的 session.json
+        path = os.path.join(self.directory, SESSION_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.info(), f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+class Recorder:
+    """采集数据录制器
+
+    事件循环只把数据块放入队列（不等待磁盘），由单个后台写线程按会话追加到文件。
+    写线程采用组提交：每 commit_interval 秒把期间收到的全部数据块写入后，
+    每个有改动的文件只 fsync 一次，多台设备共用一块磁盘时也只有少量顺序写。
+    队列满时丢弃数据块并计数，不阻塞实时数据。
+    """
+
+    def __init__(self, root: str = RECORDING_DIR, chunk_samples: int = RECORDING_CHUNK_SAMPLES,
+                 commit_interval: float = RECORDING_COMMIT_INTERVAL, queue_size: int = RECORDING_QUEUE_SIZE):
+        self.root = root
+        self.chunk_samples = chunk_samples
+        self.commit_interval = commit_interval
+        self.active: Dict[str, str] = {}  # 设备 -> 正在录制的会话
+        self.dropped_blocks = 0
+        self.written_samples = 0
+        self.commits = 0
+        self.write_seconds = 0.0  # 写线程写文件和 fsync 累计耗时
+        self.error: Optional[str] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._sessions: Dict[str, RecordingSession] = {}  # 仅由写线程访问
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """结束所有会话并等待写线程把队列中的数据写完"""
+        if self._thread is None:
+            return
+        for device_id in list(self.active):
+            self.close_session(device_id)
+        self._queue.put(('stop', None, None))
+        self._thread.join()
+        self._thread = None
+
+    def open_session(self, device_id: str, sampling_rate: float = SAMPLING_RATE) -> str:
+        """开始录制设备的一个新会话，返回会话 ID"""
+        self.start()
+        if device_id in self.active:
+            self.close_session(device_id)
+        session_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        session = RecordingSession(self.root, device_id, session_id, self.chunk_samples, sampling_rate)
+        self.active[device_id] = session_id
+        self._queue.put(('open', device_id, session))
+        return session_id
+
+    def close_session(self, device_id: str):
+        if self.active.pop(device_id, None) is not None:
+            self._queue.put(('close', device_id, None))
+
+    def write(self, device_id: str, timestamps: np.ndarray, raw: np.ndarray, filtered: np.ndarray):
+        """把一个数据块交给写线程，设备没有在录制时忽略"""
+        if device_id not in self.active or not len(timestamps):
+            return
+        try:
+            self._queue.put_nowait(('write', device_id, make_records(timestamps, raw, filtered)))
+        except queue.Full:
+            self.dropped_blocks += 1
+            if self.dropped_blocks % 100 == 1:
+                logging.warning(f"录制队列已满，已丢弃 {self.dropped_blocks} 个数据块")
+
+    def write_features(self, device_id: str, features: np.ndarray):
+        """把一批心搏特征交给写线程，设备没有在录制时忽略"""
+        if device_id not in self.active or not len(features):
+            return
+        try:
+            self._queue.put_nowait(('features', device_id, features))
+        except queue.Full:
+            self.dropped_blocks += 1
+
+    def stats(self) -> Dict:
+        return {
+            "root": self.root,
+            "active_sessions": dict(self.active),
+            "queued_blocks": self._queue.qsize(),
+            "dropped_blocks": self.dropped_blocks,
+            "written_samples": self.written_samples,
+            "commits": self.commits,
+            "write_seconds": round(self.write_seconds, 6),
+            "error": self.error
+        }
+
+    def _run(self):
+        running = True
+        while running:
+            commands = [self._queue.get()]
+            # 组提交：收集一个提交周期内的全部命令
+            deadline = time.monotonic() + self.commit_interval
+            while commands[-1][0] != 'stop':
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    commands.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            running = commands[-1][0] != 'stop'
+            started = time.perf_counter()
+            try:
+                self._commit(commands)
+            except Exception as e:
+                self.error = str(e)
+                logging.error(f"写入录制文件失败: {e}")
+            self.write_seconds += time.perf_counter() - started
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+    def _commit(self, commands: List):
+        pending: Dict[RecordingSession, List[np.ndarray]] = {}
+        features: Dict[RecordingSession, List[np.ndarray]] = {}
+        for command, device_id, payload in commands:
+            if command == 'open':
+                payload.open()
+                self._sessions[device_id] = payload
+            elif command == 'write':
+                session = self._sessions.get(device_id)
+                if session is not None:
+                    pending.setdefault(session, []).append(payload)
+            elif command == 'features':
+                session = self._sessions.get(device_id)
+                if session is not None:
+                    features.setdefault(session, []).append(payload)
+            elif command == 'close':
+                session = self._sessions.pop(device_id, None)
+                if session is not None:
+                    self._append(session, pending.pop(session, []))
+                    self._append_features(session, features.pop(session, []))
+                    session.close()
+        for session, blocks in features.items():
+            self._append_features(session, blocks)
+        for session in set(pending) | set(features):
+            self._append(session, pending.get(session, []))
+            session.sync()
+        self.commits += 1
+
+    def _append(self, session: RecordingSession, blocks: List[np.ndarray]):
+        if not blocks:
+            return
+        records = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        session.append(records)
+        self.written_samples += len(records)
+
+    @staticmethod
+    def _append_features(session: RecordingSession, blocks: List[np.ndarray]):
+        if blocks:
+            session.append_features(blocks[0] if len(blocks) == 1 else np.concatenate(blocks))
+
+
+# 创建全局录制器实例
+recorder = Recorder()
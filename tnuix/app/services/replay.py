@@ -0,0 +1,185 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import SAMPLING_RATE, FILTER_CHAIN, RECORDING_DIR, ACQUISITION_QUEUE_SIZE, REPLAY_BLOCK_SECONDS
+from app.services.recorder import SESSION_FILE, TIME_INDEX_FILE, chunk_path, open_chunk, open_records
+
+# 回放端口名: REPLAY:<设备ID>/<会话ID>
+REPLAY_PREFIX = 'REPLAY:'
+
+
+def replay_port(device_id: str, session_id: str) -> str:
+    return f"{REPLAY_PREFIX}{device_id}/{session_id}"
+
+
+def parse_replay_port(port: str) -> Tuple[str, str]:
+    """从回放端口名解析 (设备ID, 会话ID)"""
+    device_id, _, session_id = port[len(REPLAY_PREFIX):].partition('/')
+    for name in (device_id, session_id):
+        if not name or name in ('.', '..') or os.path.basename(name) != name:
+            raise ValueError(f"非法的回放端口: {port}")
+    return device_id, session_id
+
+
+def replay_sampling_rate(port: str, root: str = RECORDING_DIR) -> float:
+    """录制会话的采样率（录制的是滤波链抽取后保留的样本），没有会话信息时为 SAMPLING_RATE"""
+    device_id, session_id = parse_replay_port(port)
+    try:
+        with open(os.path.join(root, device_id, session_id, SESSION_FILE), encoding='utf-8') as f:
+            return float(json.load(f).get('sampling_rate', SAMPLING_RATE))
+    except (OSError, ValueError, TypeError):
+        return SAMPLING_RATE
+
+
+def replay_filter_chain(filter_chain: Optional[Sequence[Dict]], sampling_rate: float) -> Sequence[Dict]:
+    """回放按 sampling_rate 录制（已经抽取过）的会话时使用的滤波链
+
+    录制数据不能再抽取：不指定滤波链时使用去掉抽取级的 config.FILTER_CHAIN，
+    指定的滤波链含抽取级时抛出 ValueError。
+    """
+    if filter_chain is None:
+        return [stage for stage in FILTER_CHAIN if stage.get('type') != 'decimate']
+    if any(isinstance(stage, dict) and stage.get('type') == 'decimate' for stage in filter_chain):
+        raise ValueError(f"录制数据已抽取为 {sampling_rate:g} Hz，回放的滤波链不能再抽取")
+    return filter_chain
+
+
+def list_replay_ports(root: str = RECORDING_DIR) -> List[str]:
+    """列出所有可回放的录制会话"""
+    if not os.path.isdir(root):
+        return []
+    ports = []
+    for device_id in sorted(os.listdir(root)):
+        device_dir = os.path.join(root, device_id)
+        if not os.path.isdir(device_dir):
+            continue
+        for session_id in sorted(os.listdir(device_dir)):
+            if os.path.exists(os.path.join(device_dir, session_id, TIME_INDEX_FILE)):
+                ports.append(replay_port(device_id, session_id))
+    return ports
+
+
+class ReplayAcquisitionEngine:
+    """录制回放采集引擎，接口与 SerialAcquisitionEngine 相同
+
+    回放线程按分块读取录制的原始数据，切成与串口读取相近的小批次，
+    按样本时间戳和回放倍速定时交给事件循环，之后的滤波、缓存、录制和推送与真实串口完全相同。
+    speed 为回放倍速，小于等于 0 表示不限速：此时不丢批次，队列满时回放线程等待事件循环消费，
+    回放速度即整条处理链路能承受的最大速度。
+    """
+
+    def __init__(self, port: str, speed: float = 1.0, queue_size: int = ACQUISITION_QUEUE_SIZE,
+                 root: str = RECORDING_DIR, block_seconds: float = REPLAY_BLOCK_SECONDS):
+        device_id, session_id = parse_replay_port(port)
+        self.port = port
+        self.speed = speed
+        self.directory = os.path.join(root, device_id, session_id)
+        self.block_seconds = block_seconds
+        self.connection = None  # 没有真实串口
+        self.error: Optional[str] = None
+        self.dropped_batches = 0
+        self.cpu_seconds = 0.0
+        self.replayed_samples = 0
+        self._queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """检查录制会话并启动回放线程，必须在事件循环所在线程中调用"""
+        if not os.path.exists(os.path.join(self.directory, TIME_INDEX_FILE)):
+            raise FileNotFoundError(f"录制会话不存在: {self.port}")
+        self._loop = loop or asyncio.get_event_loop()
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"replay-{self.port}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    async def get_batch(self) -> Optional[np.ndarray]:
+        """等待下一个样本批次，回放结束时返回 None"""
+        if self._queue is None:
+            return None
+        return await self._queue.get()
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        started = time.monotonic()
+        first_timestamp = None
+        try:
+            chunks = len(open_records(os.path.join(self.directory, TIME_INDEX_FILE), np.dtype('<f8')))
+            for chunk in range(chunks):
+                records = open_chunk(chunk_path(self.directory, chunk))
+                if not len(records):
+                    continue
+                if first_timestamp is None:
+                    first_timestamp = float(records['timestamp'][0])
+                # 按时间切成小批次，与串口读线程每次唤醒读到的数据量相近
+                bucket = np.floor((records['timestamp'] - first_timestamp) / self.block_seconds)
+                bounds = np.flatnonzero(np.diff(bucket)) + 1
+                for block in np.split(np.arange(len(records)), bounds):
+                    if self._stop_event.is_set():
+                        return
+                    batch = np.empty((len(block), 5), dtype=np.float64)
+                    batch[:, 0] = records['timestamp'][block]
+                    batch[:, 1:4] = records['raw'][block]
+                    batch[:, 4] = np.nan  # 录制中没有设备上报的脉率
+                    if self.speed > 0:
+                        # 批次的最后一个样本到期时发出
+                        due = started + (batch[-1, 0] - first_timestamp) / self.speed
+                        delay = due - time.monotonic()
+                        if delay > 0 and self._stop_event.wait(delay):
+                            return
+                    if not self._deliver(batch):
+                        return
+                    self.replayed_samples += len(batch)
+                    self.cpu_seconds = time.thread_time() - cpu_start
+        except Exception as e:
+            if not self._stop_event.is_set():
+                self.error = str(e)
+                logging.error(f"回放线程异常退出: {e}")
+        finally:
+            # 通知消费者回放已结束
+            try:
+                self._deliver(None)
+            except RuntimeError:
+                pass
+
+    def _deliver(self, batch: Optional[np.ndarray]) -> bool:
+        """把批次交给事件循环；不限速时等待队列有空位，停止时返回 False"""
+        if self.speed > 0:
+            self._loop.call_soon_threadsafe(self._put, batch)
+            return True
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(batch), self._loop)
+        while True:
+            try:
+                future.result(0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if self._stop_event.is_set():
+                    future.cancel()
+                    return False
+
+    def _put(self, batch: Optional[np.ndarray]):
+        """在事件循环线程中入队，队列满时丢弃最旧的批次"""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped_batches += 1
+        self._queue.put_nowait(batch)
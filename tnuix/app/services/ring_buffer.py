@@ -0,0 +1,89 @@
+from typing import Tuple
+
+import numpy as np
+
+
+class SampleRingBuffer:
+    """固定容量的样本环形缓冲区
+
+    一个时间戳数组加一个 (通道数, 容量) 的数据数组，整块追加为 O(1) 均摊（最多两段拷贝），
+    满了之后覆盖最旧的样本。读取最近 N 个样本或某时间戳之后的样本时，
+    数据在内存中连续则返回零拷贝视图，跨越回绕点时返回两段拼接的拷贝。
+    假定时间戳单调递增。
+    """
+
+    def __init__(self, capacity: int, channels: int = 3, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.data = np.zeros((channels, self.capacity), dtype=dtype)
+        self._head = 0  # 下一个写入位置
+        self._size = 0
+        self.total_samples = 0  # 累计写入的样本数
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+    def append(self, timestamps: np.ndarray, block: np.ndarray):
+        """追加一块样本，block 的 shape 为 (通道数, 样本数)"""
+        count = len(timestamps)
+        self.total_samples += count
+        if count >= self.capacity:
+            # 数据块比容量还大，只保留最后 capacity 个样本
+            self.timestamps[:] = timestamps[-self.capacity:]
+            self.data[:] = block[:, -self.capacity:]
+            self._head = 0
+            self._size = self.capacity
+            return
+        first = min(count, self.capacity - self._head)
+        self.timestamps[self._head:self._head + first] = timestamps[:first]
+        self.data[:, self._head:self._head + first] = block[:, :first]
+        rest = count - first
+        if rest:
+            self.timestamps[:rest] = timestamps[first:]
+            self.data[:, :rest] = block[:, first:]
+        self._head = (self._head + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+
+    def last(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """最近 count 个样本，返回 (时间戳, (通道数, 样本数) 的数据)"""
+        count = max(0, min(int(count), self._size))
+        return self._slice(self._size - count, self._size)
+
+    def since(self, timestamp: float) -> Tuple[np.ndarray, np.ndarray]:
+        """时间戳大于等于 timestamp 的所有样本"""
+        return self._slice(self._search(timestamp), self._size)
+
+    def latest_timestamp(self) -> float:
+        if not self._size:
+            return float('nan')
+        return float(self.timestamps[self._head - 1])
+
+    def _physical(self, index: int) -> int:
+        """逻辑下标（0 为最旧样本）转换为数组下标"""
+        return (self._head - self._size + index) % self.capacity
+
+    def _search(self, timestamp: float) -> int:
+        """二分查找第一个时间戳 >= timestamp 的逻辑下标"""
+        start = self._physical(0)
+        if start + self._size <= self.capacity:
+            return int(np.searchsorted(self.timestamps[start:start + self._size], timestamp))
+        older = self.timestamps[start:]
+        if len(older) and older[-1] >= timestamp:
+            return int(np.searchsorted(older, timestamp))
+        return len(older) + int(np.searchsorted(self.timestamps[:self._head], timestamp))
+
+    def _slice(self, begin: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        if begin >= end:
+            return self.timestamps[:0], self.data[:, :0]
+        start = self._physical(begin)
+        stop = start + (end - begin)
+        if stop <= self.capacity:
+            return self.timestamps[start:stop], self.data[:, start:stop]
+        stop -= self.capacity
+        return (np.concatenate((self.timestamps[start:], self.timestamps[:stop])),
+                np.concatenate((self.data[:, start:], self.data[:, :stop]), axis=1))
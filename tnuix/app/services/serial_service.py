@@ -1,40 +1,79 @@
 import serial
 import serial.tools.list_ports
-from typing import List, Optional, Dict, Tuple
+from typing import List, Optional, Dict, Callable, Awaitable, Union, Sequence
 import numpy as np
 from scipy import signal
 import asyncio
-import json
+import functools
 import logging
-from app.core.config import SAMPLING_RATE, NOTCH_FREQ, QUALITY_FACTOR, SERIAL_BUFFER_MAX_SIZE
+import time
+from app.core.config import (
+    SAMPLING_RATE, NOTCH_FREQ, QUALITY_FACTOR, SERIAL_BUFFER_MAX_SIZE, SERIAL_PROTOCOL, DEFAULT_DEVICE_ID,
+    FILTER_CHAIN
+)
+from app.services.acquisition import SerialAcquisitionEngine
+from app.services.alerts import AlertMonitor
+from app.services.analytics import AnalyticsPool, BackgroundAnalytics
+from app.services.filters import FilterChain
+from app.services.frame_decoder import parse_sample_lines
+from app.services.replay import REPLAY_PREFIX, ReplayAcquisitionEngine, list_replay_ports
+from app.services.ring_buffer import SampleRingBuffer
+from app.services.simulator import SimulatedAcquisitionEngine
+
+CHANNELS = ('cun', 'guan', 'chi')
+
 
 class SerialService:
-    def __init__(self,is_Simulated):
-        self.connection: Optional[serial.Serial] = None
+    """单个采集设备：串口读线程、滤波状态和环形缓冲区都属于该设备
+
+    filter_chain 为该设备的滤波链（格式见 config.FILTER_CHAIN），最后一级为抽取时，
+    滤波之后的处理（缓冲、心搏、告警、特征、录制）都使用抽取后的采样率 sampling_rate；
+    input_rate 为输入数据的采样率，回放抽取过的录制时为录制的采样率。
+    心搏检测、特征提取和频谱图由 analytics_pool 的工作进程计算，不指定时在事件循环中直接计算；
+    数据块不等待分析结果，先录制和推送，分析结果到达后单独分发。
+    """
+
+    def __init__(self,is_Simulated, device_id: str = DEFAULT_DEVICE_ID, stream_id: int = 0,
+                 filter_chain: Optional[Sequence[Dict]] = None, analytics_pool: Optional[AnalyticsPool] = None,
+                 input_rate: float = SAMPLING_RATE):
+        self.device_id = device_id
+        self.stream_id = stream_id  # 数据流编号，用于区分同一连接上的多个设备数据流
+        self.port: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.processing_seconds = 0.0  # 事件循环中处理该设备数据累计耗时
+        self.reader_cpu_seconds = 0.0  # 已停止的读线程累计 CPU 时间
+        self.engine: Optional[Union[SerialAcquisitionEngine, ReplayAcquisitionEngine, SimulatedAcquisitionEngine]] = None
         self.is_connected: bool = False
         self.use_simulated_data: bool = is_Simulated#这里使用模拟数据改成false
-        self.data_buffer: Dict[str, List[Tuple[float, float]]] = {
-            'cun': [],
-            'guan': [],
-            'chi': []
-        }
+        self.data_buffer = SampleRingBuffer(SERIAL_BUFFER_MAX_SIZE)  # 寸、关、尺三个通道的滤波后数据
         self.data_lock = asyncio.Lock()
+        self.filter = FilterChain(FILTER_CHAIN if filter_chain is None else filter_chain, input_rate)
+        self.sampling_rate = self.filter.output_rate
+        self.alerts = AlertMonitor()
+        # 频谱图使用滤波前的原始数据
+        self.analytics = BackgroundAnalytics((analytics_pool or AnalyticsPool(workers=0)).client(
+            f"{device_id}/{stream_id}", self.sampling_rate, input_rate))
 
-    def getDataFromSerialPort(self):
-        """持续读取串口数据"""
-        logging.debug(f"自定义串口连接状态为{self.is_connected}")
-        logging.debug(f"预定义串口连接状态为{self.connection.is_open}")
-        while self.is_connected and self.connection.is_open:
+    async def getDataFromSerialPort(self, on_block: Optional[Callable[['SerialService', Dict], Awaitable]] = None,
+                                    on_analytics: Optional[Callable[['SerialService', Dict], Awaitable]] = None):
+        """持续处理采集引擎读到的串口数据，每处理完一个批次调用 on_block，该批次的分析结果到达后调用 on_analytics"""
+        logging.debug(f"设备 {self.device_id} 串口连接状态为{self.is_connected}")
+        while self.is_connected and self.engine is not None:
+            batch = await self.engine.get_batch()
+            if batch is None:
+                # 读线程已结束
+                self.last_error = self.engine.error if self.engine is not None else None
+                logging.debug(f"设备 {self.device_id} 串口读线程已结束: {self.last_error}")
+                self.disconnect()
+                break
             try:
-                data = self.connection.readline().decode('utf-8').strip()
-                if data:
-                    logging.debug(f"接收到的数据: {data}")
-                    processed_data = await self.process_serial_data(data)
-                    if processed_data:
-                        logging.debug(f"处理后的数据: {processed_data}")
+                started = time.perf_counter()
+                block = await self.process_sample_block(batch, on_analytics)
+                self.processing_seconds += time.perf_counter() - started
+                if on_block is not None and len(block['timestamp']):
+                    await on_block(self, block)
             except Exception as e:
-                logging.error(f"读取串口数据错误: {e}")
-            await asyncio.sleep(0.1)  # 稍微等待一段时间，避免过于频繁地读取
+                logging.error(f"处理设备 {self.device_id} 串口数据错误: {e}")
 
 
     @staticmethod
@@ -42,62 +81,131 @@ class SerialService:
         """获取可用串口列表"""
         real_ports = [port.device for port in serial.tools.list_ports.comports()]
         debug_ports = ["DEBUG_COM1", "DEBUG_COM2", "DEBUG_COM3"]
-        return real_ports + debug_ports
+        return real_ports + debug_ports + list_replay_ports()
+
+    def connect(self, port: str, baudrate: int = 115200, protocol: str = SERIAL_PROTOCOL,
+                speed: float = 1.0) -> Dict:
+        """连接串口，protocol 为 'ascii'、'binary' 或 'auto'（自动识别）
 
-    def connect(self, port: str, baudrate: int = 115200) -> Dict:
-        """连接串口"""
+        DEBUG_ 开头的端口为虚拟设备，按真实采样率生成模拟脉搏数据；
+        REPLAY: 开头的端口回放录制会话，speed 为回放倍速，小于等于 0 表示不限速。
+        """
         try:
-            if port.startswith("DEBUG_"):
-                self.is_connected = True
-                self.use_simulated_data = True
-                return {"status": "success", "port": port, "baudrate": baudrate, "mode": "debug"}
+            if self.engine is not None:
+                self.engine.stop()
+                self.engine = None
 
-            if self.connection and self.connection.is_open:
-                self.connection.close()
-
-            self.connection = serial.Serial(
-                port=port,
-                baudrate=baudrate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=1
-            )
+            # 串口读取在采集引擎的读线程中进行
+            if port.startswith("DEBUG_"):
+                self.engine = SimulatedAcquisitionEngine(port)
+            elif port.startswith(REPLAY_PREFIX):
+                self.engine = ReplayAcquisitionEngine(port, speed)
+            else:
+                self.engine = SerialAcquisitionEngine(port, baudrate, protocol)
+            self.engine.start()
+            self.filter.reset()
+            self.analytics.reset()
+            self.alerts.reset()
+            self.port = port
+            self.last_error = None
             
             self.is_connected = True
-            self.use_simulated_data = False
-            return {"status": "success", "port": port, "baudrate": baudrate}
+            self.use_simulated_data = port.startswith("DEBUG_")
+            if port.startswith("DEBUG_"):
+                return {"status": "success", "port": port, "baudrate": baudrate, "mode": "debug"}
+            if port.startswith(REPLAY_PREFIX):
+                return {"status": "success", "port": port, "baudrate": baudrate, "mode": "replay", "speed": speed}
+            return {"status": "success", "port": port, "baudrate": baudrate, "protocol": protocol}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
     def disconnect(self) -> Dict:
         """断开串口连接"""
         try:
-            if self.connection and self.connection.is_open:
-                self.connection.close()
+            if self.engine is not None:
+                self.engine.stop()
+                self.reader_cpu_seconds += self.engine.cpu_seconds
+                self.engine = None
             self.is_connected = False
             self.use_simulated_data = True
+            self.alerts.reset()
+            self.analytics.close()
             return {"status": "success"}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def set_filter_chain(self, stages: Sequence[Dict], channels: Optional[Sequence[str]] = None) -> Dict:
+        """运行中修改滤波链，channels 为要修改的部位（默认全部），其余部位的滤波状态不受影响"""
+        try:
+            if not isinstance(stages, list):
+                raise ValueError("stages 必须为列表")
+            positions = None
+            if channels is not None:
+                unknown = set(channels) - set(CHANNELS)
+                if unknown:
+                    raise ValueError(f"不支持的通道: {sorted(unknown)}")
+                positions = [CHANNELS.index(position) for position in channels]
+            self.filter.configure(stages, positions)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        return dict(self.filter_info(), status="success")
+
+    def filter_info(self) -> Dict:
+        return {
+            "device_id": self.device_id,
+            "input_rate": self.filter.fs,
+            "sampling_rate": self.sampling_rate,
+            "decimation": self.filter.decimation,
+            "stages": dict(zip(CHANNELS, self.filter.stages))
+        }
+
     def get_status(self) -> Dict:
         """获取连接状态"""
         port_info = None
-        if self.connection:
+        if isinstance(self.engine, ReplayAcquisitionEngine):
+            port_info = {
+                "port": self.engine.port,
+                "speed": self.engine.speed,
+                "replayed_samples": self.engine.replayed_samples,
+                "dropped_batches": self.engine.dropped_batches
+            }
+        elif isinstance(self.engine, SimulatedAcquisitionEngine):
+            port_info = {
+                "port": self.engine.port,
+                "pattern": self.engine.generator.pattern,
+                "generated_samples": self.engine.generator.sample_index,
+                "dropped_batches": self.engine.dropped_batches
+            }
+        elif self.engine is not None and self.engine.connection is not None:
             try:
                 port_info = {
-                    "port": self.connection.port,
-                    "baudrate": self.connection.baudrate,
-                    "is_open": self.connection.is_open
+                    "port": self.engine.connection.port,
+                    "baudrate": self.engine.connection.baudrate,
+                    "is_open": self.engine.connection.is_open,
+                    "dropped_batches": self.engine.dropped_batches
                 }
             except:
                 pass
         
         return {
+            "device_id": self.device_id,
+            "stream_id": self.stream_id,
+            "port": self.port,
             "is_connected": self.is_connected,
             "using_simulated_data": self.use_simulated_data,
-            "port_info": port_info
+            "port_info": port_info,
+            "last_error": self.last_error,
+            "samples": self.data_buffer.total_samples,
+            "sampling_rate": self.sampling_rate,
+            "pulse_rate": self._json_rate(self.analytics.pulse_rate),
+            "beats": dict(zip(CHANNELS, self.analytics.beat_counts.tolist())),
+            "alerts": self.alerts.active(),
+            "analytics": self.analytics.stats(),
+            "cpu": {
+                "reader_thread_seconds": self.reader_cpu_seconds + (self.engine.cpu_seconds if self.engine is not None else 0.0),
+                "processing_seconds": self.processing_seconds,
+                "analytics_wait_seconds": self.analytics.wait_seconds
+            }
         }
 
     @staticmethod
@@ -112,50 +220,73 @@ class SerialService:
         return signal.filtfilt(b, a, data)
 
     async def process_serial_data(self, data: str) -> Optional[Dict]:
-        """处理串口数据"""
+        """处理串口数据（可包含多行），返回最后一个样本的处理结果"""
         try:
-            parts = data.split(',')
-            if len(parts) >= 4:
-                timestamp = float(parts[0])
-                cun_value = float(parts[1])
-                guan_value = float(parts[2])
-                chi_value = float(parts[3])
-                pulse_rate = float(parts[4]) if len(parts) > 4 else None
-
-                # 应用滤波
-                b, a = self.create_notch_filter()
-                async with self.data_lock:
-                    # 更新数据缓冲区并应用滤波
-                    for position, value in [('cun', cun_value), ('guan', guan_value), ('chi', chi_value)]:
-                        self.data_buffer[position].append((timestamp, value))
-                        if len(self.data_buffer[position]) > SERIAL_BUFFER_MAX_SIZE:
-                            self.data_buffer[position] = self.data_buffer[position][-SERIAL_BUFFER_MAX_SIZE:]
-
-                    # 获取滤波后的最新值
-                    if len(self.data_buffer['cun']) > 10:
-                        filtered_values = {}
-                        for position in ['cun', 'guan', 'chi']:
-                            data = [d[1] for d in self.data_buffer[position][-10:]]
-                            filtered_values[position] = self.apply_filter(np.array(data), b, a)[-1]
-                    else:
-                        filtered_values = {
-                            'cun': cun_value,
-                            'guan': guan_value,
-                            'chi': chi_value
-                        }
-
-                return {
-                    'cun': filtered_values['cun'],
-                    'guan': filtered_values['guan'],
-                    'chi': filtered_values['chi'],
-                    'timestamp': timestamp,
-                    'pulse_rate': pulse_rate if pulse_rate is not None else round(60 * 1.2),
-                    'sampling_rate': SAMPLING_RATE,
-                    'source': 'hardware'
-                }
+            lines = [line for line in data.encode('utf-8').splitlines() if line.strip()]
+            samples, bad_lines = parse_sample_lines(lines)
+            if bad_lines:
+                logging.debug(f"无法解析的串口数据行: {bad_lines}")
+            if not len(samples):
+                return None
+            block = await self.process_sample_block(samples)
+            await self.analytics.drain()
+            if not len(block['timestamp']):
+                # 抽取后本批次没有保留的样本
+                return None
+            pulse_rate = block['pulse_rate'][-1]
+            return {
+                'cun': float(block['cun'][-1]),
+                'guan': float(block['guan'][-1]),
+                'chi': float(block['chi'][-1]),
+                'timestamp': float(block['timestamp'][-1]),
+                'pulse_rate': self._json_rate(pulse_rate),
+                'sampling_rate': self.sampling_rate,
+                'source': 'hardware'
+            }
         except Exception as e:
-            print(f"处理串口数据错误: {e}")
+            logging.error(f"处理设备 {self.device_id} 串口数据错误: {e}")
             return None
 
-# 创建全局串口服务实例
-serial_service = SerialService(is_Simulated=True)
+    @staticmethod
+    def _json_rate(pulse_rate: float) -> Optional[float]:
+        return None if np.isnan(pulse_rate) else float(pulse_rate)
+
+    async def process_sample_block(self, samples: np.ndarray,
+                                   on_analytics: Optional[Callable[['SerialService', Dict], Awaitable]] = None
+                                   ) -> Dict[str, np.ndarray]:
+        """缓存并滤波一个 (N, 5) 的样本批次，返回滤波后的各通道数组，raw 为 (3, N) 的原始数据
+        （滤波链有抽取时，时间戳、原始数据和脉率都取抽取后保留的样本）
+
+        脉率优先使用设备上报的值，设备没有上报时使用最近一次心搏检测得到的脉率；
+        beats 为上一批次以来分析完成的各通道心搏时间戳，alerts 为本批次内按安全/警告范围产生的告警事件。
+        本批次提交分析后不等待，分析结果到达后调用 on_analytics(设备, 结果)：
+        features 为完成的心搏特征（FEATURE_DTYPE 记录数组），feature_windows 为这些通道的窗口统计，
+        spectrogram 为原始数据（滤波前，可以看到工频干扰）完成的频谱列，没有时为 None。
+        """
+        raw_timestamps, raw = samples[:, 0], samples[:, 1:4].T
+        # 整块数据一次完成三个通道的流式滤波
+        filtered, keep = self.filter.process(raw)
+        samples = samples[keep]
+        timestamps = samples[:, 0]
+        async with self.data_lock:
+            self.data_buffer.append(timestamps, filtered)
+        detected_rate = self.analytics.pulse_rate
+        # 抽取后本批次没有保留样本时，已完成的心搏留给下一个有样本的批次
+        beats = self.analytics.take_beats() if len(timestamps) else [np.zeros(0) for _ in CHANNELS]
+        on_result = None if on_analytics is None else functools.partial(on_analytics, self)
+        self.analytics.submit(raw_timestamps, raw, timestamps, filtered, on_result)
+        reported = samples[:, 4]
+        reported_missing = np.isnan(reported)
+        pulse_rate = np.where(reported_missing, detected_rate, reported)
+        alerts = self.alerts.process(timestamps, filtered, detected_rate if reported_missing.all() else pulse_rate)
+
+        return {
+            'cun': filtered[0],
+            'guan': filtered[1],
+            'chi': filtered[2],
+            'timestamp': timestamps,
+            'pulse_rate': pulse_rate,
+            'beats': dict(zip(CHANNELS, beats)),
+            'alerts': alerts,
+            'raw': samples[:, 1:4].T
+        }
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.config import (
+    SAMPLING_RATE, ACQUISITION_QUEUE_SIZE, NOTCH_FREQ, SIMULATOR_NORMAL, SIMULATOR_PATTERNS,
+    SIMULATOR_ABNORMAL_PATTERN, SIMULATOR_ABNORMAL_PERIOD, SIMULATOR_NOISE, SIMULATOR_BLOCK_SECONDS
+)
+
+# 寸、关、尺的相对幅度和脉搏波传到该部位的延迟（秒）
+POSITION_AMPLITUDES = np.array([1.0, 0.8, 0.6])
+POSITION_DELAYS = np.array([0.0, 0.025, 0.05])
+
+
+def pulse_template(phase: np.ndarray) -> np.ndarray:
+    """单个心动周期内的脉搏波形，phase 为周期内的相位 [0, 1)
+
+    由三个高斯波叠加：收缩期主峰、降中峡（重搏切迹）和重搏波，峰值约为 1。
+    """
+    systolic = np.exp(-0.5 * ((phase - 0.15) / 0.055) ** 2)
+    notch = 0.12 * np.exp(-0.5 * ((phase - 0.36) / 0.02) ** 2)
+    dicrotic = 0.4 * np.exp(-0.5 * ((phase - 0.43) / 0.07) ** 2)
+    return systolic - notch + dicrotic
+
+
+class PulseWaveGenerator:
+    """向量化的脉搏波模拟器
+
+    按真实采样率整块生成寸、关、尺三个通道的样本。先按心率逐搏生成心搏起点和周期
+    （含心率变异、早搏），再对整块样本一次性求出所在心搏的相位并套用脉搏波形，
+    叠加呼吸引起的基线漂移、工频干扰和白噪声。随机数使用给定种子，结果可复现。
+    abnormal_period 秒切换一次正常/异常状态，异常状态使用 pattern 指定的参数（见 SIMULATOR_PATTERNS）。
+    """
+
+    def __init__(self, seed: Optional[int] = None, sampling_rate: float = SAMPLING_RATE,
+                 pattern: Optional[str] = SIMULATOR_ABNORMAL_PATTERN,
+                 abnormal_period: Optional[float] = SIMULATOR_ABNORMAL_PERIOD, noise: float = SIMULATOR_NOISE):
+        if pattern is not None and pattern not in SIMULATOR_PATTERNS:
+            raise ValueError(f"不支持的异常模式: {pattern}")
+        self.sampling_rate = sampling_rate
+        self.pattern = pattern
+        self.abnormal_period = abnormal_period
+        self.noise = noise
+        self.sample_index = 0
+        # 噪声和心搏使用各自的随机数流，生成结果与每次生成的块大小无关
+        noise_seed, beat_seed = np.random.SeedSequence(seed).spawn(2)
+        self._rng = np.random.default_rng(noise_seed)
+        self._beat_rng = np.random.default_rng(beat_seed)
+        # 心搏表：起点时间、周期、幅度，保留足够早的心搏以便计算带延迟的部位
+        self._onsets = np.zeros(1)
+        self._durations = np.array([60.0 / SIMULATOR_NORMAL['rate']])
+        self._amplitudes = np.ones(1)
+        self._premature_pending = False
+
+    def is_abnormal(self, t: np.ndarray) -> np.ndarray:
+        if self.pattern is None or not self.abnormal_period:
+            return np.zeros(np.shape(t), dtype=bool)
+        return (np.floor_divide(t, self.abnormal_period) % 2) == 1
+
+    def next_block(self, count: int) -> Dict[str, np.ndarray]:
+        """生成接下来的 count 个样本"""
+        t = (self.sample_index + np.arange(count)) / self.sampling_rate
+        self.sample_index += count
+        if not count:
+            empty = np.zeros(0)
+            return {'timestamp': t, 'cun': empty, 'guan': empty, 'chi': empty,
+                    'pulse_rate': empty, 'abnormal': np.zeros(0, dtype=bool)}
+        self._extend_beats(t[-1])
+        abnormal = self.is_abnormal(t)
+        params = [SIMULATOR_NORMAL, SIMULATOR_PATTERNS.get(self.pattern, SIMULATOR_NORMAL)]
+        amplitude = np.where(abnormal, params[1].get('amplitude', 1.0), params[0].get('amplitude', 1.0))
+        noise_scale = np.where(abnormal, params[1].get('noise', 1.0), params[0].get('noise', 1.0)) * self.noise
+
+        # 三个部位的采样时间按传播延迟错开，(3, N)
+        shifted = t[None, :] - POSITION_DELAYS[:, None]
+        beat = np.searchsorted(self._onsets, shifted, 'right') - 1
+        beat = np.clip(beat, 0, len(self._onsets) - 1)
+        phase = np.clip((shifted - self._onsets[beat]) / self._durations[beat], 0.0, 1.0)
+        waves = pulse_template(phase) * self._amplitudes[beat] * POSITION_AMPLITUDES[:, None] * amplitude
+
+        # 呼吸基线漂移、工频干扰（各部位相同）和独立白噪声
+        baseline = 0.05 * np.sin(2 * np.pi * 0.25 * t) + 0.03 * np.sin(2 * np.pi * NOTCH_FREQ * t)
+        waves += baseline + self._rng.standard_normal((count, 3)).T * noise_scale
+        pulse_rate = 60.0 / self._durations[beat[0]]
+
+        # 丢掉已经用不到的旧心搏
+        keep = max(int(np.searchsorted(self._onsets, t[-1] - POSITION_DELAYS.max() - 1.0)) - 1, 0)
+        if keep:
+            self._onsets = self._onsets[keep:]
+            self._durations = self._durations[keep:]
+            self._amplitudes = self._amplitudes[keep:]
+        return {
+            'timestamp': t,
+            'cun': waves[0],
+            'guan': waves[1],
+            'chi': waves[2],
+            'pulse_rate': pulse_rate,
+            'abnormal': abnormal
+        }
+
+    def _extend_beats(self, until: float):
+        """逐搏生成心搏表直到覆盖 until"""
+        onsets, durations, amplitudes = [], [], []
+        onset = self._onsets[-1] + self._durations[-1]
+        while onset <= until:
+            params = SIMULATOR_PATTERNS[self.pattern] if self.is_abnormal(onset) else SIMULATOR_NORMAL
+            duration = 60.0 / params['rate'] * (1.0 + params.get('jitter', 0.0) * self._beat_rng.standard_normal())
+            if self._premature_pending:
+                # 早搏之后的代偿间歇
+                duration *= 1.4
+                self._premature_pending = False
+            elif self._beat_rng.random() < params.get('premature', 0.0):
+                duration *= 0.6
+                self._premature_pending = True
+            duration = max(duration, 0.2)
+            onsets.append(onset)
+            durations.append(duration)
+            amplitudes.append(1.0 + 0.05 * self._beat_rng.standard_normal())
+            onset += duration
+        if onsets:
+            self._onsets = np.concatenate((self._onsets, onsets))
+            self._durations = np.concatenate((self._durations, durations))
+            self._amplitudes = np.concatenate((self._amplitudes, amplitudes))
+
+
+def port_seed(port: str) -> int:
+    """由虚拟端口名得到固定的随机种子"""
+    return zlib.crc32(port.encode('utf-8'))
+
+
+class SimulatedAcquisitionEngine:
+    """虚拟设备采集引擎，接口与 SerialAcquisitionEngine 相同
+
+    生成线程每 block_seconds 按真实采样率补齐应生成的样本，批次交给事件循环，
+    之后的处理与真实串口完全相同。每个虚拟设备使用由端口名得到的种子，可同时运行多个。
+    """
+
+    def __init__(self, port: str, seed: Optional[int] = None, queue_size: int = ACQUISITION_QUEUE_SIZE,
+                 block_seconds: float = SIMULATOR_BLOCK_SECONDS, **generator_options):
+        self.port = port
+        self.generator = PulseWaveGenerator(port_seed(port) if seed is None else seed, **generator_options)
+        self.block_seconds = block_seconds
+        self.connection = None  # 没有真实串口
+        self.error: Optional[str] = None
+        self.dropped_batches = 0
+        self.cpu_seconds = 0.0
+        self._queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """启动生成线程，必须在事件循环所在线程中调用"""
+        self._loop = loop or asyncio.get_event_loop()
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"simulator-{self.port}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    async def get_batch(self) -> Optional[np.ndarray]:
+        """等待下一个样本批次，生成线程结束时返回 None"""
+        if self._queue is None:
+            return None
+        return await self._queue.get()
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        started = time.monotonic()
+        try:
+            while not self._stop_event.wait(self.block_seconds):
+                # 按经过的时间补齐样本，睡眠误差不会累积成采样率偏差
+                due = int((time.monotonic() - started) * self.generator.sampling_rate)
+                block = self.generator.next_block(due - self.generator.sample_index)
+                if not len(block['timestamp']):
+                    continue
+                # 与不上报脉率的设备相同，脉率由心搏检测得到
+                batch = np.column_stack((block['timestamp'], block['cun'], block['guan'], block['chi'],
+                                         np.full(len(block['timestamp']), np.nan)))
+                self._loop.call_soon_threadsafe(self._put, batch)
+                self.cpu_seconds = time.thread_time() - cpu_start
+        except Exception as e:
+            self.error = str(e)
+            logging.error(f"虚拟设备 {self.port} 生成线程异常退出: {e}")
+        finally:
+            try:
+                self._loop.call_soon_threadsafe(self._put, None)
+            except RuntimeError:
+                pass
+
+    def _put(self, batch: Optional[np.ndarray]):
+        """在事件循环线程中入队，队列满时丢弃最旧的批次"""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped_batches += 1
+        self._queue.put_nowait(batch)
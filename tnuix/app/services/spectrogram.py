@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft, signal
+
+from app.core.config import SAMPLING_RATE, STFT_WINDOW, STFT_HOP, STFT_MAX_FREQ, STFT_DB_RANGE
+
+
+class StreamingSpectrogram:
+    """流式短时傅里叶变换，各通道同时计算
+
+    每 hop 个样本输出一列：最近 window 个样本去均值、加 Hann 窗后做 rfft，
+    幅度换算为 dB（正弦幅度 1 为 0 dB）后按 db_range 量化为 uint8，只保留 max_freq 以下的频点。
+    只保留下一帧起点之后不足一帧的样本，每一帧只计算一次；
+    整块数据中的所有帧用一次 rfft 完成（帧长固定，FFT 计划被缓存）。
+    """
+
+    def __init__(self, sampling_rate: float = SAMPLING_RATE, channels: int = 3, window: int = STFT_WINDOW,
+                 hop: int = STFT_HOP, max_freq: float = STFT_MAX_FREQ, db_range=STFT_DB_RANGE):
+        if window < 2 or not 0 < hop <= window:
+            raise ValueError("窗长至少为 2，帧移必须在 1 到窗长之间")
+        self.sampling_rate = sampling_rate
+        self.channels = channels
+        self.window = window
+        self.hop = hop
+        self.bin_hz = sampling_rate / window
+        self.bins = min(int(max_freq / self.bin_hz) + 1, window // 2 + 1)
+        self.db_min = float(db_range[0])
+        self.db_step = (float(db_range[1]) - self.db_min) / 255
+        self._taper = signal.get_window('hann', window)
+        self._scale = 2.0 / self._taper.sum()  # 幅度谱换算为正弦幅度
+        self.columns = 0
+        self.reset()
+
+    def reset(self):
+        """清空未满一帧的样本（重新连接时调用）"""
+        self._timestamps = np.zeros(0)
+        self._data = np.zeros((self.channels, 0))
+
+    def process(self, timestamps: np.ndarray, block: np.ndarray) -> Optional[Dict]:
+        """追加 (通道数, 样本数) 的一块数据，返回本块内完成的频谱列，没有新列时返回 None
+
+        columns 为 (通道数, 列数, 频点数) 的 uint8，dB = db_min + 值 * db_step；
+        timestamp 为每列窗口中心的时间戳。
+        """
+        timestamps = np.concatenate((self._timestamps, timestamps))
+        data = np.concatenate((self._data, block), axis=1)
+        count = len(timestamps)
+        if count < self.window:
+            self._timestamps, self._data = timestamps, data
+            return None
+        frames = (count - self.window) // self.hop + 1
+        segments = sliding_window_view(data, self.window, axis=1)[:, :(frames - 1) * self.hop + 1:self.hop]
+        segments = segments - segments.mean(axis=2, keepdims=True)
+        magnitude = np.abs(fft.rfft(segments * self._taper, axis=2)[:, :, :self.bins]) * self._scale
+        db = 20 * np.log10(np.maximum(magnitude, 1e-12))
+        columns = np.clip(np.round((db - self.db_min) / self.db_step), 0, 255).astype(np.uint8)
+        # 下一帧从 frames * hop 开始
+        self._timestamps = timestamps[frames * self.hop:].copy()
+        self._data = data[:, frames * self.hop:].copy()
+        self.columns += frames
+        return {
+            'timestamp': timestamps[np.arange(frames) * self.hop + self.window // 2],
+            'columns': columns,
+            'hop_seconds': self.hop / self.sampling_rate,
+            'bin_hz': self.bin_hz,
+            'db_min': self.db_min,
+            'db_step': self.db_step
+        }
@@ -0,0 +1,92 @@
+import struct
+from typing import Dict
+
+import numpy as np
+
+# WebSocket 二进制数据帧（小端）:
+#   帧头 32 字节: 版本 u8 | 编码 u8 | 数据流编号 u16 | 帧序号 u32 | 样本数 u32 |
+#                首样本时间戳 f64 | 采样率 f32 | 脉率 f32（无则为 NaN）| 通道掩码 u8 | 标志 u8 | 保留 2 字节
+#   通道掩码: bit0 寸、bit1 关、bit2 尺，只有被订阅的通道才有数据
+#   float32 编码: 各通道依次排列的 float32 数据
+#   int16 编码:   各通道的缩放系数 f32，之后是各通道依次排列的 int16 数据，值 = int16 * 缩放系数
+#   标志 bit0 置位时数据之后是心搏段: 按通道掩码顺序，每个通道为心搏数 u16 和各心搏时间戳 f64
+# 第 i 个样本的时间戳为 首样本时间戳 + i / 采样率
+#
+# 频谱图消息（编码字段为 2，与数据帧区分）:
+#   帧头 36 字节: 版本 u8 | 编码 u8 | 数据流编号 u16 | 列数 u16 | 频点数 u16 |
+#                首列时间戳 f64 | 列间隔秒数 f32 | 频点间隔 Hz f32 | dB 下限 f32 | dB 步长 f32 | 通道掩码 u8 | 保留 3 字节
+#   之后按通道掩码顺序，每个通道为 列数 x 频点数 的 uint8，dB = dB 下限 + 值 * dB 步长
+WIRE_VERSION = 2
+ENCODING_FLOAT32 = 0
+ENCODING_INT16 = 1
+ENCODING_SPECTROGRAM = 2
+FLAG_BEATS = 0x01
+FRAME_HEADER = struct.Struct('<BBHIIdffBB2x')
+SPECTROGRAM_HEADER = struct.Struct('<BBHHHdffffB3x')
+
+# 客户端在 /ws?format=... 中协商的数据格式
+WIRE_FORMATS = {
+    'json': None,
+    'binary': ENCODING_FLOAT32,
+    'binary16': ENCODING_INT16,
+}
+
+CHANNELS = ('cun', 'guan', 'chi')
+
+
+def pack_frame(frame: Dict, encoding: int = ENCODING_FLOAT32) -> bytes:
+    """把一帧数据（各通道为等长数组，可只含部分通道）打包为二进制消息"""
+    channels = [position for position in CHANNELS if position in frame]
+    mask = sum(1 << CHANNELS.index(position) for position in channels)
+    timestamps = frame.get('timestamp', ())
+    count = len(timestamps) if channels else 0
+    data = np.vstack([frame[position] for position in channels]) if channels else np.zeros((0, 0))
+    pulse_rate = frame.get('pulse_rate')
+    beats = frame.get('beats')
+    flags = FLAG_BEATS if beats is not None and channels else 0
+    header = FRAME_HEADER.pack(
+        WIRE_VERSION,
+        encoding,
+        frame.get('stream_id', 0) & 0xFFFF,
+        frame.get('seq', 0) & 0xFFFFFFFF,
+        count,
+        float(timestamps[0]) if len(timestamps) else 0.0,
+        float(frame.get('sampling_rate') or 0.0),
+        float('nan') if pulse_rate is None else float(pulse_rate),
+        mask,
+        flags,
+    )
+    if encoding == ENCODING_INT16:
+        peak = np.abs(data).max(axis=1) if count else np.zeros(len(channels))
+        scale = np.where(peak > 0, peak / 32767.0, 1.0).astype('<f4')
+        quantized = np.round(data / scale[:, None]).astype('<i2')
+        payload = scale.tobytes() + quantized.tobytes()
+    else:
+        payload = data.astype('<f4').tobytes()
+    if flags & FLAG_BEATS:
+        for position in channels:
+            times = np.asarray(beats.get(position, ()), dtype='<f8')[:0xFFFF]
+            payload += struct.pack('<H', len(times)) + times.tobytes()
+    return header + payload
+
+
+def pack_spectrogram(message: Dict) -> bytes:
+    """把频谱列（columns 为 {通道: (列数, 频点数) uint8}）打包为二进制消息"""
+    channels = [position for position in CHANNELS if position in message['columns']]
+    timestamps = message['timestamp']
+    count, bins = message['columns'][channels[0]].shape if channels else (0, 0)
+    header = SPECTROGRAM_HEADER.pack(
+        WIRE_VERSION,
+        ENCODING_SPECTROGRAM,
+        message.get('stream_id', 0) & 0xFFFF,
+        count,
+        bins,
+        float(timestamps[0]) if len(timestamps) else 0.0,
+        message['hop_seconds'],
+        message['bin_hz'],
+        message['db_min'],
+        message['db_step'],
+        sum(1 << CHANNELS.index(position) for position in channels),
+    )
+    return header + b''.join(np.ascontiguousarray(message['columns'][position], dtype=np.uint8).tobytes()
+                             for position in channels)
@@ -0,0 +1,332 @@
+"""端到端压测：N 个设备采集 + M 个 WebSocket 客户端
+
+在进程内（uvicorn 线程）或子进程中启动服务，也可以连接已运行的服务（--url），
+接入 N 个虚拟设备（DEBUG_ 端口）或 pty 串口设备，M 个客户端订阅各设备的数据流，
+测量持续样本速率、端到端延迟分位数、丢帧、事件循环延迟、CPU 和内存，结果写入 JSON 文件。
+
+用法（在 tnuix 目录下，先安装压测依赖 pip install -r benchmarks/requirements.txt）:
+    python benchmarks/load_test.py --devices 8 --clients 32 --duration 30
+    python benchmarks/load_test.py --source pty --server subprocess --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.core.config import SAMPLING_RATE  # noqa: E402
+from app.services.wire_format import ENCODING_SPECTROGRAM, FRAME_HEADER  # noqa: E402
+
+USERNAME = 'admin'
+PASSWORD = 'admin123'
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class InProcessServer:
+    """在当前进程的线程中运行 uvicorn，CPU 和内存统计包含压测客户端本身"""
+
+    def __init__(self, port: int, recording_dir: str, ws: str = 'auto'):
+        import uvicorn
+        import main
+        from app.services.device_manager import device_manager
+        if device_manager.recorder is not None:
+            device_manager.recorder.root = recording_dir
+        self.server = uvicorn.Server(uvicorn.Config(main.app, host='127.0.0.1', port=port,
+                                                   log_level='warning', ws=ws))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(10)
+
+
+class SubprocessServer:
+    """在子进程中运行服务，资源统计只包含服务本身"""
+
+    def __init__(self, port: int, recording_dir: str, ws: str = 'auto'):
+        env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+             '--log-level', 'warning', '--ws', ws],
+            cwd=recording_dir, env=env, stdout=subprocess.DEVNULL
+        )
+        self.port = port
+
+    def start(self):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError('服务启动超时')
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(10)
+
+
+class PtyDevice:
+    """pty 串口设备：写线程按采样率写入文本协议数据，时间戳为单调时钟"""
+
+    def __init__(self, sampling_rate: float = SAMPLING_RATE, block_seconds: float = 0.01):
+        import pty
+        import tty
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self.sampling_rate = sampling_rate
+        self.block_seconds = block_seconds
+        self.written = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2)
+        os.close(self.master)
+        os.close(self._slave)
+
+    def _run(self):
+        started = time.monotonic()
+        while not self._stop.wait(self.block_seconds):
+            due = int((time.monotonic() - started) * self.sampling_rate)
+            if due <= self.written:
+                continue
+            k = np.arange(self.written, due)
+            t = started + k / self.sampling_rate
+            wave = np.sin(2 * np.pi * 1.2 * t)
+            lines = np.column_stack((t, wave, 0.8 * wave, 0.6 * wave, np.full(len(k), 72.0)))
+            try:
+                os.write(self.master, ''.join('%.6f,%.4f,%.4f,%.4f,%.0f\n' % tuple(row) for row in lines).encode())
+            except OSError:
+                return
+            self.written = due
+
+
+class LoadClient:
+    """WebSocket 客户端：订阅一个设备，记录收到的样本数、端到端延迟和帧序号缺口"""
+
+    def __init__(self, url: str, device_id: str, time_origin: float, wire_format: str):
+        self.url = url
+        self.device_id = device_id
+        self.time_origin = time_origin  # 设备时间戳 0 对应的单调时钟时间
+        self.wire_format = wire_format
+        self.samples = 0
+        self.frames = 0
+        self.seq_gaps = 0
+        self.latencies: List[float] = []
+        self.measuring = False
+        self._last_seq: Optional[int] = None
+
+    async def run(self, stop: asyncio.Event):
+        async with websockets.connect(f"{self.url}?format={self.wire_format}", max_size=None) as ws:
+            await ws.send(json.dumps({"type": "subscribe", "device_id": self.device_id}))
+            while not stop.is_set():
+                try:
+                    message = await asyncio.wait_for(ws.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.monotonic()
+                if isinstance(message, bytes):
+                    if message[1] == ENCODING_SPECTROGRAM:
+                        continue
+                    # 按位置取字段，帧头以后增加字段不影响压测
+                    seq, count, first, rate = FRAME_HEADER.unpack_from(message)[3:7]
+                    last = first + (count - 1) / rate if count else None
+                else:
+                    frame = json.loads(message)
+                    if 'timestamp' not in frame:
+                        continue
+                    seq, count = frame['seq'], len(frame['timestamp'])
+                    last = frame['timestamp'][-1] if count else None
+                if self._last_seq is not None and seq > self._last_seq + 1:
+                    if self.measuring:
+                        self.seq_gaps += seq - self._last_seq - 1
+                self._last_seq = seq
+                if self.measuring and count:
+                    self.frames += 1
+                    self.samples += count
+                    self.latencies.append(received - self.time_origin - last)
+
+
+async def wait_clients(tasks: List[asyncio.Task], seconds: float):
+    """等待 seconds 秒，期间有客户端任务异常或提前结束时立即抛出，不在报告中静默变成 0"""
+    done, _ = await asyncio.wait(tasks, timeout=seconds, return_when=asyncio.FIRST_COMPLETED)
+    for task in done:
+        error = task.exception()
+        if error is not None:
+            raise RuntimeError(f"压测客户端异常退出: {error!r}") from error
+        raise RuntimeError("压测客户端连接提前结束")
+
+
+async def run_load(args) -> Dict:
+    http_url = args.url or f"http://127.0.0.1:{args.port}"
+    ws_url = http_url.replace('http', 'ws', 1) + '/ws'
+    async with httpx.AsyncClient(base_url=http_url, timeout=10) as http:
+        response = await http.post('/login', data={'username': USERNAME, 'password': PASSWORD})
+        http.cookies.set('session_id', response.cookies['session_id'])
+
+        # 接入设备
+        pty_devices = []
+        origins = {}
+        for i in range(args.devices):
+            device_id = f"load{i}"
+            if args.source == 'pty':
+                device = PtyDevice()
+                device.start()
+                pty_devices.append(device)
+                port, origin = device.port, 0.0  # pty 设备的时间戳就是单调时钟
+            else:
+                # 虚拟设备的时间戳从连接时开始计，延迟会多算上连接请求本身的耗时
+                port, origin = f"DEBUG_LOAD{i}", time.monotonic()
+            result = (await http.post('/api/connect', json={
+                'device_id': device_id, 'port': port, 'protocol': 'ascii'
+            })).json()
+            if result.get('status') != 'success':
+                raise RuntimeError(f"设备 {device_id} 连接失败: {result.get('message')}")
+            origins[device_id] = origin
+
+        clients = [LoadClient(ws_url, f"load{i % args.devices}", origins[f"load{i % args.devices}"], args.format)
+                   for i in range(args.clients)]
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(client.run(stop)) for client in clients]
+        try:
+            await wait_clients(tasks, args.warmup)
+            before = (await http.get('/api/metrics')).json()
+            for client in clients:
+                client.measuring = True
+            await wait_clients(tasks, args.duration)
+            for client in clients:
+                client.measuring = False
+            after = (await http.get('/api/metrics')).json()
+        finally:
+            stop.set()
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            for i in range(args.devices):
+                await http.post(f'/api/disconnect?device_id=load{i}')
+            for device in pty_devices:
+                device.stop()
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors:
+            raise RuntimeError(f"{len(errors)} 个压测客户端异常退出: {errors[0]!r}") from errors[0]
+
+    elapsed = after['time'] - before['time']
+    ingested = sum(after['devices'][d]['samples'] - before['devices'].get(d, {}).get('samples', 0)
+                   for d in after['devices'] if d.startswith('load'))
+    dropped_batches = sum(after['devices'][d]['dropped_batches'] for d in after['devices'] if d.startswith('load'))
+    dropped_messages = sum(c['dropped'] for c in after['clients']) - sum(c['dropped'] for c in before['clients'])
+    latencies = np.array([lat for client in clients for lat in client.latencies]) * 1000
+    cpu = after['process']['cpu_seconds'] - before['process']['cpu_seconds']
+    return {
+        "config": {
+            "devices": args.devices,
+            "clients": args.clients,
+            "source": args.source,
+            "server": 'external' if args.url else args.server,
+            "format": args.format,
+            "duration": args.duration,
+            "sampling_rate": SAMPLING_RATE
+        },
+        "results": {
+            "elapsed_seconds": elapsed,
+            "ingested_samples_per_second": ingested / elapsed,
+            "expected_samples_per_second": args.devices * SAMPLING_RATE,
+            "delivered_samples_per_second": sum(c.samples for c in clients) / elapsed,
+            "delivered_frames_per_second": sum(c.frames for c in clients) / elapsed,
+            "latency_ms": {
+                "p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                "p95": float(np.percentile(latencies, 95)) if len(latencies) else None,
+                "p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+                "max": float(latencies.max()) if len(latencies) else None
+            },
+            "dropped_frames": {
+                "client_queue": dropped_messages,
+                "sequence_gaps": sum(c.seq_gaps for c in clients),
+                "acquisition_batches": dropped_batches
+            },
+            "event_loop_lag_ms": after['event_loop_lag_ms'],
+            "cpu_percent": 100.0 * cpu / elapsed,
+            "rss_bytes": after['process']['rss_bytes'],
+            "recorder_dropped_blocks": (after.get('recorder') or {}).get('dropped_blocks')
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采集与推送端到端压测")
+    parser.add_argument('--devices', type=int, default=4, help="设备数")
+    parser.add_argument('--clients', type=int, default=8, help="WebSocket 客户端数，轮流订阅各设备")
+    parser.add_argument('--duration', type=float, default=10.0, help="测量时长（秒）")
+    parser.add_argument('--warmup', type=float, default=2.0, help="预热时长（秒）")
+    parser.add_argument('--source', choices=('sim', 'pty'), default='sim', help="虚拟设备或 pty 串口设备")
+    parser.add_argument('--server', choices=('inprocess', 'subprocess'), default='subprocess',
+                        help="服务运行方式，inprocess 时 CPU/内存包含压测客户端")
+    parser.add_argument('--url', help="连接已运行的服务（如 http://127.0.0.1:8000），不启动服务")
+    parser.add_argument('--ws', default='auto', help="uvicorn 的 WebSocket 实现（auto、websockets、wsproto）")
+    parser.add_argument('--format', choices=('json', 'binary', 'binary16'), default='binary')
+    parser.add_argument('--output', help="结果 JSON 文件，默认 benchmarks/results/load_<时间>.json")
+    args = parser.parse_args()
+    if args.source == 'pty' and platform.system() == 'Windows':
+        parser.error("pty 设备仅支持类 Unix 系统")
+
+    server = None
+    recording_dir = tempfile.mkdtemp(prefix='load_test_')
+    try:
+        if not args.url:
+            args.port = free_port()
+            server_class = InProcessServer if args.server == 'inprocess' else SubprocessServer
+            server = server_class(args.port, recording_dir, args.ws)
+            server.start()
+        report = asyncio.run(run_load(args))
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(recording_dir, ignore_errors=True)
+
+    report.update({
+        "timestamp": datetime.now().isoformat(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()}
+    })
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report['results'], ensure_ascii=False, indent=2))
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""DSP 与解析热路径的微基准
+
+覆盖陷波滤波器的创建和应用、心搏检测、脉搏波特征提取、频谱图、串口数据解析与处理、模拟数据生成、缓冲区追加与截取、
+推送消息的抽取与序列化，规模为单个样本、1k 和 100k 样本的数据块，以及 1~32 个设备。
+结果可保存为基线，之后用 --compare 与基线比较，超过阈值的变慢项会使进程以非零状态退出。
+
+用法（在 tnuix 目录下）:
+    python benchmarks/microbench.py                                 # 运行并打印结果
+    python benchmarks/microbench.py --save benchmarks/baselines/microbench.json
+    python benchmarks/microbench.py --compare benchmarks/baselines/microbench.json --threshold 0.25
+    python benchmarks/microbench.py --filter filter --quick
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.core.config import SAMPLING_RATE, NOTCH_FREQ, QUALITY_FACTOR  # noqa: E402
+from app.services.beat_detector import BeatDetector  # noqa: E402
+from app.services.broadcaster import Broadcaster  # noqa: E402
+from app.services.decimation import MinMaxDecimator  # noqa: E402
+from app.services.features import PulseFeatureExtractor  # noqa: E402
+from app.services.filters import FilterChain, StreamingFilter  # noqa: E402
+from app.services.frame_decoder import parse_sample_lines  # noqa: E402
+from app.services.ring_buffer import SampleRingBuffer  # noqa: E402
+from app.services.serial_service import SerialService  # noqa: E402
+from app.services.simulator import PulseWaveGenerator  # noqa: E402
+from app.services.spectrogram import StreamingSpectrogram  # noqa: E402
+
+BLOCK_SIZES = (1, 1000, 100000)
+DEVICE_COUNTS = (1, 8, 32)
+# 多级滤波链：带通、工频及两个谐波陷波、4 倍抽取
+FULL_CHAIN = [
+    {"type": "bandpass", "low": 0.5, "high": 40},
+    {"type": "notch", "freq": NOTCH_FREQ, "q": QUALITY_FACTOR, "harmonics": 3},
+    {"type": "decimate", "factor": 4}
+]
+
+# (名称, 每次调用处理的样本数, 准备函数 -> 被测函数)
+Case = Tuple[str, int, Callable[[], Callable[[], object]]]
+
+
+def sample_block(count: int, seed: int = 0) -> np.ndarray:
+    """(N, 5) 的样本：时间戳、寸、关、尺、脉率"""
+    rng = np.random.default_rng(seed)
+    samples = np.empty((count, 5))
+    samples[:, 0] = np.arange(count) / SAMPLING_RATE
+    samples[:, 1:4] = rng.standard_normal((count, 3))
+    samples[:, 4] = 72.0
+    return samples
+
+
+def serial_text(count: int) -> str:
+    return ''.join('%.3f,%.4f,%.4f,%.4f,72\n' % tuple(row[:4]) for row in sample_block(count))
+
+
+def frame(count: int) -> Dict:
+    samples = sample_block(count)
+    return Broadcaster.build_frame([{
+        'timestamp': samples[:, 0], 'cun': samples[:, 1], 'guan': samples[:, 2], 'chi': samples[:, 3],
+        'pulse_rate': samples[:, 4]
+    }], {'stream_id': 1, 'device_id': 'bench', 'sampling_rate': SAMPLING_RATE, 'source': 'hardware'})
+
+
+def build_cases() -> List[Case]:
+    cases: List[Case] = []
+
+    cases.append(('create_notch_filter', 1, lambda: SerialService.create_notch_filter))
+    cases.append(('streaming_filter.create', 1,
+                  lambda: lambda: StreamingFilter.notch(NOTCH_FREQ, QUALITY_FACTOR, SAMPLING_RATE)))
+
+    for size in BLOCK_SIZES[1:]:
+        # filtfilt 需要比滤波器阶数长得多的数据，单个样本没有意义
+        def setup(size=size):
+            b, a = SerialService.create_notch_filter()
+            data = sample_block(size)[:, 1]
+            return lambda: SerialService.apply_filter(data, b, a)
+        cases.append((f'apply_filter[{size}]', size, setup))
+
+    for devices in DEVICE_COUNTS:
+        for size in BLOCK_SIZES:
+            def setup(size=size, devices=devices):
+                filters = [StreamingFilter.notch(NOTCH_FREQ, QUALITY_FACTOR, SAMPLING_RATE) for _ in range(devices)]
+                block = sample_block(size)[:, 1:4].T.copy()
+                return lambda: [f.process(block) for f in filters]
+            cases.append((f'streaming_filter.process[{size}x{devices}dev]', size * devices, setup))
+
+    for size in BLOCK_SIZES:
+        def setup(size=size):
+            chain = FilterChain(FULL_CHAIN, SAMPLING_RATE)
+            block = sample_block(size)[:, 1:4].T.copy()
+            return lambda: chain.process(block)
+        cases.append((f'filter_chain.process[{size}]', size, setup))
+
+    for devices in DEVICE_COUNTS:
+        for size in BLOCK_SIZES:
+            def setup(size=size, devices=devices):
+                detectors = [BeatDetector(SAMPLING_RATE) for _ in range(devices)]
+                block = PulseWaveGenerator(seed=0).next_block(size)
+                timestamps, data = block['timestamp'], np.vstack((block['cun'], block['guan'], block['chi']))
+                return lambda: [d.process(timestamps, data) for d in detectors]
+            cases.append((f'beat_detector.process[{size}x{devices}dev]', size * devices, setup))
+
+    for size in BLOCK_SIZES:
+        def setup(size=size):
+            # 先检测好心搏，只测特征提取；每次调用都是新的连续数据
+            generator, detector = PulseWaveGenerator(seed=0), BeatDetector(SAMPLING_RATE)
+            blocks = []
+            for _ in range(max(SAMPLING_RATE * 20 // size, 1)):
+                block = generator.next_block(size)
+                timestamps, data = block['timestamp'], np.vstack((block['cun'], block['guan'], block['chi']))
+                blocks.append((timestamps, data, detector.process(timestamps, data)[0]))
+            extractor = PulseFeatureExtractor(SAMPLING_RATE)
+            state = {'index': 0}
+
+            def run():
+                if state['index'] == len(blocks):
+                    extractor.reset()
+                    state['index'] = 0
+                timestamps, data, beats = blocks[state['index']]
+                state['index'] += 1
+                return extractor.process(timestamps, data, beats)
+            return run
+        cases.append((f'features.process[{size}]', size, setup))
+
+    for size in BLOCK_SIZES:
+        def setup(size=size):
+            spectrogram = StreamingSpectrogram(SAMPLING_RATE)
+            samples = sample_block(size)
+            timestamps, block = samples[:, 0], samples[:, 1:4].T.copy()
+            return lambda: spectrogram.process(timestamps, block)
+        cases.append((f'spectrogram.process[{size}]', size, setup))
+
+    for size in BLOCK_SIZES:
+        def setup(size=size):
+            lines = serial_text(size).encode().splitlines()
+            return lambda: parse_sample_lines(lines)
+        cases.append((f'parse_sample_lines[{size}]', size, setup))
+
+        def setup(size=size):
+            service = SerialService(is_Simulated=False, device_id='bench')
+            text = serial_text(size)
+            loop = asyncio.new_event_loop()
+            return lambda: loop.run_until_complete(service.process_serial_data(text))
+        cases.append((f'process_serial_data[{size}]', size, setup))
+
+    for devices in DEVICE_COUNTS:
+        for size in BLOCK_SIZES:
+            def setup(size=size, devices=devices):
+                generators = [PulseWaveGenerator(seed=i) for i in range(devices)]
+                return lambda: [g.next_block(size) for g in generators]
+            cases.append((f'generate_pulse_data[{size}x{devices}dev]', size * devices, setup))
+
+    for size in BLOCK_SIZES:
+        def setup(size=size):
+            buffer = SampleRingBuffer(SAMPLING_RATE * 600)
+            samples = sample_block(size)
+            timestamps, block = samples[:, 0], samples[:, 1:4].T.astype(np.float32)
+            return lambda: buffer.append(timestamps, block)
+        cases.append((f'buffer.append[{size}]', size, setup))
+
+    for size in BLOCK_SIZES:
+        def setup(size=size):
+            # 取显示窗口内的数据（跨越回绕点的最坏情况）
+            buffer = SampleRingBuffer(SAMPLING_RATE * 600)
+            samples = sample_block(SAMPLING_RATE * 600 + size // 2)
+            buffer.append(samples[:-(size // 2) or None, 0], samples[:-(size // 2) or None, 1:4].T)
+            buffer.append(samples[len(samples) - size // 2:, 0], samples[len(samples) - size // 2:, 1:4].T)
+            return lambda: buffer.last(size)
+        cases.append((f'buffer.last[{size}]', size, setup))
+
+    for size in BLOCK_SIZES:
+        for wire_format in ('json', 'binary', 'binary16'):
+            def setup(size=size, wire_format=wire_format):
+                data = frame(size)
+                return lambda: Broadcaster.encode_frame(data, wire_format)
+            cases.append((f'encode_frame.{wire_format}[{size}]', size, setup))
+
+        def setup(size=size):
+            data = frame(size)
+            decimator = MinMaxDecimator(2 * 10.0 / 800)
+            block = np.vstack((data['cun'], data['guan'], data['chi']))
+            timestamps = data['timestamp']
+            return lambda: decimator.process(timestamps, block)
+        cases.append((f'decimate[{size}]', size, setup))
+    return cases
+
+
+def measure(func: Callable[[], object], min_time: float, repeats: int) -> List[float]:
+    """自动确定每轮调用次数，使每轮至少 min_time 秒，返回每轮的单次调用耗时"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    timings = [elapsed / number]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    return timings
+
+
+def run(name_filter: str = '', min_time: float = 0.1, repeats: int = 5) -> Dict[str, Dict]:
+    results = {}
+    for name, samples, setup in build_cases():
+        if name_filter and name_filter not in name:
+            continue
+        timings = measure(setup(), min_time, repeats)
+        median = float(np.median(timings))
+        results[name] = {
+            "median_us": median * 1e6,
+            "min_us": min(timings) * 1e6,
+            "samples": samples,
+            "ns_per_sample": median * 1e9 / samples
+        }
+        print(f"{name:48s} {median * 1e6:12.2f} us  {median * 1e9 / samples:10.1f} ns/sample", flush=True)
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """返回比基线慢超过 threshold（比例）的项"""
+    regressions = []
+    print(f"\n{'case':48s} {'baseline':>12s} {'current':>12s} {'ratio':>8s}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median_us'] / baseline[name]['median_us']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  <-- 变慢'
+        print(f"{name:48s} {baseline[name]['median_us']:12.2f} {result['median_us']:12.2f} {ratio:8.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DSP 与解析热路径微基准")
+    parser.add_argument('--filter', default='', help="只运行名称包含该字符串的项")
+    parser.add_argument('--quick', action='store_true', help="缩短每项的测量时间")
+    parser.add_argument('--save', help="把结果保存为基线 JSON 文件")
+    parser.add_argument('--compare', help="与基线 JSON 文件比较")
+    parser.add_argument('--threshold', type=float, default=0.25, help="比基线慢多少（比例）视为退化")
+    args = parser.parse_args()
+
+    results = run(args.filter, min_time=0.02 if args.quick else 0.1, repeats=3 if args.quick else 5)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                "timestamp": datetime.now().isoformat(),
+                "host": {"platform": platform.platform(), "python": platform.python_version(),
+                         "numpy": np.__version__, "cpus": os.cpu_count()},
+                "results": results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.save}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项比基线慢超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n没有发现性能退化")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,34 @@
-from fastapi import FastAPI, WebSocket, Request, Depends, HTTPException, status, Cookie, Form
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Depends, HTTPException, status, Cookie, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, RedirectResponse
 import json
 import asyncio
 import numpy as np
 from scipy import signal
-import websockets
 from typing import List, Optional
-import math
+from collections import deque
+import os
 import uvicorn
 import socket
 import serial
 import serial.tools.list_ports
-from datetime import datetime, timedelta
 import hashlib
-import secrets
 import time
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import HTTPBasic
 import logging
+from app.core.config import (
+    SAMPLING_RATE, NOTCH_FREQ, QUALITY_FACTOR, SERIAL_PROTOCOL, DEFAULT_DEVICE_ID, CLIENT_QUEUE_POLICY, DISPLAY_WINDOW_SECONDS, SIMULATOR_SEED,
+    SIMULATOR_BLOCK_SECONDS, EVENT_LOOP_LAG_INTERVAL, EVENT_LOOP_LAG_WINDOW, SESSION_EXPIRY, SESSION_SWEEP_INTERVAL
+)
+from app.services.alerts import AlertMonitor
+from app.services.analytics import BackgroundAnalytics, analytics_pool
+from app.services.auth import sessions, create_session, verify_session, get_current_user
+from app.services.broadcaster import broadcaster
+from app.services.device_manager import device_manager
+from app.services.features import feature_events
+from app.services.history import list_sessions, query_features, query_history
+from app.services.replay import list_replay_ports
+from app.services.simulator import PulseWaveGenerator
 
 app = FastAPI()
 security = HTTPBasic()
@@ -31,46 +42,6 @@ users = {
     }
 }
 
-# 会话管理
-sessions = {}
-SESSION_EXPIRY = 3600  # 会话过期时间（秒）
-
-# 创建会话
-def create_session(username: str) -> str:
-    session_id = secrets.token_hex(16)
-    sessions[session_id] = {
-        "username": username,
-        "created_at": time.time(),
-        "expires_at": time.time() + SESSION_EXPIRY
-    }
-    return session_id
-
-# 验证会话
-def verify_session(session_id: Optional[str] = Cookie(None)) -> Optional[str]:
-    if not session_id or session_id not in sessions:
-        return None
-    
-    session = sessions[session_id]
-    if time.time() > session["expires_at"]:
-        # 会话已过期
-        del sessions[session_id]
-        return None
-        
-    # 更新会话过期时间
-    session["expires_at"] = time.time() + SESSION_EXPIRY
-    return session["username"]
-
-# 认证依赖
-def get_current_user(session_id: Optional[str] = Cookie(None)):
-    username = verify_session(session_id)
-    if username is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="未登录或会话已过期",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return username
-
 def find_available_port(start_port=8000, max_port=8999):
     """查找可用端口"""
     for port in range(start_port, max_port + 1):
@@ -91,27 +62,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 存储所有WebSocket连接
-active_connections: List[WebSocket] = []
+# 所有WebSocket连接由广播器管理，每个连接有自己的发送队列和发送任务
 
-# 串口连接状态
-serial_connection = None
-is_connected = False
+# 数字滤波器参数（与 app.core.config 一致；串口设备的滤波链见 config.FILTER_CHAIN）
+fs = SAMPLING_RATE  # 采样频率
+f_notch = NOTCH_FREQ  # 工频
+Q = QUALITY_FACTOR  # 品质因数
 
-# 数字滤波器参数
-fs = 1000  # 采样频率
-f_notch = 50  # 工频
-Q = 30  # 品质因数
-
-# 全局变量，用于控制数据来源和存储设置
-use_simulated_data = True  # 初始使用模拟数据
-serial_data_buffer = {
-    'cun': [],
-    'guan': [],
-    'chi': []
-}
-serial_buffer_max_size = 1000  # 串口数据缓冲区大小
-data_processing_lock = asyncio.Lock()  # 数据处理锁，防止并发冲突
+# 串口设备的连接状态、滤波状态和数据缓冲区都由 device_manager 按设备管理
 
 logging.basicConfig(level=logging.DEBUG,format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',datefmt='%Y-%m-%d %H:%M:%S')
 
@@ -389,6 +347,7 @@ html_content = """
                 <span id="statusText" class="text-gray-700">未连接</span>
             </div>
             <div class="space-x-4">
+                <input id="deviceIdInput" class="border rounded px-3 py-2 w-32" value="default" placeholder="设备ID">
                 <select id="portSelect" class="border rounded px-3 py-2">
                     <option value="">选择串口</option>
                 </select>
@@ -398,6 +357,20 @@ html_content = """
                     <option value="38400">38400</option>
                     <option value="57600">57600</option>
                     <option value="115200" selected>115200</option>
+                    <option value="460800">460800</option>
+                    <option value="921600">921600</option>
+                </select>
+                <select id="protocolSelect" class="border rounded px-3 py-2">
+                    <option value="auto" selected>自动识别协议</option>
+                    <option value="ascii">文本协议</option>
+                    <option value="binary">二进制协议</option>
+                </select>
+                <select id="speedSelect" class="border rounded px-3 py-2" title="回放端口的回放倍速">
+                    <option value="1" selected>回放 1×</option>
+                    <option value="2">回放 2×</option>
+                    <option value="5">回放 5×</option>
+                    <option value="10">回放 10×</option>
+                    <option value="max">回放不限速</option>
                 </select>
                 <button id="connectBtn" class="btn btn-primary">连接设备</button>
                 <button id="disconnectBtn" class="btn btn-secondary" disabled>断开连接</button>
@@ -434,7 +407,7 @@ html_content = """
     
     <div class="chart-container">
         <div class="flex justify-between items-center mb-4">
-            <h2 class="text-xl font-semibold">寸部</h2>
+            <h2 class="text-xl font-semibold">寸部 <span id="cunAlert" class="text-sm font-normal"></span> <span id="cunFeatures" class="text-xs font-normal text-gray-600"></span></h2>
             <div class="legend">
                 <div class="legend-item">
                     <div class="legend-color safe-level"></div>
@@ -455,7 +428,7 @@ html_content = """
     
     <div class="chart-container">
         <div class="flex justify-between items-center mb-4">
-            <h2 class="text-xl font-semibold">关部</h2>
+            <h2 class="text-xl font-semibold">关部 <span id="guanAlert" class="text-sm font-normal"></span> <span id="guanFeatures" class="text-xs font-normal text-gray-600"></span></h2>
             <div class="legend">
                 <div class="legend-item">
                     <div class="legend-color safe-level"></div>
@@ -476,7 +449,7 @@ html_content = """
     
     <div class="chart-container">
         <div class="flex justify-between items-center mb-4">
-            <h2 class="text-xl font-semibold">尺部</h2>
+            <h2 class="text-xl font-semibold">尺部 <span id="chiAlert" class="text-sm font-normal"></span> <span id="chiFeatures" class="text-xs font-normal text-gray-600"></span></h2>
             <div class="legend">
                 <div class="legend-item">
                     <div class="legend-color safe-level"></div>
@@ -494,6 +467,18 @@ html_content = """
         </div>
         <div id="chiChart" class="chart"></div>
     </div>
+    
+    <div class="chart-container">
+        <div class="flex justify-between items-center mb-4">
+            <h2 class="text-xl font-semibold">频谱图 <span id="spectrogramRange" class="text-sm font-normal text-gray-600"></span></h2>
+            <select id="spectrogramPosition" class="border rounded px-2 py-1 text-sm">
+                <option value="cun">寸部</option>
+                <option value="guan" selected>关部</option>
+                <option value="chi">尺部</option>
+            </select>
+        </div>
+        <canvas id="spectrogramCanvas" class="w-full" height="200"></canvas>
+    </div>
 
     <script>
         // 获取用户信息
@@ -532,12 +517,6 @@ html_content = """
             }
         };
         
-        // 脉搏率正常范围
-        const pulseRateRanges = {
-            safe: [60, 100],
-            warning: [50, 110]
-        };
-        
         // 初始化图表
         const charts = {
             cun: echarts.init(document.getElementById('cunChart')),
@@ -742,6 +721,9 @@ html_content = """
             charts[position].setOption(createBaseOption(position));
         });
 
+        // 图表显示的时间窗口（秒），服务端按图表像素宽度抽取
+        const displayWindow = 10;
+
         // 数据缓存
         const dataCache = {
             cun: [],
@@ -749,11 +731,11 @@ html_content = """
             chi: []
         };
 
-        // 检查脉搏率是否在安全范围内
-        function checkPulseRate(pulseRate) {
+        // 显示脉搏率状态（由服务端的告警事件决定）
+        function renderPulseStatus(level) {
             const pulseStatusElement = document.getElementById('pulseStatus');
             
-            if (pulseRate >= pulseRateRanges.safe[0] && pulseRate <= pulseRateRanges.safe[1]) {
+            if (level === 'normal') {
                 // 正常范围
                 pulseStatusElement.innerHTML = `<div class="pulse-status pulse-normal">
                     <svg xmlns="http://www.w3.org/2000/svg" class="h-4 w-4 mr-1 text-green-500" fill="none" viewBox="0 0 24 24" stroke="currentColor">
@@ -761,8 +743,7 @@ html_content = """
                     </svg>
                     <span>正常</span>
                 </div>`;
-                return 'normal';
-            } else if (pulseRate >= pulseRateRanges.warning[0] && pulseRate <= pulseRateRanges.warning[1]) {
+            } else if (level === 'warning') {
                 // 警告范围
                 pulseStatusElement.innerHTML = `<div class="pulse-status pulse-warning">
                     <svg xmlns="http://www.w3.org/2000/svg" class="h-4 w-4 mr-1 text-yellow-500" fill="none" viewBox="0 0 24 24" stroke="currentColor">
@@ -770,7 +751,6 @@ html_content = """
                     </svg>
                     <span>注意</span>
                 </div>`;
-                return 'warning';
             } else {
                 // 危险范围
                 pulseStatusElement.innerHTML = `<div class="pulse-status pulse-danger">
@@ -779,23 +759,231 @@ html_content = """
                     </svg>
                     <span>异常</span>
                 </div>`;
-                return 'danger';
             }
         }
 
+        // 处理服务端的告警事件，只在状态变化时更新显示
+        const alertLabels = { warning: '注意', danger: '异常' };
+        const alertColors = { warning: 'text-yellow-600', danger: 'text-red-600' };
+
+        function handleAlert(alert) {
+            const level = alert.event === 'start' ? alert.level : 'normal';
+            if (alert.channel === 'pulse_rate') {
+                renderPulseStatus(level);
+                return;
+            }
+            const element = document.getElementById(`${alert.channel}Alert`);
+            if (!element) {
+                return;
+            }
+            if (level === 'normal') {
+                element.textContent = '';
+                element.className = 'text-sm font-normal';
+            } else {
+                element.textContent = `${alertLabels[level]} 峰值 ${alert.peak}`;
+                element.className = `text-sm font-normal ${alertColors[level]}`;
+            }
+        }
+
+        function resetAlerts() {
+            renderPulseStatus('normal');
+            ['cun', 'guan', 'chi'].forEach(position => {
+                handleAlert({ event: 'end', channel: position });
+                document.getElementById(`${position}Features`).textContent = '';
+            });
+        }
+
+        // 显示服务端计算的最近若干心搏的脉搏波特征均值
+        function handleFeatures(features) {
+            const element = document.getElementById(`${features.channel}Features`);
+            const summary = features.window;
+            if (!element || !summary || !summary.beats) {
+                return;
+            }
+            const parts = [`幅度 ${summary.amplitude}`, `上升 ${Math.round(summary.rise_time * 1000)}ms`];
+            if (summary.notch_depth !== null) {
+                parts.push(`切迹 ${summary.notch_depth}`);
+            }
+            element.textContent = parts.join(' · ');
+        }
+
+        // 频谱图：服务端每个帧移发来新的量化频谱列，从右侧滚入，低频在下
+        const spectrogramCanvas = document.getElementById('spectrogramCanvas');
+        const spectrogramContext = spectrogramCanvas.getContext('2d');
+        const spectrogramPosition = document.getElementById('spectrogramPosition');
+        const spectrogramColumnWidth = 2;
+        spectrogramCanvas.width = spectrogramCanvas.clientWidth || 800;
+        // 0~255 映射为 深蓝 -> 红 -> 黄
+        const spectrogramColors = Array.from({ length: 256 }, (_, v) => [
+            Math.min(255, v * 2),
+            Math.max(0, v * 2 - 255),
+            Math.max(0, 128 - v)
+        ]);
+
+        function clearSpectrogram() {
+            spectrogramContext.fillStyle = 'rgb(0, 0, 128)';
+            spectrogramContext.fillRect(0, 0, spectrogramCanvas.width, spectrogramCanvas.height);
+        }
+        clearSpectrogram();
+        spectrogramPosition.addEventListener('change', clearSpectrogram);
+
+        function handleSpectrogram(spectrogram) {
+            const columns = spectrogram.columns[spectrogramPosition.value];
+            if (!columns || !columns.length) {
+                return;
+            }
+            const bins = columns[0].length;
+            document.getElementById('spectrogramRange').textContent =
+                `0 - ${Math.round(bins * spectrogram.bin_hz)} Hz，${spectrogram.db_min} - ${Math.round(spectrogram.db_min + 255 * spectrogram.db_step)} dB`;
+            const width = columns.length * spectrogramColumnWidth;
+            const height = spectrogramCanvas.height;
+            // 已有内容左移，新列画在右侧
+            spectrogramContext.drawImage(spectrogramCanvas, -width, 0);
+            const image = spectrogramContext.createImageData(width, height);
+            for (let y = 0; y < height; y++) {
+                const bin = Math.floor((height - 1 - y) * bins / height);
+                for (let x = 0; x < width; x++) {
+                    const color = spectrogramColors[columns[Math.floor(x / spectrogramColumnWidth)][bin]];
+                    const offset = (y * width + x) * 4;
+                    image.data[offset] = color[0];
+                    image.data[offset + 1] = color[1];
+                    image.data[offset + 2] = color[2];
+                    image.data[offset + 3] = 255;
+                }
+            }
+            spectrogramContext.putImageData(image, spectrogramCanvas.width - width, 0);
+        }
+
         // 连接WebSocket
         let ws = null;
         let reconnectAttempts = 0;
         const maxReconnectAttempts = 5;
         const reconnectDelay = 3000; // 3秒
 
+        // 当前设备的数据流编号，模拟数据的数据流编号为 0
+        let currentStreamId = null;
+
+        function isCurrentStream(data) {
+            return !data.stream_id || data.stream_id === currentStreamId;
+        }
+
+        // 解码二进制频谱图消息（格式见 app/services/wire_format.py）
+        function decodeSpectrogram(buffer) {
+            const view = new DataView(buffer);
+            const count = view.getUint16(4, true);
+            const bins = view.getUint16(6, true);
+            const firstTimestamp = view.getFloat64(8, true);
+            const hopSeconds = view.getFloat32(16, true);
+            const mask = view.getUint8(32);
+            const spectrogram = {
+                type: 'spectrogram',
+                stream_id: view.getUint16(2, true),
+                timestamp: Array.from({ length: count }, (_, i) => firstTimestamp + i * hopSeconds),
+                hop_seconds: hopSeconds,
+                bin_hz: view.getFloat32(20, true),
+                db_min: view.getFloat32(24, true),
+                db_step: view.getFloat32(28, true),
+                columns: {}
+            };
+            let offset = 36;
+            ['cun', 'guan', 'chi'].filter((position, c) => mask & (1 << c)).forEach(position => {
+                spectrogram.columns[position] = Array.from({ length: count },
+                    (_, i) => new Uint8Array(buffer, offset + i * bins, bins));
+                offset += count * bins;
+            });
+            return spectrogram;
+        }
+
+        // 解码二进制数据帧（格式见 app/services/wire_format.py）
+        function decodeBinaryFrame(buffer) {
+            const view = new DataView(buffer);
+            const encoding = view.getUint8(1);
+            if (encoding === 2) {
+                return decodeSpectrogram(buffer);
+            }
+            const streamId = view.getUint16(2, true);
+            const count = view.getUint32(8, true);
+            const firstTimestamp = view.getFloat64(12, true);
+            const samplingRate = view.getFloat32(20, true) || 1;
+            const pulseRate = view.getFloat32(24, true);
+            const mask = view.getUint8(28);
+            const flags = view.getUint8(29);
+            const frame = {
+                stream_id: streamId,
+                seq: view.getUint32(4, true),
+                sampling_rate: samplingRate,
+                pulse_rate: isNaN(pulseRate) ? null : pulseRate,
+                source: streamId === 0 ? 'simulation' : 'hardware'
+            };
+            // 只有通道掩码中的通道有数据
+            const positions = ['cun', 'guan', 'chi'].filter((position, c) => mask & (1 << c));
+            if (!positions.length) {
+                return frame;
+            }
+            frame.timestamp = new Array(count);
+            for (let i = 0; i < count; i++) {
+                frame.timestamp[i] = firstTimestamp + i / samplingRate;
+            }
+            let offset = 32;
+            if (encoding === 1) {
+                // int16 + 每通道缩放系数
+                const scales = new Float32Array(buffer, 32, positions.length);
+                offset += positions.length * 4;
+                positions.forEach((position, c) => {
+                    const raw = new Int16Array(buffer, offset + c * count * 2, count);
+                    frame[position] = Array.from(raw, v => v * scales[c]);
+                });
+                offset += positions.length * count * 2;
+            } else {
+                positions.forEach((position, c) => {
+                    frame[position] = new Float32Array(buffer, 32 + c * count * 4, count);
+                });
+                offset += positions.length * count * 4;
+            }
+            if (flags & 1) {
+                // 心搏段: 每通道心搏数 u16 + 时间戳 f64
+                frame.beats = {};
+                positions.forEach(position => {
+                    const beatCount = view.getUint16(offset, true);
+                    offset += 2;
+                    frame.beats[position] = [];
+                    for (let i = 0; i < beatCount; i++, offset += 8) {
+                        frame.beats[position].push(view.getFloat64(offset, true));
+                    }
+                });
+            }
+            return frame;
+        }
+
+        // 订阅当前设备的数据流（未连接硬件时订阅模拟数据），并回填显示窗口内的历史数据
+        function subscribeCurrentStream() {
+            if (!ws || ws.readyState !== WebSocket.OPEN) {
+                return;
+            }
+            ['cun', 'guan', 'chi'].forEach(position => {
+                dataCache[position].length = 0;
+            });
+            // 订阅确认后服务端会发来该数据流尚未结束的告警
+            resetAlerts();
+            clearSpectrogram();
+            ws.send(JSON.stringify({
+                type: 'subscribe',
+                device_id: currentStreamId ? deviceIdInput.value : 'simulation',
+                channels: ['cun', 'guan', 'chi', 'pulse_rate', 'spectrogram'],
+                backfill: displayWindow
+            }));
+        }
+
         function connectWebSocket() {
             try {
-                ws = new WebSocket(`ws://localhost:${port}/ws`);
+                const displayPoints = document.getElementById('cunChart').clientWidth || 800;
+                ws = new WebSocket(`ws://localhost:${port}/ws?format=binary&points=${displayPoints}&window=${displayWindow}`);
+                ws.binaryType = 'arraybuffer';
                 
                 ws.onopen = function() {
                     console.log('WebSocket连接已建立');
                     reconnectAttempts = 0;
+                    subscribeCurrentStream();
                 };
                 
                 ws.onclose = function(event) {
@@ -815,13 +1003,55 @@ html_content = """
                 
                 ws.onmessage = function(event) {
                     try {
-                        const data = JSON.parse(event.data);
+                        const data = event.data instanceof ArrayBuffer
+                            ? decodeBinaryFrame(event.data)
+                            : JSON.parse(event.data);
+                        
+                        // 只显示当前设备的数据和模拟数据
+                        if (!isCurrentStream(data)) {
+                            return;
+                        }
+                        
+                        if (data.type === 'error') {
+                            console.error('订阅失败:', data.message);
+                            return;
+                        }
+                        
+                        if (data.type === 'alert') {
+                            handleAlert(data);
+                            return;
+                        }
                         
-                        // 更新数据缓存
+                        if (data.type === 'features') {
+                            handleFeatures(data);
+                            return;
+                        }
+                        
+                        if (data.type === 'spectrogram') {
+                            handleSpectrogram(data);
+                            return;
+                        }
+                        
+                        // 心跳、订阅确认等控制消息不含数据
+                        if (data.timestamp === undefined) {
+                            return;
+                        }
+                        
+                        // 更新数据缓存（每帧每个通道是一个数组）
                         ['cun', 'guan', 'chi'].forEach(position => {
-                            dataCache[position].push([data.timestamp, data[position]]);
-                            if (dataCache[position].length > 100) {
-                                dataCache[position].shift();
+                            const values = data[position];
+                            const cache = dataCache[position];
+                            for (let i = 0; i < data.timestamp.length; i++) {
+                                cache.push([data.timestamp[i], values[i]]);
+                            }
+                            // 只保留显示窗口内的数据
+                            const oldest = cache[cache.length - 1][0] - displayWindow;
+                            let expired = 0;
+                            while (expired < cache.length && cache[expired][0] < oldest) {
+                                expired++;
+                            }
+                            if (expired > 0) {
+                                cache.splice(0, expired);
                             }
                             
                             // 更新图表
@@ -852,11 +1082,6 @@ html_content = """
                                 document.getElementById('dataSourceIndicator').innerHTML = '数据源: <span class="font-semibold text-blue-600">模拟</span>';
                             }
                         }
-                        
-                        // 检查脉搏率
-                        if (data.pulse_rate) {
-                            checkPulseRate(data.pulse_rate);
-                        }
                     } catch (error) {
                         console.error('处理WebSocket消息时出错:', error);
                     }
@@ -889,6 +1114,7 @@ html_content = """
         const connectBtn = document.getElementById('connectBtn');
         const disconnectBtn = document.getElementById('disconnectBtn');
         const portSelect = document.getElementById('portSelect');
+        const deviceIdInput = document.getElementById('deviceIdInput');
         const connectionStatus = document.getElementById('connectionStatus');
         const statusText = document.getElementById('statusText');
 
@@ -916,25 +1142,35 @@ html_content = """
 
             try {
                 const baudrate = parseInt(document.getElementById('baudrateSelect').value);
+                const protocol = document.getElementById('protocolSelect').value;
+                const speed = document.getElementById('speedSelect').value;
                 const response = await fetch('/api/connect', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json'
                     },
                     body: JSON.stringify({ 
+                        device_id: deviceIdInput.value,
                         port: selectedPort,
-                        baudrate: baudrate 
+                        baudrate: baudrate,
+                        protocol: protocol,
+                        speed: speed
                     })
                 });
 
                 const result = await response.json();
                 if (result.status === 'success') {
+                    currentStreamId = result.stream_id || null;
+                    subscribeCurrentStream();
                     connectionStatus.className = 'status-indicator status-connected';
                     statusText.textContent = `已连接 (${result.port}, ${result.baudrate}波特率)`;
                     connectBtn.disabled = true;
                     disconnectBtn.disabled = false;
                     portSelect.disabled = true;
+                    deviceIdInput.disabled = true;
                     document.getElementById('baudrateSelect').disabled = true;
+                    document.getElementById('protocolSelect').disabled = true;
+                    document.getElementById('speedSelect').disabled = true;
                     
                     // 设置数据源标识
                     document.getElementById('dataSourceIndicator').innerHTML = '数据源: <span class="font-semibold text-green-600">硬件</span>';
@@ -949,18 +1185,23 @@ html_content = """
         // 断开连接
         disconnectBtn.addEventListener('click', async () => {
             try {
-                const response = await fetch('/api/disconnect', {
+                const response = await fetch(`/api/disconnect?device_id=${encodeURIComponent(deviceIdInput.value)}`, {
                     method: 'POST'
                 });
 
                 const result = await response.json();
                 if (result.status === 'success') {
+                    currentStreamId = null;
+                    subscribeCurrentStream();
                     connectionStatus.className = 'status-indicator status-disconnected';
                     statusText.textContent = '未连接';
                     connectBtn.disabled = false;
                     disconnectBtn.disabled = true;
                     portSelect.disabled = false;
+                    deviceIdInput.disabled = false;
                     document.getElementById('baudrateSelect').disabled = false;
+                    document.getElementById('protocolSelect').disabled = false;
+                    document.getElementById('speedSelect').disabled = false;
                     
                     // 更新数据源指示
                     document.getElementById('dataSourceIndicator').innerHTML = '数据源: <span class="font-semibold text-blue-600">模拟</span>';
@@ -974,6 +1215,19 @@ html_content = """
 
         // 页面加载时获取串口列表
         getPorts();
+
+        // 页面加载时获取当前设备的数据流编号（设备可能已在其它页面连接）
+        async function refreshStreamId() {
+            try {
+                const response = await fetch(`/api/status?device_id=${encodeURIComponent(deviceIdInput.value)}`);
+                const status = await response.json();
+                currentStreamId = status.is_connected ? (status.stream_id || null) : null;
+                subscribeCurrentStream();
+            } catch (error) {
+                console.error('获取设备状态失败:', error);
+            }
+        }
+        refreshStreamId();
     </script>
 </body>
 </html>
@@ -988,92 +1242,174 @@ def create_notch_filter():
 def apply_filter(data, b, a):
     return signal.filtfilt(b, a, data)
 
-# 生成模拟脉搏数据
-def generate_pulse_data(t):
-    # 基础脉搏波形（使用正弦波模拟）
-    base_freq = 1.2  # 每秒1.2次脉搏
-    amplitude = 1.0
-    
-    # 每30秒切换一次状态（正常/异常）
-    is_abnormal = (int(t) // 30) % 2 == 1
-    
-    # 添加一些随机变化使波形更自然
-    noise = np.random.normal(0, 0.1 if not is_abnormal else 0.3)
-    
-    if is_abnormal:
-        # 异常状态：更快的心率，更大的波动
-        base_freq = 2.0  # 每秒2次脉搏（120次/分钟）
-        pulse_rate = 120
-    else:
-        # 正常状态
-        pulse_rate = 72
-    
-    # 生成三个不同位置的脉搏数据，共用同一个状态
-    t_with_freq = 2 * math.pi * base_freq * t
-    cun = amplitude * (1.8 if is_abnormal else 1.0) * math.sin(t_with_freq) + noise
-    guan = amplitude * (1.5 if is_abnormal else 0.8) * math.sin(t_with_freq + 0.2) + noise
-    chi = amplitude * (1.2 if is_abnormal else 0.6) * math.sin(t_with_freq + 0.4) + noise
-    
-    return cun, guan, chi, pulse_rate, is_abnormal
+# 模拟数据流的告警
+simulation_alerts = AlertMonitor()
 
+# 生成模拟脉搏数据
 async def simulate_pulse_data():
-    """生成模拟脉搏数据"""
-    t = 0
+    """按真实采样率生成模拟脉搏数据"""
+    generator = PulseWaveGenerator(SIMULATOR_SEED, fs)
+    # 心搏检测、特征提取和频谱图在分析进程池中计算，不等待结果
+    analytics = BackgroundAnalytics(analytics_pool.client('simulation', fs, fs))
+    loop = asyncio.get_running_loop()
+
+    async def publish_analytics(result):
+        for event in feature_events(result['features'], result['feature_windows']):
+            broadcaster.publish_event('simulation', dict(event, stream_id=0))
+        if result['spectrogram'] is not None:
+            broadcaster.publish_spectrogram('simulation', result['spectrogram'], stream_id=0)
+
+    started = None
     while True:
         try:
-            # 只有当使用模拟数据且有活动连接时才生成数据
-            if not use_simulated_data or not active_connections:
+            # 只有当使用模拟数据且有客户端订阅模拟数据时才生成数据
+            if not device_manager.using_simulated_data() or not broadcaster.has_subscribers('simulation'):
+                started = None
                 await asyncio.sleep(1)
                 continue
+            if started is None:
+                # 暂停后从当前样本继续，不补发暂停期间的数据
+                started = loop.time() - generator.sample_index / fs
                 
-            # 生成模拟数据
-            cun, guan, chi, pulse_rate, is_abnormal = generate_pulse_data(t)
-            
-            # 发送数据到所有连接的客户端
-            message = {
-                'cun': cun,
-                'guan': guan,
-                'chi': chi,
-                'timestamp': t,
-                'pulse_rate': pulse_rate,
-                'sampling_rate': fs,
-                'source': 'simulation',
-                'status': 'abnormal' if is_abnormal else 'normal'
-            }
-            
-            # 创建连接列表的副本以避免在迭代时修改
-            connections = active_connections.copy()
-            
-            # 发送数据到每个连接
-            for connection in connections:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except Exception as e:
-                    if connection in active_connections:
-                        active_connections.remove(connection)
-                        print(f"移除断开的连接，当前活动连接数: {len(active_connections)}")
-                    print(f"发送数据到客户端失败: {e}")
+            # 按经过的时间补齐样本，整块向量化生成
+            due = int((loop.time() - started) * fs)
+            block = generator.next_block(due - generator.sample_index)
+            if len(block['timestamp']):
+                # 脉率、心搏和告警与硬件数据一样在服务端得到
+                waves = np.vstack((block['cun'], block['guan'], block['chi']))
+                pulse_rate = analytics.pulse_rate
+                beats = analytics.take_beats()
+                analytics.submit(block['timestamp'], waves, block['timestamp'], waves, publish_analytics)
+                for event in simulation_alerts.process(block['timestamp'], waves, pulse_rate):
+                    broadcaster.publish_event('simulation', dict(event, stream_id=0))
+                # 交给广播器，随下一帧发送到所有订阅的客户端
+                status = 'abnormal' if block['abnormal'][-1] else 'normal'
+                broadcaster.publish('simulation', {
+                    'cun': block['cun'],
+                    'guan': block['guan'],
+                    'chi': block['chi'],
+                    'timestamp': block['timestamp'],
+                    'pulse_rate': pulse_rate,
+                    'beats': dict(zip(('cun', 'guan', 'chi'), beats))
+                }, stream_id=0, sampling_rate=fs, source='simulation', status=status)
             
-            t += 0.1
-            await asyncio.sleep(0.1)  # 每100ms发送一次数据
+            await asyncio.sleep(SIMULATOR_BLOCK_SECONDS)
                 
         except Exception as e:
             print(f"数据生成错误: {e}")
             await asyncio.sleep(1)
             continue
 
+def parse_client_message(data: str) -> dict:
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return {}
+    return message if isinstance(message, dict) else {}
+
+def handle_subscribe(client, message: dict, default_window: float):
+    """处理客户端订阅消息
+
+    {"type": "subscribe", "device_id": "default" | "simulation" | null,
+     "channels": ["cun", "guan", "chi", "pulse_rate", "spectrogram"], "max_fps": 10,
+     "points": 800, "window": 10, "backfill": 10}
+    device_id 为 null 时接收全部数据流；backfill 为回填最近多少秒的历史数据；
+    spectrogram 需要显式订阅，频谱图只包含同时订阅的部位。
+    """
+    try:
+        channels = message.get("channels")
+        if channels is not None and not isinstance(channels, list):
+            raise ValueError("channels 必须为列表")
+        max_fps = message.get("max_fps")
+        points = message.get("points")
+        window = float(message.get("window") or default_window)
+        subscription = broadcaster.subscribe(
+            client,
+            stream=message.get("device_id"),
+            channels=channels,
+            max_fps=None if max_fps is None else float(max_fps),
+            points=None if points is None else int(points),
+            window=window
+        )
+        backfill = float(message.get("backfill") or 0)
+    except (TypeError, ValueError) as e:
+        client.enqueue(json.dumps({"type": "error", "message": str(e)}), control=True)
+        return
+    client.enqueue(json.dumps(dict(subscription, type="subscribed")), control=True)
+    if backfill > 0 and subscription["device_id"] is not None:
+        frame = backfill_frame(subscription["device_id"], backfill)
+        if frame is not None:
+            broadcaster.send_backfill(client, frame)
+    # 客户端只根据告警事件更新状态，订阅时先发送尚未结束的告警
+    for event in active_alerts(subscription["device_id"]):
+        if event["channel"] in subscription["channels"]:
+            client.enqueue(broadcaster.encode_event(event), control=True)
+
+def alert_monitors(device_id: Optional[str]) -> dict:
+    """数据流 -> (数据流编号, 告警监测)，device_id 为 None 时返回全部数据流"""
+    monitors = {'simulation': (0, simulation_alerts)}
+    for stream, device in device_manager.devices.items():
+        monitors[stream] = (device.stream_id, device.alerts)
+    if device_id is None:
+        return monitors
+    return {device_id: monitors[device_id]} if device_id in monitors else {}
+
+def active_alerts(device_id: Optional[str]) -> list:
+    """尚未结束的告警事件，与实时发送的告警事件字段相同"""
+    events = []
+    for stream, (stream_id, monitor) in alert_monitors(device_id).items():
+        extra = {"stream_id": stream_id} if stream == 'simulation' else {"stream_id": stream_id, "device_id": stream}
+        events.extend(dict(event, **extra) for event in monitor.active())
+    return events
+
+def backfill_frame(device_id: str, seconds: float) -> Optional[dict]:
+    """从设备的环形缓冲区取最近 seconds 秒的数据作为回填帧"""
+    device = device_manager.get(device_id)
+    if device is None:
+        return None
+    # 缓冲区只在事件循环中写入，这里同步拷贝即可
+    timestamps, data = device.data_buffer.since(device.data_buffer.latest_timestamp() - seconds)
+    timestamps, data = timestamps.copy(), data.astype(np.float64)
+    if not len(timestamps):
+        return None
+    return {
+        "stream_id": device.stream_id,
+        "device_id": device.device_id,
+        "sampling_rate": device.sampling_rate,
+        "source": "hardware",
+        "seq": 0,
+        "timestamp": timestamps,
+        "cun": data[0],
+        "guan": data[1],
+        "chi": data[2],
+        "pulse_rate": None
+    }
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, policy: str = CLIENT_QUEUE_POLICY,
+                             wire_format: str = Query('json', alias='format'),
+                             points: int = 0, window: float = DISPLAY_WINDOW_SECONDS):
     await websocket.accept()
-    active_connections.append(websocket)
+    try:
+        # policy 为慢客户端策略: drop_oldest、latest 或 disconnect
+        # format 为数据格式: json（默认）、binary（float32）或 binary16（int16 + 缩放系数）
+        # points/window 为显示分辨率: window 秒内显示 points 个点，服务端按此做 min/max 抽取
+        client = broadcaster.add_client(websocket, policy, wire_format, points, window)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
     try:
         while True:
             try:
-                # 保持连接活跃
                 data = await websocket.receive_text()
-                # 发送心跳响应
-                await websocket.send_text(json.dumps({"type": "heartbeat"}))
-            except websockets.exceptions.ConnectionClosed:
+                # 订阅消息修改本连接接收的设备、通道、帧率和分辨率，其它消息视为心跳
+                # 回复也经由发送队列，避免与数据帧并发写同一连接
+                message = parse_client_message(data)
+                if message.get("type") == "subscribe":
+                    handle_subscribe(client, message, window)
+                else:
+                    client.enqueue(json.dumps({"type": "heartbeat"}), control=True)
+            except WebSocketDisconnect:
                 print("WebSocket连接已关闭")
                 break
             except Exception as e:
@@ -1081,18 +1417,54 @@ async def websocket_endpoint(websocket: WebSocket):
                 break
     finally:
         # 确保连接被移除
-        if websocket in active_connections:
-            active_connections.remove(websocket)
-            print(f"当前活动连接数: {len(active_connections)}")
+        await broadcaster.remove_client(client)
+        print(f"当前活动连接数: {len(broadcaster.clients)}")
+
+# 事件循环延迟采样（秒），用于 /api/metrics
+loop_lag_samples = deque(maxlen=EVENT_LOOP_LAG_WINDOW)
+
+async def monitor_event_loop():
+    """定时测量事件循环的调度延迟：实际唤醒时间比预定时间晚多少"""
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + EVENT_LOOP_LAG_INTERVAL
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        loop_lag_samples.append(max(0.0, loop.time() - scheduled))
+
+async def sweep_sessions():
+    """定时清理过期会话，已放弃的登录不会一直占用内存"""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        removed = sessions.sweep()
+        if removed:
+            logging.debug(f"清理过期会话 {removed} 个")
+
+def process_rss_bytes() -> Optional[int]:
+    """当前进程的常驻内存，仅支持 Linux"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
 
 @app.on_event("startup")
 async def startup_event():
     # 启动模拟数据生成任务
     print("------启动模拟数据生成任务------")
     asyncio.create_task(simulate_pulse_data())
-    # 启动串口数据读取任务
-    print("------启动串口数据读取任务------")
-    asyncio.create_task(read_serial_data())
+    # 启动事件循环延迟监测
+    asyncio.create_task(monitor_event_loop())
+    # 启动过期会话清理任务
+    asyncio.create_task(sweep_sessions())
+    # 启动按帧广播任务
+    broadcaster.start()
+    # 串口数据读取任务在设备连接时由 device_manager 为每个设备单独启动
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # 停止所有设备的串口读线程
+    device_manager.disconnect_all()
+    analytics_pool.stop()
 
 # 登录页面
 @app.get("/", response_class=HTMLResponse)
@@ -1146,8 +1518,8 @@ async def get_user_info(username: str = Depends(get_current_user)):
 # 退出登录
 @app.get("/logout")
 async def logout(session_id: Optional[str] = Cookie(None)):
-    if session_id and session_id in sessions:
-        del sessions[session_id]
+    if session_id:
+        sessions.remove(session_id)
     
     response = RedirectResponse(url="/", status_code=303)
     response.delete_cookie(key="session_id")
@@ -1164,207 +1536,195 @@ async def get_ports(username: str = Depends(get_current_user)):
     # 添加虚拟串口选项，便于在没有硬件时测试
     debug_ports = ["DEBUG_COM1", "DEBUG_COM2", "DEBUG_COM3"]
     
-    # 合并实际串口和虚拟串口
-    all_ports = real_ports + debug_ports
+    # 回放端口把录制的会话当作串口数据源
+    replay_ports = list_replay_ports()
+    
+    # 合并实际串口、虚拟串口和回放端口
+    all_ports = real_ports + debug_ports + replay_ports
     return all_ports
 
 @app.post("/api/connect")
 async def connect_serial(request: Request, username: str = Depends(get_current_user)):
-    """连接串口"""
-    global serial_connection, is_connected, use_simulated_data
-    
+    """为指定设备连接串口"""
     try:
         data = await request.json()
+        device_id = data.get("device_id") or DEFAULT_DEVICE_ID
         port = data.get("port")
         baudrate = data.get("baudrate", 115200)
+        protocol = data.get("protocol", SERIAL_PROTOCOL)
+        # 回放倍速，"max" 表示不限速
+        speed = data.get("speed", 1)
+        speed = 0.0 if speed == "max" else float(speed)
+        # 设备的滤波链，不指定时使用默认滤波链
+        filter_chain = data.get("filters")
         
         if not port:
             return {"status": "error", "message": "未指定串口"}
         
-        # 关闭已有连接
-        if serial_connection and serial_connection.is_open:
-            serial_connection.close()
-        
         # 检查是否为调试串口
         if port.startswith("DEBUG_"):
-            print(f"连接到虚拟调试串口: {port}")
-            is_connected = True
-            use_simulated_data = True  # 使用模拟数据
-            return {"status": "success", "port": port, "baudrate": baudrate, "mode": "debug"}
-        
-        # 创建新连接
-        serial_connection = serial.Serial(
-            port=port,
-            baudrate=baudrate,
-            bytesize=serial.EIGHTBITS,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            timeout=1
-        )
-        
-        is_connected = True
-        use_simulated_data = False  # 切换到实际数据
+            print(f"设备 {device_id} 连接到虚拟调试串口: {port}")
         
-        print(f"成功连接到串口!!{port}，波特率: {baudrate}")
-        return {"status": "success", "port": port, "baudrate": baudrate}
+        # 串口读取在设备自己的读线程中进行，已连接的设备会先断开
+        result = device_manager.connect(device_id, port, baudrate, protocol, speed, filter_chain)
+        if result.get("status") == "success":
+            print(f"设备 {device_id} 成功连接到串口!!{port}，波特率: {baudrate}，协议: {protocol}")
+        else:
+            print(f"设备 {device_id} 连接串口失败: {result.get('message')}")
+        return result
     except Exception as e:
         print(f"连接串口失败: {e}")
         return {"status": "error", "message": str(e)}
 
 @app.post("/api/disconnect")
-async def disconnect_serial(username: str = Depends(get_current_user)):
-    """断开串口连接"""
-    global serial_connection, is_connected, use_simulated_data
+async def disconnect_serial(device_id: str = DEFAULT_DEVICE_ID, username: str = Depends(get_current_user)):
+    """断开指定设备的串口连接"""
     try:
-        if serial_connection and serial_connection.is_open:
-            serial_connection.close()
-        is_connected = False
-        use_simulated_data = True  # 切换回模拟数据
-        print("已断开串口连接，切换回模拟数据")
-        return {"status": "success"}
+        result = device_manager.disconnect(device_id)
+        print(f"设备 {device_id} 已断开串口连接")
+        return result
     except Exception as e:
         print(f"断开串口连接失败: {e}")
         return {"status": "error", "message": str(e)}
 
 @app.get("/api/status")
-async def get_status(username: str = Depends(get_current_user)):
-    """获取当前连接状态和数据源信息"""
-    port_info = None
-    if serial_connection:
-        try:
-            port_info = {
-                "port": serial_connection.port,
-                "baudrate": serial_connection.baudrate,
-                "is_open": serial_connection.is_open
-            }
-        except:
-            pass
-    
+async def get_status(device_id: Optional[str] = None, username: str = Depends(get_current_user)):
+    """获取设备的连接状态和数据源信息，不指定设备时返回全部设备"""
+    return device_manager.get_status(device_id)
+
+@app.get("/api/filters")
+async def get_filters(device_id: str = DEFAULT_DEVICE_ID, username: str = Depends(get_current_user)):
+    """获取设备各部位当前的滤波链"""
+    device = device_manager.get(device_id)
+    if device is None:
+        return {"status": "error", "message": f"设备 {device_id} 不存在"}
+    return dict(device.filter_info(), status="success")
+
+@app.post("/api/filters")
+async def set_filters(request: Request, username: str = Depends(get_current_user)):
+    """运行中修改设备的滤波链
+
+    {"device_id": "default", "stages": [{"type": "notch", "freq": 50, "harmonics": 3}, ...],
+     "channels": ["guan"]}
+    channels 不指定时修改全部部位；未修改的部位保留滤波状态，数据不会中断。
+    """
+    data = await request.json()
+    device_id = data.get("device_id") or DEFAULT_DEVICE_ID
+    device = device_manager.get(device_id)
+    if device is None:
+        return {"status": "error", "message": f"设备 {device_id} 不存在"}
+    channels = data.get("channels")
+    if channels is not None and not isinstance(channels, list):
+        return {"status": "error", "message": "channels 必须为列表"}
+    result = device.set_filter_chain(data.get("stages"), channels)
+    if result["status"] == "success":
+        print(f"设备 {device_id} 的滤波链已修改: {result['stages']}")
+    return result
+
+@app.get("/api/alerts")
+async def get_alerts(device_id: str = DEFAULT_DEVICE_ID, limit: int = 100, username: str = Depends(get_current_user)):
+    """获取数据流尚未结束的告警和最近的告警事件，device_id 为 simulation 时为模拟数据"""
+    monitors = alert_monitors(device_id)
+    if not monitors:
+        return {"status": "error", "message": f"设备 {device_id} 不存在"}
+    _, monitor = monitors[device_id]
     return {
-        "is_connected": is_connected,
-        "using_simulated_data": use_simulated_data,
-        "port_info": port_info
+        "status": "success",
+        "device_id": device_id,
+        "active": monitor.active(),
+        "recent": monitor.recent(limit)
     }
 
-# 串口连接和数据处理
-async def read_serial_data():
-    """从串口读取数据并处理"""
-    global serial_connection, is_connected, serial_data_buffer, use_simulated_data
-    num=0
-    print("------开始监听串口连接状态------")
-    t=0
-    while True:
-        num+=1
-        print(f"第{num}次尝试读取串口数据")
-        print(f"串口连接状态为{is_connected}")
-        try:
-            if not is_connected or serial_connection is None or not serial_connection.is_open:
-                print("------1------")
-                await asyncio.sleep(0.5)
-                continue
-                
-            # 检查是否有数据可读
-            if serial_connection.in_waiting > 0:
-
-                print("------2------")
-                # 读取一行数据 (假设数据格式为: "时间戳,寸,关,尺\n")
-                line = serial_connection.read(15).decode('utf-8').strip()
-                print("------3------")
-                print(line)
-                '''
-                if not line:
-                    print("------4------")
-                    await asyncio.sleep(0.01)
-                    continue'''
-                
-                try:
-                    # 解析数据
-                    # 假设传入数据格式: "timestamp,cun_value,guan_value,chi_value"
-                    print("------5------")
-                    parts = line.split(',')
-                    print("------6------")
-                    if len(parts) >= 3:  # 确保数据格式正确
-                        print("------7------")
-                        cun_value = float(parts[0])
-                        guan_value = float(parts[1])
-                        chi_value = float(parts[2])
-                        t+=0.001
-                        timestamp=t
-                        print(f"存部数据{cun_value}")
-                        print(f"关部数据{guan_value}")
-                        print(f"尺部数据{chi_value}")
-                        print(f"时间戳数据{timestamp}")
-                        
-                        # 获取可选的脉率数据（如果硬件提供）
-                        pulse_rate = float(parts[4]) if len(parts) > 4 else None
-                        
-                        # 应用数字滤波（如果需要）
-                        b, a = create_notch_filter()
-                        if len(serial_data_buffer['cun']) > 10:  # 确保有足够的数据进行滤波
-                            cun_data = [d[1] for d in serial_data_buffer['cun'][-10:]] + [cun_value]
-                            guan_data = [d[1] for d in serial_data_buffer['guan'][-10:]] + [guan_value]
-                            chi_data = [d[1] for d in serial_data_buffer['chi'][-10:]] + [chi_value]
-                            
-                            filtered_cun = apply_filter(np.array(cun_data), b, a)[-1]
-                            filtered_guan = apply_filter(np.array(guan_data), b, a)[-1]
-                            filtered_chi = apply_filter(np.array(chi_data), b, a)[-1]
-                        else:
-                            filtered_cun = cun_value
-                            filtered_guan = guan_value
-                            filtered_chi = chi_value
-                        
-                        # 更新缓冲区
-                        async with data_processing_lock:
-                            serial_data_buffer['cun'].append((timestamp, filtered_cun))
-                            serial_data_buffer['guan'].append((timestamp, filtered_guan))
-                            serial_data_buffer['chi'].append((timestamp, filtered_chi))
-                            
-                            # 限制缓冲区大小
-                            if len(serial_data_buffer['cun']) > serial_buffer_max_size:
-                                serial_data_buffer['cun'] = serial_data_buffer['cun'][-serial_buffer_max_size:]
-                                serial_data_buffer['guan'] = serial_data_buffer['guan'][-serial_buffer_max_size:]
-                                serial_data_buffer['chi'] = serial_data_buffer['chi'][-serial_buffer_max_size:]
-                            
-                            # 设置使用实际数据
-                            use_simulated_data = False
-                        
-                        # 向客户端发送最新数据
-                        message = {
-                            'cun': filtered_cun,
-                            'guan': filtered_guan,
-                            'chi': filtered_chi,
-                            'timestamp': timestamp,
-                            'pulse_rate': pulse_rate if pulse_rate is not None else round(60 * 1.2),
-                            'sampling_rate': fs,
-                            'source': 'hardware'
-                        }
-                        
-                        connections = active_connections.copy()
-                        for connection in connections:
-                            try:
-                                await connection.send_text(json.dumps(message))
-                            except Exception as e:
-                                if connection in active_connections:
-                                    active_connections.remove(connection)
-                                print(f"发送串口数据到客户端失败: {e}")
-                                
-                except Exception as e:
-                    print(f"解析串口数据错误: {e}")
-            else:
-                print("当前无数据可读！")
-            await asyncio.sleep(0.01)  # 小的延迟，避免CPU过度使用
-                
-        except Exception as e:
-            print(f"读取串口数据错误: {e}")
-            await asyncio.sleep(1)
-            
-            # 如果连接丢失，尝试自动重新连接
-            if is_connected and serial_connection and not serial_connection.is_open:
-                try:
-                    serial_connection.open()
-                except:
-                    is_connected = False
-                    use_simulated_data = True
+@app.get("/api/recordings")
+async def get_recordings(device_id: str = DEFAULT_DEVICE_ID, username: str = Depends(get_current_user)):
+    """获取设备的录制会话列表"""
+    try:
+        return {"status": "success", "sessions": list_sessions(device_id)}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/history")
+async def get_history(device: str = DEFAULT_DEVICE_ID, start: Optional[float] = None, end: Optional[float] = None,
+                      channels: str = 'cun,guan,chi', points: int = 1000, session: Optional[str] = None,
+                      username: str = Depends(get_current_user)):
+    """查询录制数据的任意时间段，按 points 返回每个桶的最小值、最大值和均值"""
+    try:
+        # 读取文件在线程池中进行，不阻塞事件循环
+        return await asyncio.to_thread(
+            query_history, device, start, end,
+            [c.strip() for c in channels.split(',') if c.strip()], points, session
+        )
+    except (ValueError, FileNotFoundError) as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/features")
+async def get_features(device: str = DEFAULT_DEVICE_ID, start: Optional[float] = None, end: Optional[float] = None,
+                       channels: str = 'cun,guan,chi', session: Optional[str] = None,
+                       username: str = Depends(get_current_user)):
+    """查询录制会话中的心搏特征（幅度、上升时间、半幅宽度、重搏切迹、谐波比）"""
+    try:
+        return await asyncio.to_thread(
+            query_features, device, start, end,
+            [c.strip() for c in channels.split(',') if c.strip()], session
+        )
+    except (ValueError, FileNotFoundError) as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/metrics")
+async def get_metrics(username: str = Depends(get_current_user)):
+    """获取进程资源占用、事件循环延迟和各设备的样本计数，供压测和监控使用"""
+    lags = np.array(loop_lag_samples) * 1000
+    return {
+        "time": time.monotonic(),
+        "process": {
+            "cpu_seconds": time.process_time(),
+            "rss_bytes": process_rss_bytes()
+        },
+        "event_loop_lag_ms": {
+            "samples": len(lags),
+            "p50": float(np.percentile(lags, 50)) if len(lags) else None,
+            "p99": float(np.percentile(lags, 99)) if len(lags) else None,
+            "max": float(lags.max()) if len(lags) else None
+        },
+        "devices": {
+            device_id: {"samples": device.data_buffer.total_samples,
+                        "dropped_batches": device.engine.dropped_batches if device.engine is not None else 0}
+            for device_id, device in device_manager.devices.items()
+        },
+        "clients": broadcaster.client_stats(),
+        "recorder": device_manager.recorder.stats() if device_manager.recorder is not None else None,
+        "analytics": analytics_pool.stats(),
+        "sessions": sessions.stats()
+    }
+
+@app.get("/api/clients")
+async def get_clients(username: str = Depends(get_current_user)):
+    """获取各WebSocket客户端的发送队列深度和丢弃计数"""
+    return broadcaster.client_stats()
+
+# 串口数据广播
+async def broadcast_serial_block(device, block):
+    """把设备处理后的数据块交给广播器，按帧合并后发送给客户端；告警事件立即发送"""
+    for event in block.get('alerts', ()):
+        broadcaster.publish_event(device.device_id, dict(event, stream_id=device.stream_id, device_id=device.device_id))
+    if not broadcaster.has_subscribers(device.device_id):
+        return
+    broadcaster.publish(device.device_id, block,
+                        stream_id=device.stream_id, device_id=device.device_id, sampling_rate=device.sampling_rate,
+                        source='hardware')
+
+async def broadcast_serial_analytics(device, result):
+    """数据块的分析结果到达后立即发送心搏特征事件和频谱列"""
+    if not broadcaster.has_subscribers(device.device_id):
+        return
+    for event in feature_events(result['features'], result['feature_windows']):
+        broadcaster.publish_event(device.device_id, dict(event, stream_id=device.stream_id, device_id=device.device_id))
+    if result['spectrogram'] is not None:
+        broadcaster.publish_spectrogram(device.device_id, result['spectrogram'],
+                                        stream_id=device.stream_id, device_id=device.device_id)
+
+device_manager.add_listener(broadcast_serial_block)
+device_manager.add_analytics_listener(broadcast_serial_analytics)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 与 benchmarks 相同，测试从 tnuix 目录导入 app
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,99 @@
+"""串口采集引擎的端到端测试：通过伪终端对向引擎写入数据，检查交给事件循环的样本批次"""
+import asyncio
+import os
+import time
+
+import numpy as np
+import pytest
+
+pty = pytest.importorskip('pty')
+
+from app.services.acquisition import SerialAcquisitionEngine  # noqa: E402
+from app.services.frame_decoder import BINARY_FRAME_SIZE, encode_binary_frames  # noqa: E402
+
+
+async def collect(engine: SerialAcquisitionEngine, count: int, timeout: float = 5.0) -> np.ndarray:
+    """收集批次直到得到 count 个样本"""
+    batches = []
+    deadline = time.monotonic() + timeout
+    while sum(len(batch) for batch in batches) < count:
+        batch = await asyncio.wait_for(engine.get_batch(), max(deadline - time.monotonic(), 0.01))
+        assert batch is not None, engine.error
+        batches.append(batch)
+    return np.concatenate(batches)
+
+
+def run_engine(protocol: str, chunks, count: int):
+    """打开伪终端对，引擎读从端，向主端逐块写入 chunks，返回收到的样本和引擎"""
+    master, slave = pty.openpty()
+
+    async def scenario():
+        engine = SerialAcquisitionEngine(os.ttyname(slave), protocol=protocol)
+        engine.start()
+        try:
+            for chunk in chunks:
+                os.write(master, chunk)
+                await asyncio.sleep(0.02)
+            return await collect(engine, count), engine
+        finally:
+            engine.stop()
+
+    try:
+        return asyncio.run(scenario())
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def test_ascii_lines_split_across_writes():
+    lines = [b'%.3f,%d,%d,%d,72\n' % (i / 1000, i, 2 * i, 3 * i) for i in range(50)]
+    stream = b''.join(lines[:20]) + b'not,a,number\n' + b'###\n' + b''.join(lines[20:])
+    # 在行中间切开，部分行要等下一次写入才完整
+    chunks = [stream[i:i + 37] for i in range(0, len(stream), 37)]
+    samples, engine = run_engine('ascii', chunks, 50)
+
+    assert samples.shape == (50, 5)
+    np.testing.assert_allclose(samples[:, 0], np.arange(50) / 1000)
+    np.testing.assert_allclose(samples[:, 1:4], np.arange(50)[:, None] * [1, 2, 3])
+    np.testing.assert_allclose(samples[:, 4], 72)
+    assert engine.decoder.invalid_lines == 2
+
+
+def test_binary_frames_with_corrupted_frame():
+    channels = np.column_stack((np.arange(40), np.arange(40) + 0.5, -np.arange(40))).astype(np.float32)
+    stream = bytearray(encode_binary_frames(np.arange(40), channels))
+    # 第 10 帧的 CRC 出错，解码器跳过该帧后重新同步
+    stream[10 * BINARY_FRAME_SIZE + 5] ^= 0xFF
+    chunks = [bytes(stream[i:i + 50]) for i in range(0, len(stream), 50)]
+    samples, engine = run_engine('binary', chunks, 39)
+
+    expected = np.delete(np.arange(40), 10)
+    np.testing.assert_allclose(samples[:, 0] * 1000, expected)
+    np.testing.assert_allclose(samples[:, 1:4], channels[expected])
+    assert engine.decoder.invalid_frames >= 1
+
+
+def test_auto_detects_ascii():
+    stream = b''.join(b'%d,%d,%d\n' % (i, i, i) for i in range(30))
+    samples, engine = run_engine('auto', [stream[:7], stream[7:]], 30)
+
+    assert engine.decoder.protocol == 'ascii'
+    np.testing.assert_allclose(samples[:, 1], np.arange(30))
+
+
+def test_stop_ends_batches():
+    master, slave = pty.openpty()
+
+    async def scenario():
+        engine = SerialAcquisitionEngine(os.ttyname(slave), protocol='ascii')
+        engine.start()
+        await asyncio.sleep(0.05)
+        engine.stop()
+        assert not engine.is_running
+        return await asyncio.wait_for(engine.get_batch(), 2.0)
+
+    try:
+        assert asyncio.run(scenario()) is None
+    finally:
+        os.close(master)
+        os.close(slave)
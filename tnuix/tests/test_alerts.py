@@ -0,0 +1,71 @@
+"""告警分级的测试：回差、最短恢复时间、级别升降和空块"""
+import numpy as np
+
+from app.services.alerts import AlertMonitor, RangeMonitor
+
+RANGES = {'x': {'safe': [0.0, 10.0], 'warning': [-10.0, 20.0]}}
+RATE = 8.0  # 时间戳为 1/8 秒的整数倍，便于精确比较
+
+
+def run(values, block: int = 0):
+    """逐块处理，返回全部事件（类型、级别、时刻）和监视器
+
+    回差为安全范围宽度的 10%：退出告警需回到 [1, 9]（警告范围为 [-9, 19]）内，且距上次越界至少 1 秒。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    timestamps = np.arange(len(values)) / RATE
+    block = block or len(values)
+    target = RangeMonitor(RANGES, hysteresis=0.1, clear_seconds=1.0)
+    events = []
+    for start in range(0, len(values), block):
+        events += target.process(timestamps[start:start + block], values[None, start:start + block])
+    return [(event['event'], event['level'], event['end'] if event['event'] == 'end' else event['start'])
+            for event in events], target
+
+
+def test_jitter_at_threshold_raises_one_alert():
+    events, target = run([5.0] + [10.5, 9.5] * 20)
+    assert events == [('start', 'warning', 0.125)]
+    assert target.active()[0]['peak'] == 10.5
+
+
+def test_recovery_needs_margin():
+    # 9.5 回到了安全范围，但没有进入缩小后的范围
+    events, _ = run([12.0] * 3 + [9.5] * 40)
+    assert events == [('start', 'warning', 0.0)]
+
+
+def test_recovery_needs_clear_time():
+    events, _ = run([12.0] * 3 + [5.0] * 20)
+    assert events == [('start', 'warning', 0.0), ('end', 'warning', 1.25)]
+
+
+def test_escalation_and_step_down():
+    values = [12.0, 25.0, 12.0] + [5.0] * 20
+    events, _ = run(values)
+    assert events == [
+        ('start', 'warning', 0.0),
+        ('end', 'warning', 0.125), ('start', 'danger', 0.125),
+        ('end', 'danger', 1.125), ('start', 'warning', 1.125),
+        ('end', 'warning', 1.25),
+    ]
+    # 分块方式不影响事件
+    for block in (1, 2, 7):
+        assert run(values, block)[0] == events
+
+
+def test_peak_and_nan_hold_state():
+    events, target = run([12.0, 17.0, 11.0] + [np.nan] * 10)
+    assert events == [('start', 'warning', 0.0)]
+    assert target.active()[0]['peak'] == 17.0
+    events, _ = run([12.0] + [np.nan] * 10 + [5.0] * 3)
+    assert events == [('start', 'warning', 0.0), ('end', 'warning', 1.375)]
+
+
+def test_alert_monitor_ignores_empty_blocks():
+    alerts = AlertMonitor()
+    events = alerts.process(np.array([0.0]), np.zeros((3, 1)), 150.0)
+    assert [(event['channel'], event['level']) for event in events] == [('pulse_rate', 'danger')]
+    assert alerts.process(np.zeros(0), np.zeros((3, 0)), 150.0) == []
+    assert alerts.process(np.zeros(0), np.zeros((3, 0)), np.zeros(0)) == []
+    assert len(alerts.active()) == 1 and len(alerts.recent()) == 1
@@ -0,0 +1,113 @@
+"""分析进程池的测试：共享内存环形区分配、工作进程与事件循环内计算结果一致、工作进程退出后重启"""
+import asyncio
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from app.services.analytics import AnalyticsPool, BackgroundAnalytics, InlineAnalytics, SharedRing
+from app.services.simulator import pulse_template
+
+SAMPLING_RATE = 1000.0
+
+
+def pulse_blocks(seconds: int, size: int, offset: int = 0):
+    """从第 offset 秒起按 size 切块的合成脉搏波，每块为 (原始时间戳, 原始数据, 时间戳, 滤波后数据)"""
+    timestamps = offset + np.arange(seconds * int(SAMPLING_RATE)) / SAMPLING_RATE
+    wave = pulse_template(timestamps * 1.2 % 1.0)
+    data = np.vstack([wave, 0.8 * wave, 0.6 * wave])
+    for start in range(0, len(timestamps), size):
+        block = slice(start, start + size)
+        yield timestamps[block], data[:, block], timestamps[block], data[:, block]
+
+
+def assert_same_result(result, expected):
+    for found, wanted in zip(result['beats'], expected['beats']):
+        np.testing.assert_array_equal(found, wanted)
+    np.testing.assert_equal(result['pulse_rate'], expected['pulse_rate'])
+    np.testing.assert_array_equal(result['beat_counts'], expected['beat_counts'])
+    for field in expected['features'].dtype.names:
+        np.testing.assert_array_equal(result['features'][field], expected['features'][field])
+    if expected['spectrogram'] is None:
+        assert result['spectrogram'] is None
+    else:
+        np.testing.assert_array_equal(result['spectrogram']['columns'], expected['spectrogram']['columns'])
+
+
+def test_shared_ring_allocates_in_submission_order():
+    ring = SharedRing(10)
+    assert ring.reserve(4) == 0
+    assert ring.reserve(4) == 4
+    # 末尾只剩 2 列，开头还没有释放
+    assert ring.reserve(4) is None
+    ring.release()
+    # 从开头回绕，回绕后只能用到最早未释放的位置
+    assert ring.reserve(3) == 0
+    assert ring.reserve(2) is None
+    assert ring.reserve(1) == 3
+    for _ in range(3):
+        ring.release()
+    assert ring.reserve(10) == 0
+    assert SharedRing(10).reserve(11) is None
+
+
+def test_pool_matches_inline_and_restarts_exited_worker():
+    if not hasattr(signal, 'SIGKILL'):
+        pytest.skip("需要 SIGKILL")
+    # 环形区 600 列：每块 250 + 250 列放得下，1000 + 1000 列的块随消息发送
+    pool = AnalyticsPool(workers=1, ring_samples=600, timeout=10.0)
+
+    async def scenario():
+        inline = InlineAnalytics(SAMPLING_RATE, SAMPLING_RATE)
+        remote = pool.client('dev/0', SAMPLING_RATE, SAMPLING_RATE)
+        for block in list(pulse_blocks(4, 250)) + list(pulse_blocks(1, 1000, offset=4)):
+            assert_same_result(await remote.process(*block), await inline.process(*block))
+        assert pool.stats()['shared_blocks'] == 16 and pool.stats()['pickled_blocks'] == 1
+
+        worker = pool.stats()['workers'][0]
+        os.kill(worker['pid'], signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        while pool.stats()['restarts'] == 0 or not pool.stats()['workers'][0]['alive']:
+            assert time.monotonic() < deadline, "工作进程没有重启"
+            await asyncio.sleep(0.05)
+        assert pool.stats()['workers'][0]['pid'] != worker['pid']
+        # 重启后重新创建了该数据流的分析状态
+        inline = InlineAnalytics(SAMPLING_RATE, SAMPLING_RATE)
+        for block in pulse_blocks(3, 500, offset=5):
+            assert_same_result(await remote.process(*block), await inline.process(*block))
+        remote.close()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.stop()
+    assert pool.stats()['workers'] == []
+
+
+def test_background_analytics_delivers_in_order_and_skips_backlog():
+    async def scenario():
+        analytics = BackgroundAnalytics(InlineAnalytics(SAMPLING_RATE, SAMPLING_RATE), max_pending=4)
+        delivered = []
+
+        async def on_result(result):
+            delivered.append(result['spectrogram'] is not None)
+
+        blocks = list(pulse_blocks(5, 500))
+        submitted = [analytics.submit(*block, on_result=on_result) for block in blocks]
+        await analytics.drain()
+        # 提交时还没有任务完成，超过 max_pending 的数据块不分析
+        assert submitted == [True] * 4 + [False] * 6 and analytics.skipped == 6
+        assert len(delivered) == 4
+        for block in blocks[4:]:
+            assert analytics.submit(*block, on_result=on_result)
+            await analytics.drain()
+        beats = analytics.take_beats()
+        assert all(len(times) >= 4 for times in beats)
+        assert all(len(times) == 0 for times in analytics.take_beats())
+        assert analytics.pulse_rate == 72.0
+        assert analytics.stats() == {"pending": 0, "failed": 0, "skipped": 6}
+        analytics.close()
+
+    asyncio.run(scenario())
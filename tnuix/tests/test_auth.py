@@ -0,0 +1,105 @@
+"""SessionStore 的测试：滑动过期、后台清理、容量上限和堆重建（使用可控的时钟）"""
+import pytest
+
+from app.services import auth
+from app.services.auth import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(auth, 'time', fake)
+    return fake
+
+
+def store(max_count: int = 100) -> SessionStore:
+    return SessionStore(expiry=100.0, refresh_interval=10.0, max_count=max_count)
+
+
+def test_session_expires_without_access(clock):
+    sessions = store()
+    session_id = sessions.create('admin')
+    clock.now += 100
+    assert sessions.get(session_id) == 'admin'
+    clock.now += 101
+    assert sessions.get(session_id) is None
+    assert session_id not in sessions and sessions.expired == 1
+
+
+def test_access_slides_expiry_in_batches(clock):
+    sessions = store()
+    session_id = sessions.create('admin')
+    clock.now += 95
+    assert sessions.get(session_id) == 'admin'
+    clock.now += 50
+    # 访问时间在 sweep 时才写入过期时间
+    assert sessions.stats()['pending_refreshes'] == 1
+    assert sessions.sweep() == 0 and sessions.stats()['pending_refreshes'] == 0
+    assert sessions.get(session_id) == 'admin'
+    clock.now += 101
+    assert sessions.sweep() == 1 and len(sessions) == 0
+
+
+def test_sweep_removes_expired_sessions_never_seen_again(clock):
+    sessions = store()
+    ids = [sessions.create(f"user{i}") for i in range(5)]
+    clock.now += 50
+    kept = sessions.create('late')
+    clock.now += 60
+    assert sessions.sweep() == 5
+    assert all(session_id not in sessions for session_id in ids) and kept in sessions
+
+
+def test_full_store_removes_expired_before_evicting(clock):
+    sessions = store(max_count=3)
+    first = sessions.create('a')
+    clock.now += 1
+    second, third = sessions.create('b'), sessions.create('c')
+    # 已满：淘汰最早过期的会话
+    fourth = sessions.create('d')
+    assert first not in sessions and sessions.evicted == 1 and len(sessions) == 3
+    clock.now += 50
+    assert sessions.get(fourth) == 'd'
+    clock.now += 60
+    # 已满但有过期会话时只清理过期会话，刷新过的会话保留
+    fifth = sessions.create('e')
+    assert sessions.evicted == 1 and sessions.expired == 2
+    assert second not in sessions and third not in sessions
+    assert fourth in sessions and fifth in sessions
+
+
+def test_refreshed_session_is_not_evicted_first(clock):
+    sessions = store(max_count=2)
+    first = sessions.create('a')
+    clock.now += 20
+    second = sessions.create('b')
+    clock.now += 20
+    sessions.get(first)
+    sessions.create('c')
+    # first 刷新后比 second 晚过期
+    assert first in sessions and second not in sessions
+
+
+def test_heap_is_rebuilt_when_stale_entries_pile_up(clock):
+    sessions = store()
+    session_id = sessions.create('admin')
+    for _ in range(500):
+        clock.now += 10
+        assert sessions.get(session_id) == 'admin'
+        sessions.sweep()
+    assert sessions.stats()['heap_entries'] <= 2 * len(sessions) + 65
+
+
+def test_remove(clock):
+    sessions = store()
+    session_id = sessions.create('admin')
+    sessions.remove(session_id)
+    assert sessions.get(session_id) is None and len(sessions) == 0
@@ -0,0 +1,66 @@
+"""BeatDetector 的测试：合成脉搏波的心搏时刻和脉率"""
+import numpy as np
+
+from app.services.beat_detector import BeatDetector
+from app.services.simulator import pulse_template
+
+SAMPLING_RATE = 1000.0
+
+
+def pulse_wave(seconds: float, rate: float, mains: float = 0.0):
+    """三个通道相同的合成脉搏波，可叠加 50 Hz 工频干扰"""
+    timestamps = np.arange(int(seconds * SAMPLING_RATE)) / SAMPLING_RATE
+    wave = pulse_template((timestamps * rate / 60.0) % 1.0) + mains * np.sin(2 * np.pi * 50 * timestamps)
+    return timestamps, np.vstack([wave, 0.8 * wave, 0.6 * wave])
+
+
+def detect(timestamps: np.ndarray, block: np.ndarray, sizes):
+    """按 sizes 循环切块处理，返回各通道的全部心搏和最后的脉率"""
+    detector = BeatDetector(SAMPLING_RATE)
+    beats = [[] for _ in range(3)]
+    start = 0
+    for size in np.resize(sizes, len(timestamps)):
+        found, rate = detector.process(timestamps[start:start + size], block[:, start:start + size])
+        for channel, times in enumerate(found):
+            beats[channel].extend(times)
+        start += size
+        if start >= len(timestamps):
+            break
+    return [np.array(times) for times in beats], rate, detector
+
+
+def test_detects_every_beat_and_rate():
+    timestamps, block = pulse_wave(12.0, 75.0, mains=0.2)
+    beats, rate, detector = detect(timestamps, block, [250])
+    assert rate == 75.0
+    # 阈值预热后每个心动周期一个心搏，间期为 0.8 秒，重搏波不会被当成心搏
+    for times in beats:
+        assert 13 <= len(times) <= 15
+        np.testing.assert_allclose(np.diff(times[1:]), 0.8, atol=0.005)
+    assert detector.beat_counts.tolist() == [len(times) for times in beats]
+
+
+def test_block_size_does_not_change_beats():
+    timestamps, block = pulse_wave(6.0, 90.0)
+    whole, _, _ = detect(timestamps, block, [len(timestamps)])
+    pieces, _, _ = detect(timestamps, block, [1, 0, 7, 333, 64])
+    for a, b in zip(whole, pieces):
+        np.testing.assert_allclose(a, b, atol=1e-9)
+
+
+def test_rate_invalid_without_recent_beats():
+    detector = BeatDetector(SAMPLING_RATE)
+    timestamps, block = pulse_wave(5.0, 60.0)
+    assert detector.process(timestamps, block)[1] == 60.0
+    # 信号消失超过 BEAT_TIMEOUT 后脉率无效
+    flat = np.repeat(block[:, -1:], 4000, axis=1)
+    beats, rate = detector.process(5.0 + np.arange(4000) / SAMPLING_RATE, flat)
+    assert all(len(times) == 0 for times in beats) and np.isnan(rate)
+
+
+def test_empty_block_and_flat_signal():
+    detector = BeatDetector(SAMPLING_RATE)
+    beats, rate = detector.process(np.zeros(0), np.zeros((3, 0)))
+    assert all(len(times) == 0 for times in beats) and np.isnan(rate)
+    beats, rate = detector.process(np.arange(2000) / SAMPLING_RATE, np.ones((3, 2000)))
+    assert all(len(times) == 0 for times in beats) and np.isnan(rate)
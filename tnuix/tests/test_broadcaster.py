@@ -0,0 +1,91 @@
+"""客户端发送队列的测试：慢客户端的丢弃策略，事件和控制消息不丢弃且优先发送"""
+import asyncio
+
+import pytest
+
+from app.services.broadcaster import ClientConnection
+
+
+class FakeWebSocket:
+    """只记录发送内容的 WebSocket，release 之前发送一直阻塞"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.release = asyncio.Event()
+
+    async def send_text(self, message: str):
+        await self.release.wait()
+        self.sent.append(message)
+
+    async def send_bytes(self, message: bytes):
+        await self.send_text(message)
+
+    async def close(self):
+        self.closed = True
+
+
+async def flush(websocket: FakeWebSocket):
+    websocket.release.set()
+    for _ in range(50):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.parametrize('policy, expected', [
+    ('drop_oldest', ['d2', 'd3', 'd4']),
+    ('latest', ['d3', 'd4']),
+])
+def test_full_data_queue_policies(policy, expected):
+    async def scenario():
+        websocket = FakeWebSocket()
+        client = ClientConnection(websocket, queue_size=3, policy=policy, send_timeout=5.0)
+        for index in range(5):
+            client.enqueue(f"d{index}")
+        client.start()
+        await flush(websocket)
+        await client.close()
+        return websocket, client
+
+    websocket, client = asyncio.run(scenario())
+    assert websocket.sent == expected
+    assert client.dropped == 5 - len(expected)
+
+
+def test_control_messages_are_never_dropped_and_sent_first():
+    async def scenario():
+        websocket = FakeWebSocket()
+        client = ClientConnection(websocket, queue_size=2, policy='latest', send_timeout=5.0)
+        client.start()
+        await asyncio.sleep(0)
+        client.enqueue('d0')
+        await asyncio.sleep(0)
+        # d0 正在发送，之后的数据被丢弃，告警事件全部保留并先于数据发送
+        for index in range(1, 6):
+            client.enqueue(f"d{index}")
+            client.enqueue(f"e{index}", control=True)
+        await flush(websocket)
+        await client.close()
+        return websocket, client
+
+    websocket, client = asyncio.run(scenario())
+    assert websocket.sent == ['d0', 'e1', 'e2', 'e3', 'e4', 'e5', 'd5']
+    assert client.dropped == 4
+
+
+def test_control_backlog_disconnects_client():
+    async def scenario():
+        websocket = FakeWebSocket()
+        client = ClientConnection(websocket, control_queue_size=3, send_timeout=5.0)
+        for index in range(4):
+            client.enqueue(f"e{index}", control=True)
+        await asyncio.sleep(0)
+        client.enqueue('late', control=True)
+        return websocket, client
+
+    websocket, client = asyncio.run(scenario())
+    assert client.closed and websocket.closed and websocket.sent == []
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        ClientConnection(FakeWebSocket(), policy='block')
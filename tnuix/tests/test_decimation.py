@@ -0,0 +1,41 @@
+"""MinMaxDecimator 的测试：分桶的最小/最大值、跨块的未收满桶和稀疏数据"""
+import numpy as np
+
+from app.services.decimation import MinMaxDecimator
+
+
+def test_buckets_keep_extremes_in_order():
+    decimator = MinMaxDecimator(0.01)
+    timestamps = np.arange(30) / 1000.0
+    data = np.zeros((2, 30))
+    data[0, 3], data[0, 7] = 5.0, -4.0    # 第一个桶：先最大后最小
+    data[1, 12], data[1, 15] = -2.0, 3.0  # 第二个桶：先最小后最大
+    out_timestamps, out, decimated = decimator.process(timestamps, data)
+    assert decimated
+    # 最后一个桶留到下一块
+    np.testing.assert_allclose(out_timestamps, [0.0, 0.005, 0.01, 0.015])
+    np.testing.assert_array_equal(out[0], [5.0, -4.0, 0.0, 0.0])
+    np.testing.assert_array_equal(out[1], [0.0, 0.0, -2.0, 3.0])
+
+
+def test_partial_bucket_carried_to_next_block():
+    decimator = MinMaxDecimator(0.01)
+    timestamps = np.arange(40) / 1000.0
+    data = np.sin(np.arange(40))[None, :]
+    whole = decimator.process(timestamps, data)[1]
+    decimator = MinMaxDecimator(0.01)
+    parts = [decimator.process(timestamps[a:b], data[:, a:b])[1] for a, b in ((0, 5), (5, 25), (25, 40))]
+    # 分块处理与整块处理输出相同的桶
+    np.testing.assert_array_equal(np.hstack(parts), whole)
+    assert whole.shape == (1, 6)
+
+
+def test_sparse_and_empty_data_pass_through():
+    decimator = MinMaxDecimator(0.01)
+    timestamps = np.array([0.0, 0.05, 0.1])
+    data = np.array([[1.0, 2.0, 3.0]])
+    out_timestamps, out, decimated = decimator.process(timestamps, data)
+    assert not decimated
+    np.testing.assert_array_equal(out, data)
+    out_timestamps, out, decimated = decimator.process(np.zeros(0), np.zeros((1, 0)))
+    assert not decimated and out.shape == (1, 0)
@@ -0,0 +1,79 @@
+"""PulseFeatureExtractor 的测试：合成脉搏波的逐心搏特征、分块处理和窗口统计"""
+import numpy as np
+
+from app.services.features import FEATURE_DTYPE, PulseFeatureExtractor, feature_events, json_values
+from app.services.simulator import pulse_template
+
+SAMPLING_RATE = 1000.0
+
+
+def pulse_block(seconds: int):
+    """60 次/分的合成脉搏波（关为寸的一半幅度），以及每个周期上升支上的心搏起点"""
+    timestamps = np.arange(int(seconds * SAMPLING_RATE)) / SAMPLING_RATE
+    wave = pulse_template(timestamps % 1.0)
+    onsets = np.arange(seconds) + 0.1
+    return timestamps, np.vstack([wave, 0.5 * wave, wave]), onsets
+
+
+def split_beats(onsets: np.ndarray, timestamps: np.ndarray):
+    """本块时间范围内的心搏"""
+    return onsets[(onsets >= timestamps[0]) & (onsets <= timestamps[-1])]
+
+
+def test_features_of_synthetic_pulse():
+    timestamps, block, onsets = pulse_block(6)
+    extractor = PulseFeatureExtractor(SAMPLING_RATE)
+    features = extractor.process(timestamps, block, [onsets, onsets, onsets[:0]])
+    # 第一个心搏只确定了起点，之后每个心搏完成上一个心搏
+    assert features.dtype == FEATURE_DTYPE and len(features) == 10
+    cun = features[features['channel'] == 0]
+    guan = features[features['channel'] == 1]
+    np.testing.assert_allclose(cun['duration'], 1.0, atol=0.002)
+    np.testing.assert_allclose(cun['rise_time'], 0.15, atol=0.003)
+    np.testing.assert_allclose(cun['amplitude'], 0.98, atol=0.01)
+    np.testing.assert_allclose(guan['amplitude'], cun['amplitude'] / 2, rtol=1e-5)
+    # 合成波形有重搏切迹，幅度比与幅度无关
+    assert np.all((cun['notch_depth'] > 0.25) & (cun['notch_depth'] < 0.35))
+    np.testing.assert_allclose(guan['harmonics'], cun['harmonics'], rtol=1e-5)
+    assert extractor.beat_counts.tolist() == [5, 5, 0]
+
+
+def test_block_size_does_not_change_features():
+    timestamps, block, onsets = pulse_block(6)
+    whole = PulseFeatureExtractor(SAMPLING_RATE).process(timestamps, block, [onsets] * 3)
+    extractor = PulseFeatureExtractor(SAMPLING_RATE)
+    parts = []
+    for start in range(0, len(timestamps), 77):
+        piece = slice(start, start + 77)
+        beats = split_beats(onsets, timestamps[piece])
+        parts.append(extractor.process(timestamps[piece], block[:, piece], [beats] * 3))
+    parts = np.concatenate(parts)
+    order = np.lexsort((whole['channel'], whole['onset']))
+    np.testing.assert_array_equal(np.sort(parts, order=['onset', 'channel']), whole[order])
+
+
+def test_out_of_range_intervals_and_empty_blocks():
+    timestamps, block, onsets = pulse_block(6)
+    extractor = PulseFeatureExtractor(SAMPLING_RATE)
+    empty = extractor.process(np.zeros(0), np.zeros((3, 0)), [np.zeros(0)] * 3)
+    assert len(empty) == 0
+    # 间隔 3 秒超出有效心搏间期，不产生特征
+    sparse = np.array([0.1, 3.1])
+    assert len(extractor.process(timestamps, block, [sparse] * 3)) == 0
+
+
+def test_window_summary_and_events():
+    timestamps, block, onsets = pulse_block(6)
+    extractor = PulseFeatureExtractor(SAMPLING_RATE)
+    features = extractor.process(timestamps, block, [onsets, onsets[:0], onsets[:0]])
+    summary = extractor.window_summary(0)
+    assert summary['beats'] == 5 and summary['duration_sd'] < 0.001
+    assert len(summary['harmonics']) == FEATURE_DTYPE['harmonics'].shape[0]
+    assert extractor.window_summary(1) == {"beats": 0}
+    events = feature_events(features, extractor.window_summaries([0]))
+    assert [event['channel'] for event in events] == ['cun']
+    assert len(events[0]['beats']) == 5 and events[0]['window'] == summary
+
+
+def test_json_values_replaces_non_finite():
+    assert json_values([1.23456, np.nan, np.inf, -2.0]) == [1.2346, None, None, -2.0]
@@ -0,0 +1,114 @@
+"""流式滤波的测试：分块滤波与整段滤波结果一致，滤波链的抽取相位和运行中修改"""
+import numpy as np
+import pytest
+from scipy import signal
+
+from app.services.filters import FilterChain, StreamingFilter, notch_sos
+
+DECIMATE_CHAIN = [{"type": "notch"}, {"type": "decimate", "factor": 4}]
+
+
+def test_streaming_notch_matches_one_shot_filter():
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(3, 1000)) + 2.0
+    sos = notch_sos(50.0, 30.0, 1000.0)
+    zi = signal.sosfilt_zi(sos)[:, None, :] * data[:, 0][None, :, None]
+    expected = signal.sosfilt(sos, data, axis=1, zi=zi)[0]
+    streaming = StreamingFilter(sos)
+    # 不规则的块大小，包括单样本和空块
+    bounds = [0, 1, 1, 17, 300, 301, 650, 1000]
+    filtered = np.hstack([streaming.process(data[:, a:b]) for a, b in zip(bounds, bounds[1:])])
+    np.testing.assert_allclose(filtered, expected, atol=1e-12)
+
+
+def test_streaming_notch_removes_mains_without_start_transient():
+    t = np.arange(2000) / 1000.0
+    data = np.vstack([1.0 + np.sin(2 * np.pi * 50 * t)] * 3)
+    notch = StreamingFilter.notch()
+    filtered = np.hstack([notch.process(block) for block in np.split(data, 20, axis=1)])
+    # 预热后直流分量从第一个样本起就保持，50 Hz 分量逐渐衰减
+    assert abs(filtered[0, 0] - data[0, 0]) < 1e-9
+    assert np.abs(filtered[:, -500:] - 1.0).max() < 0.05
+
+
+def test_reset_rewarms_from_next_block():
+    streaming = StreamingFilter.notch()
+    streaming.process(np.zeros((3, 100)))
+    streaming.reset()
+    np.testing.assert_allclose(streaming.process(np.full((3, 5), 3.0)), 3.0)
+
+
+def run_chain(chain: FilterChain, data: np.ndarray, bounds):
+    """按 bounds 切块处理，返回拼接的输出和保留的样本下标"""
+    outputs, kept = [], []
+    for a, b in zip(bounds, bounds[1:]):
+        filtered, keep = chain.process(data[:, a:b])
+        outputs.append(filtered)
+        kept.append(np.arange(a, b)[keep])
+    return np.hstack(outputs), np.concatenate(kept)
+
+
+def test_decimation_phase_continues_across_blocks():
+    data = np.random.default_rng(1).normal(size=(3, 1000))
+    chain = FilterChain(DECIMATE_CHAIN, 1000.0)
+    assert chain.decimation == 4 and chain.output_rate == 250.0
+    whole, kept = run_chain(chain, data, [0, 1000])
+    np.testing.assert_array_equal(kept, np.arange(0, 1000, 4))
+    chain = FilterChain(DECIMATE_CHAIN, 1000.0)
+    # 单样本、空块和不是 4 的倍数的块
+    parts, kept = run_chain(chain, data, [0, 1, 1, 2, 3, 10, 11, 500, 503, 1000])
+    np.testing.assert_array_equal(kept, np.arange(0, 1000, 4))
+    np.testing.assert_allclose(parts, whole, atol=1e-12)
+
+
+def test_blocks_shorter_than_factor_may_keep_nothing():
+    chain = FilterChain(DECIMATE_CHAIN, 1000.0)
+    sizes = [chain.process(np.ones((3, 1)))[0].shape[1] for _ in range(8)]
+    assert sizes == [1, 0, 0, 0, 1, 0, 0, 0]
+    chain.reset()
+    assert chain.process(np.ones((3, 1)))[0].shape == (3, 1)
+
+
+def test_configure_some_channels_keeps_others_untouched():
+    data = np.random.default_rng(2).normal(size=(3, 600))
+    reference = FilterChain([{"type": "notch"}], 1000.0)
+    chain = FilterChain([{"type": "notch"}], 1000.0)
+    expected, _ = run_chain(reference, data, [0, 300, 600])
+    first, _ = chain.process(data[:, :300])
+    chain.configure([{"type": "lowpass", "cutoff": 40}], channels=[1])
+    second, _ = chain.process(data[:, 300:])
+    np.testing.assert_allclose(np.hstack((first, second))[[0, 2]], expected[[0, 2]], atol=1e-12)
+    assert not np.allclose(second[1], expected[1, 300:])
+    assert chain.stages[1] == [{"type": "lowpass", "cutoff": 40}]
+    assert chain.stages[0] == [{"type": "notch"}]
+
+
+def test_configure_keeps_decimation():
+    chain = FilterChain(DECIMATE_CHAIN, 1000.0)
+    chain.process(np.ones((3, 3)))
+    chain.configure([{"type": "lowpass", "cutoff": 40}])
+    assert chain.stages[0][-1] == {"type": "decimate", "factor": 4}
+    # 修改滤波链不改变抽取相位
+    assert chain.process(np.ones((3, 2)))[0].shape[1] == 1
+    with pytest.raises(ValueError):
+        chain.configure([{"type": "decimate", "factor": 2}])
+
+
+@pytest.mark.parametrize('stages', [
+    [{"type": "decimate", "factor": 2}, {"type": "notch"}],
+    [{"type": "decimate", "factor": 1}],
+    [{"type": "notch", "freq": 600}],
+    [{"type": "lowpass"}],
+    [{"type": "unknown"}],
+    ["notch"],
+])
+def test_invalid_chains_are_refused(stages):
+    with pytest.raises(ValueError):
+        FilterChain(stages, 1000.0)
+
+
+def test_configure_rejects_unknown_channel_without_changes():
+    chain = FilterChain([{"type": "notch"}], 1000.0)
+    with pytest.raises(ValueError):
+        chain.configure([{"type": "lowpass", "cutoff": 40}], channels=[3])
+    assert chain.stages[0] == [{"type": "notch"}]
@@ -0,0 +1,143 @@
+"""串口帧解码器的单元测试"""
+import numpy as np
+import pytest
+
+from app.core.config import SAMPLING_RATE, SERIAL_MAX_PARTIAL_FRAME
+from app.services.frame_decoder import (
+    BINARY_FRAME_SIZE, AutoFrameDecoder, BinaryFrameDecoder, LineFrameDecoder, create_frame_decoder,
+    detect_protocol, encode_binary_frames, parse_sample_lines
+)
+
+
+def binary_stream(seq, pulse_rate=None) -> bytes:
+    seq = np.asarray(seq)
+    channels = np.column_stack((seq, seq * 2, seq * -1.5)).astype(np.float32)
+    return encode_binary_frames(seq, channels, pulse_rate)
+
+
+def test_parse_mixed_formats():
+    lines = [b'1,2,3', b'0.5,4,5,6', b'0.6,7,8,9,72']
+    samples, bad_lines = parse_sample_lines(lines, first_index=10)
+    assert bad_lines == []
+    np.testing.assert_allclose(samples, [
+        [10 / SAMPLING_RATE, 1, 2, 3, np.nan],
+        [0.5, 4, 5, 6, np.nan],
+        [0.6, 7, 8, 9, 72]
+    ])
+
+
+def test_parse_reports_bad_lines_by_index():
+    lines = [b'1,2,3', b'oops', b'1,2', b'4,five,6', b'7,8,9', b'']
+    samples, bad_lines = parse_sample_lines(lines)
+    assert bad_lines == [1, 2, 3, 5]
+    np.testing.assert_allclose(samples[:, 1:4], [[1, 2, 3], [7, 8, 9]])
+    # 坏行不占用样本序号，无时间戳的行按有效样本的序号生成时间戳
+    np.testing.assert_allclose(samples[:, 0], [0, 1 / SAMPLING_RATE])
+
+
+def test_parse_all_bad_or_empty():
+    samples, bad_lines = parse_sample_lines([b'a,b,c', b'x'])
+    assert samples.shape == (0, 5)
+    assert bad_lines == [0, 1]
+    samples, bad_lines = parse_sample_lines([])
+    assert samples.shape == (0, 5) and bad_lines == []
+
+
+def test_line_decoder_keeps_partial_line():
+    decoder = LineFrameDecoder()
+    assert decoder.feed(b'0.001,1,2,3,7') is None
+    samples = decoder.feed(b'0\n0.002,4,5,6,71\n0.003,7,')
+    np.testing.assert_allclose(samples, [[0.001, 1, 2, 3, 70], [0.002, 4, 5, 6, 71]])
+    samples = decoder.feed(b'8,9\n')
+    np.testing.assert_allclose(samples[:, :4], [[0.003, 7, 8, 9]])
+    assert np.isnan(samples[0, 4])
+    assert decoder.sample_count == 3
+
+
+def test_line_decoder_handles_crlf_and_bad_lines():
+    decoder = LineFrameDecoder()
+    samples = decoder.feed(b'1,2,3\r\n\r\ngarbage\r\n4,x,6\r\n7,8,9\r\n')
+    np.testing.assert_allclose(samples[:, 1:4], [[1, 2, 3], [7, 8, 9]])
+    assert decoder.invalid_lines == 2
+
+
+def test_line_decoder_timestamps_continue_across_feeds():
+    decoder = LineFrameDecoder()
+    decoder.feed(b'1,1,1\n2,2,2\n')
+    samples = decoder.feed(b'3,3,3\n')
+    np.testing.assert_allclose(samples[:, 0], [2 / SAMPLING_RATE])
+
+
+def test_line_decoder_discards_overlong_partial_line():
+    decoder = LineFrameDecoder()
+    assert decoder.feed(b'x' * (SERIAL_MAX_PARTIAL_FRAME + 1)) is None
+    # 丢弃后从下一行重新开始
+    samples = decoder.feed(b'\n1,2,3\n')
+    np.testing.assert_allclose(samples[:, 1:4], [[1, 2, 3]])
+
+
+def test_line_decoder_reset():
+    decoder = LineFrameDecoder()
+    decoder.feed(b'1,2,3\n4,5')
+    decoder.reset()
+    samples = decoder.feed(b'6,7,8\n')
+    np.testing.assert_allclose(samples, [[0, 6, 7, 8, np.nan]])
+    assert decoder.sample_count == 1
+
+
+def test_binary_decoder_round_trip_byte_by_byte():
+    decoder = BinaryFrameDecoder()
+    stream = binary_stream(np.arange(5), pulse_rate=np.full(5, 66.0))
+    batches = [decoder.feed(stream[i:i + 1]) for i in range(len(stream))]
+    samples = np.concatenate([batch for batch in batches if batch is not None])
+    np.testing.assert_allclose(samples[:, 0], np.arange(5) / SAMPLING_RATE)
+    np.testing.assert_allclose(samples[:, 1:4], np.column_stack((np.arange(5), np.arange(5) * 2, np.arange(5) * -1.5)))
+    np.testing.assert_allclose(samples[:, 4], 66.0)
+
+
+def test_binary_decoder_without_pulse_rate():
+    samples = BinaryFrameDecoder().feed(binary_stream([0, 1]))
+    assert np.isnan(samples[:, 4]).all()
+
+
+def test_binary_decoder_resyncs_after_garbage_and_bad_crc():
+    decoder = BinaryFrameDecoder()
+    stream = bytearray(binary_stream(np.arange(6)))
+    stream[2 * BINARY_FRAME_SIZE + 4] ^= 0x01
+    samples = decoder.feed(b'\x00\x13junk' + bytes(stream))
+    np.testing.assert_allclose(samples[:, 0] * SAMPLING_RATE, [0, 1, 3, 4, 5])
+    assert decoder.invalid_frames >= 1
+
+
+def test_binary_decoder_unwraps_sequence_and_keeps_gaps():
+    decoder = BinaryFrameDecoder()
+    first = decoder.feed(binary_stream([65534, 65535]))
+    # 序号回绕，并且丢了 1 帧
+    second = decoder.feed(binary_stream([0, 2]))
+    timestamps = np.concatenate((first[:, 0], second[:, 0])) * SAMPLING_RATE
+    np.testing.assert_allclose(timestamps, [65534, 65535, 65536, 65538])
+
+
+def test_detect_protocol():
+    assert detect_protocol(binary_stream(np.arange(3))) == 'binary'
+    assert detect_protocol(b'1,2,3\n4,5,6\n') == 'ascii'
+    assert detect_protocol(b'1,2,3') is None
+    assert detect_protocol(binary_stream(np.arange(2))) is None
+
+
+def test_auto_decoder_picks_binary():
+    decoder = AutoFrameDecoder()
+    stream = binary_stream(np.arange(10))
+    assert decoder.feed(stream[:BINARY_FRAME_SIZE]) is None
+    samples = decoder.feed(stream[BINARY_FRAME_SIZE:])
+    assert decoder.protocol == 'binary'
+    assert len(samples) == 10
+    assert decoder.sample_count == 10
+
+
+def test_create_frame_decoder():
+    assert isinstance(create_frame_decoder('ascii'), LineFrameDecoder)
+    assert isinstance(create_frame_decoder('binary'), BinaryFrameDecoder)
+    assert isinstance(create_frame_decoder('auto'), AutoFrameDecoder)
+    with pytest.raises(ValueError):
+        create_frame_decoder('csv')
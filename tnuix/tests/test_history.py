@@ -0,0 +1,97 @@
+"""历史数据查询的测试：增量构建的金字塔与按时间跨度选择分辨率"""
+import numpy as np
+import pytest
+
+from app.services.history import query_history
+from app.services.pyramid import PYRAMID_DTYPE, PyramidBuilder, combine_summaries, level_path, summarize_samples
+from app.services.recorder import RecordingSession, make_records, open_records
+
+SAMPLING_RATE = 1000.0
+
+
+def signal_block(count: int):
+    timestamps = np.arange(count) / SAMPLING_RATE
+    data = np.vstack([np.sin(2 * np.pi * frequency * timestamps) for frequency in (1.0, 3.0, 7.0)])
+    return timestamps, data
+
+
+def test_incremental_pyramid_matches_one_shot_summary(tmp_path):
+    timestamps, data = signal_block(1234)
+    builder = PyramidBuilder(str(tmp_path), factors=(10, 100))
+    # 不规则的块大小，包括空块和跨越多个桶的块
+    bounds = [0, 3, 3, 250, 999, 1234]
+    for a, b in zip(bounds, bounds[1:]):
+        builder.append(timestamps[a:b], data[:, a:b].T.astype(np.float32))
+    builder.close()
+    level_10 = open_records(level_path(str(tmp_path), 10), PYRAMID_DTYPE)
+    level_100 = open_records(level_path(str(tmp_path), 100), PYRAMID_DTYPE)
+    expected = summarize_samples(timestamps[:1230], data[:, :1230].T.astype(np.float32), 10)
+    assert len(level_10) == 123 and len(level_100) == 12
+    for level, summary in ((level_10, expected), (level_100, combine_summaries(expected[:120], 10))):
+        for field in ('timestamp', 'min', 'max'):
+            np.testing.assert_array_equal(level[field], summary[field])
+        np.testing.assert_allclose(level['mean'], summary['mean'], rtol=1e-5)
+
+
+def test_pyramid_factors_must_divide():
+    with pytest.raises(ValueError):
+        PyramidBuilder('unused', factors=(10, 25))
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    """在 tmp_path/recordings 下录制 20 秒的会话，分块 500 个样本，金字塔使用默认的各层倍数"""
+    root = str(tmp_path / 'recordings')
+    timestamps, data = signal_block(20000)
+    session = RecordingSession(root, 'dev', 'session', 500, SAMPLING_RATE)
+    session.open()
+    for start in range(0, 20000, 730):
+        block = slice(start, start + 730)
+        session.append(make_records(timestamps[block], data[:, block], data[:, block]))
+    session.close()
+    return root, timestamps, data
+
+
+def test_query_uses_coarsest_level_with_enough_points(recorded):
+    root, timestamps, data = recorded
+    result = query_history('dev', points=100, root=root)
+    # 20000 个样本：100 倍的层有 200 个桶，合并为 100 个每桶 200 个样本
+    assert result['level'] == 100 and result['bucket_seconds'] == pytest.approx(0.2)
+    assert len(result['timestamp']) == 100
+    groups = data.reshape(3, 100, 200)
+    np.testing.assert_allclose(result['guan']['min'], groups[1].min(axis=1), atol=1e-4)
+    np.testing.assert_allclose(result['guan']['max'], groups[1].max(axis=1), atol=1e-4)
+    np.testing.assert_allclose(result['chi']['mean'], groups[2].mean(axis=1), atol=1e-4)
+
+
+def test_short_span_reads_raw_chunks(recorded):
+    root, timestamps, data = recorded
+    # 跨越分块边界（第 1000 个样本）的 50 毫秒
+    result = query_history('dev', start=0.98, end=1.03, channels=['cun'], points=1000, root=root)
+    assert result['level'] == 1 and 'guan' not in result
+    np.testing.assert_allclose(result['timestamp'], timestamps[980:1031])
+    np.testing.assert_allclose(result['cun']['max'], data[0, 980:1031], atol=1e-4)
+
+
+def test_query_errors(recorded):
+    root = recorded[0]
+    with pytest.raises(ValueError):
+        query_history('dev', channels=['pulse'], root=root)
+    with pytest.raises(FileNotFoundError):
+        query_history('missing', root=root)
+    with pytest.raises(ValueError):
+        query_history('../dev', root=root)
+
+
+def test_history_endpoint(recorded, tmp_path, monkeypatch):
+    fastapi_testclient = pytest.importorskip('fastapi.testclient')
+    import main
+
+    # 接口查询相对工作目录的 recordings/
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_current_user, lambda: 'admin')
+    client = fastapi_testclient.TestClient(main.app)
+    result = client.get('/api/history', params={'device': 'dev', 'channels': 'cun, chi', 'points': 50}).json()
+    assert result['status'] == 'success' and len(result['timestamp']) == 50
+    assert 'guan' not in result and len(result['chi']['mean']) == 50
+    assert client.get('/api/history', params={'device': 'missing'}).json()['status'] == 'error'
@@ -0,0 +1,55 @@
+"""录制器的测试：写线程按会话追加分块文件，写满后轮换"""
+import json
+import os
+
+import numpy as np
+
+from app.services.recorder import (
+    SESSION_FILE, TIME_INDEX_FILE, Recorder, chunk_path, open_chunk, open_records
+)
+
+
+def sample_block(start: int, count: int, sampling_rate: float = 1000.0):
+    timestamps = np.arange(start, start + count) / sampling_rate
+    raw = np.vstack([timestamps, timestamps * 2, timestamps * 3])
+    return timestamps, raw, raw + 1
+
+
+def test_blocks_rotate_into_fixed_size_chunks(tmp_path):
+    recorder = Recorder(str(tmp_path), chunk_samples=100, commit_interval=0.01)
+    session_id = recorder.open_session('dev', 1000.0)
+    start = 0
+    for count in (30, 0, 120, 1, 99, 7):
+        recorder.write('dev', *sample_block(start, count))
+        start += count
+    # 没有在录制的设备被忽略
+    recorder.write('other', *sample_block(0, 10))
+    recorder.stop()
+    assert recorder.error is None and recorder.dropped_blocks == 0
+    assert recorder.written_samples == 257
+
+    session_dir = tmp_path / 'dev' / session_id
+    chunks = [open_chunk(chunk_path(str(session_dir), index)) for index in range(3)]
+    assert [len(chunk) for chunk in chunks] == [100, 100, 57]
+    assert not os.path.exists(chunk_path(str(session_dir), 3))
+    records = np.concatenate(chunks)
+    np.testing.assert_allclose(records['timestamp'], np.arange(257) / 1000.0)
+    np.testing.assert_allclose(records['raw'][:, 2], records['timestamp'] * 3, rtol=1e-6)
+    np.testing.assert_allclose(records['filtered'][:, 0], records['timestamp'] + 1, rtol=1e-6)
+    # 时间索引为每个分块第一个样本的时间戳
+    np.testing.assert_allclose(open_records(str(session_dir / TIME_INDEX_FILE), np.dtype('<f8')), [0.0, 0.1, 0.2])
+    info = json.loads((session_dir / SESSION_FILE).read_text(encoding='utf-8'))
+    assert info['samples'] == 257 and info['sampling_rate'] == 1000.0 and info['ended_at'] is not None
+    assert not (tmp_path / 'other').exists()
+
+
+def test_reopening_a_device_starts_a_new_session(tmp_path):
+    recorder = Recorder(str(tmp_path), chunk_samples=100, commit_interval=0.01)
+    first = recorder.open_session('dev')
+    recorder.write('dev', *sample_block(0, 10))
+    second = recorder.open_session('dev')
+    recorder.write('dev', *sample_block(10, 5))
+    recorder.stop()
+    assert first != second and recorder.active == {}
+    assert len(open_chunk(chunk_path(str(tmp_path / 'dev' / first), 0))) == 10
+    assert len(open_chunk(chunk_path(str(tmp_path / 'dev' / second), 0))) == 5
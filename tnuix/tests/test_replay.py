@@ -0,0 +1,127 @@
+"""录制回放的测试：在临时目录中录制会话，再通过回放引擎读出"""
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from app.services.recorder import RecordingSession, make_records
+from app.services.replay import (
+    ReplayAcquisitionEngine, list_replay_ports, parse_replay_port, replay_filter_chain, replay_port,
+    replay_sampling_rate
+)
+from app.services.serial_service import SerialService
+
+DECIMATED_RATE = 250.0
+
+
+def record_session(root: str, samples: int, sampling_rate: float, chunk_samples: int = 100) -> str:
+    """录制 samples 个样本的会话，返回回放端口名"""
+    timestamps = np.arange(samples) / sampling_rate
+    raw = np.vstack([np.sin(2 * np.pi * 1.2 * timestamps + phase) for phase in (0.0, 0.5, 1.0)])
+    session = RecordingSession(root, 'dev', 'session', chunk_samples, sampling_rate)
+    session.open()
+    session.append(make_records(timestamps, raw, raw))
+    session.close()
+    return replay_port('dev', 'session')
+
+
+def replay_all(engine: ReplayAcquisitionEngine, service: SerialService):
+    """不限速回放整个会话，返回各批次处理后的数据块"""
+    async def scenario():
+        engine.start()
+        blocks = []
+        try:
+            while True:
+                batch = await asyncio.wait_for(engine.get_batch(), 5.0)
+                if batch is None:
+                    break
+                blocks.append(await service.process_sample_block(batch))
+            await service.analytics.drain()
+        finally:
+            engine.stop()
+            service.analytics.close()
+        return blocks
+    return asyncio.run(scenario())
+
+
+def collect_batches(engine: ReplayAcquisitionEngine):
+    """回放到结束，返回各批次和耗时"""
+    async def scenario():
+        engine.start()
+        batches = []
+        started = time.monotonic()
+        try:
+            while True:
+                batch = await asyncio.wait_for(engine.get_batch(), 5.0)
+                if batch is None:
+                    return batches, time.monotonic() - started
+                batches.append(batch)
+        finally:
+            engine.stop()
+    return asyncio.run(scenario())
+
+
+def test_replay_ports(tmp_path):
+    port = record_session(str(tmp_path), 10, 1000.0)
+    assert list_replay_ports(str(tmp_path)) == [port]
+    assert list_replay_ports(str(tmp_path / 'missing')) == []
+    assert parse_replay_port(port) == ('dev', 'session')
+    for bad in ('REPLAY:dev', 'REPLAY:../session', 'REPLAY:dev/..', 'REPLAY:dev/a/b'):
+        with pytest.raises(ValueError):
+            parse_replay_port(bad)
+
+
+def test_unlimited_replay_delivers_every_sample_in_order(tmp_path):
+    port = record_session(str(tmp_path), 1000, 1000.0)
+    engine = ReplayAcquisitionEngine(port, speed=0, root=str(tmp_path), block_seconds=0.02)
+    batches, _ = collect_batches(engine)
+    samples = np.concatenate(batches)
+    # 跨越 10 个分块，按 20 毫秒切成批次
+    assert len(batches) == 50 and engine.dropped_batches == 0 and engine.error is None
+    assert engine.replayed_samples == 1000
+    np.testing.assert_allclose(samples[:, 0], np.arange(1000) / 1000.0)
+    assert np.isnan(samples[:, 4]).all()
+
+
+def test_replay_is_paced_by_speed(tmp_path):
+    port = record_session(str(tmp_path), 400, 1000.0)
+    batches, elapsed = collect_batches(ReplayAcquisitionEngine(port, speed=4.0, root=str(tmp_path)))
+    # 0.4 秒的录制按 4 倍速约 0.1 秒
+    assert sum(len(batch) for batch in batches) == 400
+    assert 0.09 <= elapsed < 1.0
+
+
+def test_missing_session_is_refused(tmp_path):
+    engine = ReplayAcquisitionEngine(replay_port('dev', 'missing'), root=str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        engine.start()
+
+
+def test_replay_sampling_rate_from_session(tmp_path):
+    port = record_session(str(tmp_path), 50, DECIMATED_RATE)
+    assert replay_sampling_rate(port, str(tmp_path)) == DECIMATED_RATE
+    # 没有会话信息时按默认采样率
+    assert replay_sampling_rate(replay_port('dev', 'missing'), str(tmp_path)) == 1000
+
+
+def test_replay_filter_chain_never_decimates_again():
+    chain = replay_filter_chain(None, DECIMATED_RATE)
+    assert all(stage['type'] != 'decimate' for stage in chain)
+    assert replay_filter_chain([{"type": "notch"}], DECIMATED_RATE) == [{"type": "notch"}]
+    with pytest.raises(ValueError):
+        replay_filter_chain([{"type": "notch"}, {"type": "decimate", "factor": 4}], DECIMATED_RATE)
+
+
+def test_decimated_recording_replays_at_recorded_rate(tmp_path):
+    port = record_session(str(tmp_path), 500, DECIMATED_RATE)
+    engine = ReplayAcquisitionEngine(port, speed=0, root=str(tmp_path))
+    service = SerialService(False, filter_chain=replay_filter_chain(None, DECIMATED_RATE),
+                            input_rate=DECIMATED_RATE)
+    blocks = replay_all(engine, service)
+    assert service.sampling_rate == DECIMATED_RATE
+    timestamps = np.concatenate([block['timestamp'] for block in blocks])
+    # 每个录制的样本都保留下来，时间轴与录制时相同
+    np.testing.assert_allclose(timestamps, np.arange(500) / DECIMATED_RATE)
+    raw = np.hstack([block['raw'] for block in blocks])
+    assert raw.shape == (3, 500)
@@ -0,0 +1,64 @@
+"""SampleRingBuffer 的测试：整块追加、回绕、覆盖最旧样本和按时间读取"""
+import numpy as np
+
+from app.services.ring_buffer import SampleRingBuffer
+
+
+def make_block(start: int, count: int):
+    """时间戳为样本序号，三个通道的数据为序号加 0、1000、2000"""
+    index = np.arange(start, start + count, dtype=np.float64)
+    return index, np.vstack([index, index + 1000, index + 2000])
+
+
+def append_range(buffer: SampleRingBuffer, start: int, count: int):
+    buffer.append(*make_block(start, count))
+
+
+def test_last_and_since_without_wrap():
+    buffer = SampleRingBuffer(10)
+    append_range(buffer, 0, 6)
+    timestamps, data = buffer.last(4)
+    np.testing.assert_array_equal(timestamps, [2, 3, 4, 5])
+    np.testing.assert_array_equal(data[2], [2002, 2003, 2004, 2005])
+    # 连续的数据返回视图
+    assert np.shares_memory(timestamps, buffer.timestamps)
+    np.testing.assert_array_equal(buffer.since(3.5)[0], [4, 5])
+    assert buffer.latest_timestamp() == 5
+
+
+def test_wraparound_overwrites_oldest_samples():
+    buffer = SampleRingBuffer(10)
+    for start in range(0, 23, 4):
+        append_range(buffer, start, 4)
+    assert len(buffer) == 10
+    assert buffer.total_samples == 24
+    timestamps, data = buffer.last(100)
+    np.testing.assert_array_equal(timestamps, np.arange(14, 24))
+    np.testing.assert_array_equal(data[1], np.arange(14, 24) + 1000)
+    # 跨越回绕点的时间查找
+    np.testing.assert_array_equal(buffer.since(15)[0], np.arange(15, 24))
+    np.testing.assert_array_equal(buffer.since(21)[0], [21, 22, 23])
+    assert len(buffer.since(24)[0]) == 0
+
+
+def test_block_larger_than_capacity_keeps_tail():
+    buffer = SampleRingBuffer(5)
+    append_range(buffer, 0, 3)
+    append_range(buffer, 3, 12)
+    np.testing.assert_array_equal(buffer.last(5)[0], np.arange(10, 15))
+    append_range(buffer, 15, 2)
+    np.testing.assert_array_equal(buffer.last(5)[0], np.arange(12, 17))
+
+
+def test_empty_buffer_and_empty_blocks():
+    buffer = SampleRingBuffer(4)
+    assert np.isnan(buffer.latest_timestamp())
+    timestamps, data = buffer.last(3)
+    assert timestamps.shape == (0,) and data.shape == (3, 0)
+    append_range(buffer, 0, 0)
+    assert len(buffer) == 0
+    append_range(buffer, 0, 2)
+    append_range(buffer, 2, 0)
+    np.testing.assert_array_equal(buffer.last(4)[0], [0, 1])
+    buffer.clear()
+    assert len(buffer) == 0 and len(buffer.since(0)[0]) == 0
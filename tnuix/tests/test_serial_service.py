@@ -0,0 +1,57 @@
+"""SerialService 逐批次处理的测试：抽取滤波链下没有保留样本的批次"""
+import asyncio
+
+import numpy as np
+
+from app.services.serial_service import SerialService
+
+DECIMATE_CHAIN = [{"type": "notch"}, {"type": "decimate", "factor": 4}]
+
+
+def sample_batch(index: int, pulse_rate: float = 150.0) -> np.ndarray:
+    """单样本批次：时间戳、寸关尺和设备上报的脉率"""
+    return np.array([[index * 0.001, 0.5, 0.5, 0.5, pulse_rate]])
+
+
+def test_decimated_empty_batches_with_active_pulse_rate_alert():
+    service = SerialService(False, filter_chain=DECIMATE_CHAIN)
+
+    async def scenario():
+        blocks = [await service.process_sample_block(sample_batch(i)) for i in range(40)]
+        await service.analytics.drain()
+        return blocks
+
+    try:
+        blocks = asyncio.run(scenario())
+    finally:
+        service.analytics.close()
+    sizes = [len(block['timestamp']) for block in blocks]
+    assert sum(sizes) == 10
+    assert sizes.count(0) == 30
+    # 脉率 150 越界，告警在第一个保留样本处开始，之后的空批次不再出错也不产生事件
+    events = [event for block in blocks for event in block['alerts']]
+    assert [event['event'] for event in events if event['channel'] == 'pulse_rate'] == ['start']
+    assert all(not block['alerts'] for block, size in zip(blocks, sizes) if size == 0)
+
+
+def test_beats_kept_for_next_batch_with_samples():
+    service = SerialService(False, filter_chain=DECIMATE_CHAIN)
+
+    async def scenario():
+        first = await service.process_sample_block(sample_batch(0))
+        # 模拟分析结果在两个批次之间到达
+        service.analytics._beats[0].append(np.array([0.0005]))
+        empty = await service.process_sample_block(sample_batch(1))
+        rest = [await service.process_sample_block(sample_batch(i)) for i in range(2, 5)]
+        await service.analytics.drain()
+        return first, empty, rest
+
+    try:
+        first, empty, rest = asyncio.run(scenario())
+    finally:
+        service.analytics.close()
+    assert len(first['timestamp']) == 1 and len(empty['timestamp']) == 0
+    assert len(empty['beats']['cun']) == 0
+    kept = [block for block in rest if len(block['timestamp'])]
+    assert len(kept) == 1
+    np.testing.assert_array_equal(kept[0]['beats']['cun'], [0.0005])
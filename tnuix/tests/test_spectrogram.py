@@ -0,0 +1,76 @@
+"""StreamingSpectrogram 的测试：频点位置、dB 换算和分块无关"""
+import numpy as np
+import pytest
+
+from app.services.spectrogram import StreamingSpectrogram
+
+SAMPLING_RATE = 1000.0
+
+
+def sine_block(seconds: float):
+    """寸为幅度 1 的 50 Hz 正弦，关为带直流偏置的 10 Hz 正弦，尺为常数"""
+    timestamps = np.arange(int(seconds * SAMPLING_RATE)) / SAMPLING_RATE
+    return timestamps, np.vstack([
+        np.sin(2 * np.pi * 50 * timestamps),
+        5.0 + 0.1 * np.sin(2 * np.pi * 10 * timestamps),
+        np.full(len(timestamps), 3.0),
+    ])
+
+
+def spectrogram() -> StreamingSpectrogram:
+    # 频率分辨率 2 Hz，50 Hz 正好落在第 25 个频点
+    return StreamingSpectrogram(SAMPLING_RATE, window=500, hop=125, max_freq=120)
+
+
+def to_db(target: StreamingSpectrogram, columns: np.ndarray) -> np.ndarray:
+    return target.db_min + columns * target.db_step
+
+
+def test_sine_peaks_at_its_frequency_bin():
+    target = spectrogram()
+    timestamps, block = sine_block(2.0)
+    result = target.process(timestamps, block)
+    assert target.bins == 61 and result['bin_hz'] == 2.0 and result['hop_seconds'] == 0.125
+    # (2000 - 500) / 125 + 1 列，时间戳为窗口中心
+    assert result['columns'].shape == (3, 13, 61) and result['columns'].dtype == np.uint8
+    np.testing.assert_allclose(result['timestamp'], (np.arange(13) * 125 + 250) / SAMPLING_RATE)
+    db = to_db(target, result['columns'])
+    assert (db[0].argmax(axis=1) == 25).all()
+    np.testing.assert_allclose(db[0, :, 25], 0.0, atol=0.5)
+    assert (db[1].argmax(axis=1) == 5).all()
+    np.testing.assert_allclose(db[1, :, 5], -20.0, atol=0.5)
+    # 去均值后直流和常数通道为 dB 下限
+    assert result['columns'][1, :, 0].max() < 50 and (result['columns'][2] == 0).all()
+
+
+def test_block_size_does_not_change_columns():
+    timestamps, block = sine_block(3.0)
+    whole = spectrogram().process(timestamps, block)
+    target = spectrogram()
+    results = []
+    for start in range(0, len(timestamps), 97):
+        result = target.process(timestamps[start:start + 97], block[:, start:start + 97])
+        if result is not None:
+            results.append(result)
+    assert target.columns == whole['columns'].shape[1] == 21
+    np.testing.assert_array_equal(np.concatenate([result['columns'] for result in results], axis=1),
+                                  whole['columns'])
+    np.testing.assert_array_equal(np.concatenate([result['timestamp'] for result in results]),
+                                  whole['timestamp'])
+
+
+def test_short_and_empty_blocks_and_reset():
+    target = spectrogram()
+    timestamps, block = sine_block(1.0)
+    assert target.process(timestamps[:0], block[:, :0]) is None
+    assert target.process(timestamps[:499], block[:, :499]) is None
+    assert target.process(timestamps[499:500], block[:, 499:500])['columns'].shape[1] == 1
+    target.reset()
+    assert target.process(timestamps[:499], block[:, :499]) is None
+
+
+def test_invalid_hop():
+    with pytest.raises(ValueError):
+        StreamingSpectrogram(window=256, hop=512)
+    with pytest.raises(ValueError):
+        StreamingSpectrogram(window=256, hop=0)
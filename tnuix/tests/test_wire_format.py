@@ -0,0 +1,83 @@
+"""二进制数据帧的测试：按 wire_format 中的格式说明解码打包结果"""
+import struct
+
+import numpy as np
+
+from app.services.wire_format import (
+    CHANNELS, ENCODING_FLOAT32, ENCODING_INT16, ENCODING_SPECTROGRAM, FLAG_BEATS, FRAME_HEADER,
+    SPECTROGRAM_HEADER, WIRE_VERSION, pack_frame, pack_spectrogram
+)
+
+
+def unpack_frame(message: bytes):
+    """解码数据帧，返回 (帧头字段, {通道: 数据}, {通道: 心搏时间戳})"""
+    version, encoding, stream_id, seq, count, first, rate, pulse, mask, flags = FRAME_HEADER.unpack_from(message)
+    header = dict(version=version, encoding=encoding, stream_id=stream_id, seq=seq, count=count,
+                  first=first, rate=rate, pulse=pulse, flags=flags)
+    channels = [position for index, position in enumerate(CHANNELS) if mask & (1 << index)]
+    offset = FRAME_HEADER.size
+    if encoding == ENCODING_INT16:
+        scale = np.frombuffer(message, '<f4', len(channels), offset)
+        offset += scale.nbytes
+        quantized = np.frombuffer(message, '<i2', len(channels) * count, offset).reshape(len(channels), count)
+        values = quantized * scale[:, None]
+        offset += len(channels) * count * 2
+    else:
+        values = np.frombuffer(message, '<f4', len(channels) * count, offset).reshape(len(channels), count)
+        offset += values.nbytes
+    beats = {}
+    if flags & FLAG_BEATS:
+        for position in channels:
+            (number,) = struct.unpack_from('<H', message, offset)
+            beats[position] = np.frombuffer(message, '<f8', number, offset + 2)
+            offset += 2 + number * 8
+    assert offset == len(message)
+    return header, dict(zip(channels, values)), beats
+
+
+def test_float32_frame_round_trip():
+    frame = {
+        'stream_id': 3, 'seq': 70000, 'sampling_rate': 250.0, 'pulse_rate': 72.5,
+        'timestamp': np.array([1.5, 1.504, 1.508]),
+        'cun': np.array([0.1, -0.2, 0.3]), 'chi': np.array([1.0, 2.0, 3.0]),
+        'beats': {'cun': [1.502], 'chi': []},
+    }
+    header, values, beats = unpack_frame(pack_frame(frame))
+    assert header['version'] == WIRE_VERSION and header['encoding'] == ENCODING_FLOAT32
+    assert (header['stream_id'], header['seq'], header['count']) == (3, 70000, 3)
+    assert header['first'] == 1.5 and header['rate'] == 250.0 and header['pulse'] == 72.5
+    assert list(values) == ['cun', 'chi']
+    np.testing.assert_allclose(values['cun'], frame['cun'], rtol=1e-6)
+    np.testing.assert_array_equal(beats['cun'], [1.502])
+    assert len(beats['chi']) == 0
+
+
+def test_int16_frame_scales_each_channel():
+    frame = {'timestamp': np.arange(4) / 1000.0, 'guan': np.array([0.0, 0.5, -1.0, 0.25]),
+             'chi': np.array([0.0, 0.0, 0.0, 0.0])}
+    header, values, beats = unpack_frame(pack_frame(frame, ENCODING_INT16))
+    assert header['encoding'] == ENCODING_INT16 and header['flags'] == 0 and not beats
+    assert np.isnan(header['pulse'])
+    np.testing.assert_allclose(values['guan'], frame['guan'], atol=1.0 / 32767)
+    np.testing.assert_array_equal(values['chi'], 0.0)
+
+
+def test_empty_frame():
+    header, values, beats = unpack_frame(pack_frame({'timestamp': np.zeros(0), 'cun': np.zeros(0),
+                                                     'beats': {'cun': []}}))
+    assert header['count'] == 0 and header['first'] == 0.0
+    assert values['cun'].shape == (0,)
+    assert len(beats['cun']) == 0
+
+
+def test_spectrogram_message():
+    columns = {'cun': np.arange(6, dtype=np.uint8).reshape(2, 3), 'chi': np.full((2, 3), 255, dtype=np.uint8)}
+    message = pack_spectrogram({'stream_id': 1, 'timestamp': [2.0, 2.5], 'columns': columns, 'hop_seconds': 0.5,
+                                'bin_hz': 2.0, 'db_min': -80.0, 'db_step': 0.5})
+    version, encoding, stream_id, count, bins, first, hop, bin_hz, db_min, db_step, mask = \
+        SPECTROGRAM_HEADER.unpack_from(message)
+    assert (encoding, stream_id, count, bins, mask) == (ENCODING_SPECTROGRAM, 1, 2, 3, 0b101)
+    assert (first, hop, bin_hz, db_min, db_step) == (2.0, 0.5, 2.0, -80.0, 0.5)
+    body = np.frombuffer(message, np.uint8, offset=SPECTROGRAM_HEADER.size).reshape(2, 2, 3)
+    np.testing.assert_array_equal(body[0], columns['cun'])
+    np.testing.assert_array_equal(body[1], columns['chi'])